@@ -0,0 +1,398 @@
+""" Throughput and latency of the three connectors against a real server
+
+Measures rows/sec of bulk inserts (execute_many) and full-table fetches (fetch_all_as_df)
+and the latency percentiles of point queries (fetch_all_as_dicts by primary key), for
+MySQLConnectorNative (one connector per thread), MySQLConnectorPoolNative (one shared
+pool) and MySQLConnectorNativeAsync (one shared async pool) at several concurrency levels.
+Connections are opened before the clock starts. Results are written to JSON, give a
+previous file with --baseline to list the regressions.
+
+run against a throwaway local server (mysqld or mariadbd in PATH):
+    python -m benchmarks.bench_connectors --rows 100000 --concurrency 1,4,16 --output bench.json
+run against the .env database (creates and drops the table bench_connectors_rows):
+    python -m benchmarks.bench_connectors --server env
+compare with a previous release:
+    python -m benchmarks.bench_connectors --baseline bench_previous.json --output bench.json
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import math
+import platform
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from importlib import metadata
+from time import perf_counter
+from typing import (Optional, Dict, List, Tuple, Any, Callable, Awaitable)
+
+from mysql_helpers.mysql_con.mysql_async import MySQLConnectorNativeAsync
+from mysql_helpers.mysql_con.mysql_pool_sync import MySQLConnectorPoolNative
+from mysql_helpers.mysql_con.mysql_sync import MySQLConnectorNative
+
+TABLE_NAME: str = "bench_connectors_rows"
+CREATE_TABLE: str = f"""
+    CREATE TABLE IF NOT EXISTS `{TABLE_NAME}` (
+        `id` int NOT NULL AUTO_INCREMENT,
+        `k` int NOT NULL,
+        `label` varchar(64) NOT NULL,
+        `score` double DEFAULT NULL,
+        `created` datetime NOT NULL,
+    PRIMARY KEY (`id`),
+    KEY `k` (`k`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+INSERT_QUERY: str = f"INSERT INTO {TABLE_NAME} (k, label, score, created) VALUES (%s, %s, %s, %s)"
+FETCH_QUERY: str = f"SELECT id, k, label, score, created FROM {TABLE_NAME}"
+POINT_QUERY: str = f"SELECT id, k, label, score, created FROM {TABLE_NAME} WHERE id = %s"
+CONNECTORS: Tuple[str, ...] = ("native", "pool", "async")
+# throughput metrics regress when lower, latency ones when higher
+HIGHER_IS_BETTER: Tuple[str, ...] = ("rows_per_sec", "queries_per_sec")
+LOWER_IS_BETTER: Tuple[str, ...] = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def make_rows(nbr_rows: int, seed: int = 0) -> List[Tuple]:
+    rng = random.Random(seed)
+    start = dt.datetime(2024, 1, 1)
+    return [
+        (rng.randint(0, 10_000), f"label-{n:08d}", None if n % 10 == 0 else rng.random() * 1000,
+         start + dt.timedelta(seconds=n))
+        for n in range(nbr_rows)
+    ]
+
+
+def split(rows: List[Tuple], parts: int) -> List[List[Tuple]]:
+    return [rows[index::parts] for index in range(parts)]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank: int = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(
+        connector: str,
+        workload: str,
+        concurrency: int,
+        elapsed: float,
+        rows: int,
+        latencies: List[float],
+) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        "connector": connector,
+        "workload": workload,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 6),
+        "rows": rows,
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+    if latencies:
+        latencies = sorted(latencies)
+        result.update({
+            "queries": len(latencies),
+            "queries_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        })
+    return result
+
+
+def time_calls(call: Callable[[Any], Any], arguments: List[Any]) -> List[float]:
+    latencies: List[float] = []
+    for argument in arguments:
+        started: float = perf_counter()
+        call(argument)
+        latencies.append(perf_counter() - started)
+    return latencies
+
+
+async def time_calls_async(call: Callable[[Any], Awaitable], arguments: List[Any]) -> List[float]:
+    latencies: List[float] = []
+    for argument in arguments:
+        started: float = perf_counter()
+        await call(argument)
+        latencies.append(perf_counter() - started)
+    return latencies
+
+
+def run_threads(workers: List[Callable[[], List[float]]]) -> Tuple[float, List[float]]:
+    """Run the workers in threads started together, return the wall time and the latencies"""
+    barrier = threading.Barrier(len(workers) + 1)
+
+    def start_together(worker: Callable[[], List[float]]) -> List[float]:
+        barrier.wait()
+        return worker()
+
+    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+        futures = [executor.submit(start_together, worker) for worker in workers]
+        barrier.wait()
+        started: float = perf_counter()
+        results = [future.result() for future in futures]
+        elapsed: float = perf_counter() - started
+    return elapsed, [latency for latencies in results for latency in latencies]
+
+
+class SyncTarget:
+    """Sync connector(s) for one concurrency level: one connector per thread for
+    MySQLConnectorNative, one shared connector for the pool
+    """
+
+    def __init__(self, name: str, connector_kwargs: Dict[str, Any], concurrency: int):
+        self.name: str = name
+        self.concurrency: int = concurrency
+        self.close_connection: bool = name == "pool"
+        if name == "native":
+            self.connectors = [MySQLConnectorNative(**connector_kwargs, allow_local_infile=True)
+                               for _ in range(concurrency)]
+            for connector in self.connectors:
+                connector.open_connection()
+        else:
+            pool = MySQLConnectorPoolNative(**connector_kwargs, pool_size=concurrency, pool_max_overflow=0)
+            # open the pool connections before the clock starts
+            pool.fetch_many([("SELECT SLEEP(0.05)", None)] * concurrency)
+            self.connectors = [pool] * concurrency
+
+    def run(self, make_worker: Callable[[Any, int], Callable[[], List[float]]]) -> Tuple[float, List[float]]:
+        return run_threads([make_worker(connector, index) for index, connector in enumerate(self.connectors)])
+
+    def insert(self, rows: List[Tuple]) -> Tuple[float, List[float]]:
+        parts = split(rows, self.concurrency)
+
+        def make_worker(connector: Any, index: int) -> Callable[[], List[float]]:
+            def worker() -> List[float]:
+                connector.execute_many(sql_query=INSERT_QUERY, rows=parts[index],
+                                       close_connection=self.close_connection)
+                return []
+            return worker
+
+        return self.run(make_worker)
+
+    def fetch(self) -> Tuple[float, List[float]]:
+        def make_worker(connector: Any, index: int) -> Callable[[], List[float]]:
+            def fetch_all(_) -> Any:
+                return connector.fetch_all_as_df(sql_query=FETCH_QUERY, cache_ttl=0,
+                                                 close_connection=self.close_connection)
+            return lambda: time_calls(fetch_all, [None])
+
+        return self.run(make_worker)
+
+    def point(self, ids: List[List[int]]) -> Tuple[float, List[float]]:
+        def make_worker(connector: Any, index: int) -> Callable[[], List[float]]:
+            def fetch_one(row_id: int) -> Any:
+                return connector.fetch_all_as_dicts(sql_query=POINT_QUERY, sql_variables=(row_id,), cache_ttl=0,
+                                                    close_connection=self.close_connection)
+            return lambda: time_calls(fetch_one, ids[index])
+
+        return self.run(make_worker)
+
+    def close(self):
+        if self.name == "native":
+            for connector in self.connectors:
+                connector.close_connection()
+        else:
+            self.connectors[0].close_pool()
+
+
+class AsyncTarget:
+    """One MySQLConnectorNativeAsync with a pool of concurrency connections, driven by tasks"""
+
+    def __init__(self, connector_kwargs: Dict[str, Any], concurrency: int):
+        self.name: str = "async"
+        self.concurrency: int = concurrency
+        self.connector = MySQLConnectorNativeAsync(**connector_kwargs, pool_size=concurrency,
+                                                   pool_min_size=concurrency)
+
+    async def run(self, workers: List[Callable[[], Awaitable[List[float]]]]) -> Tuple[float, List[float]]:
+        await self.connector.mysql_pool.initialize()
+        started: float = perf_counter()
+        results = await asyncio.gather(*(worker() for worker in workers))
+        elapsed: float = perf_counter() - started
+        return elapsed, [latency for latencies in results for latency in latencies]
+
+    async def insert(self, rows: List[Tuple]) -> Tuple[float, List[float]]:
+        async def worker(part: List[Tuple]) -> List[float]:
+            await self.connector.execute_many(sql_query=INSERT_QUERY, rows=part)
+            return []
+
+        return await self.run([lambda part=part: worker(part) for part in split(rows, self.concurrency)])
+
+    async def fetch(self) -> Tuple[float, List[float]]:
+        async def fetch_all(_) -> Any:
+            return await self.connector.fetch_all_as_df(sql_query=FETCH_QUERY, cache_ttl=0)
+
+        return await self.run([lambda: time_calls_async(fetch_all, [None])] * self.concurrency)
+
+    async def point(self, ids: List[List[int]]) -> Tuple[float, List[float]]:
+        async def fetch_one(row_id: int) -> Any:
+            return await self.connector.fetch_all_as_dicts(sql_query=POINT_QUERY, sql_variables=(row_id,),
+                                                           cache_ttl=0)
+
+        return await self.run([lambda worker_ids=worker_ids: time_calls_async(fetch_one, worker_ids)
+                               for worker_ids in ids])
+
+    async def close(self):
+        await self.connector.close_pool()
+
+
+def reset_table(connector_kwargs: Dict[str, Any]):
+    admin = MySQLConnectorNative(**connector_kwargs)
+    admin.execute_one_query(sql_query=CREATE_TABLE, close_connection=False)
+    admin.execute_one_query(sql_query=f"TRUNCATE TABLE {TABLE_NAME}")
+
+
+def bench_target(
+        name: str,
+        connector_kwargs: Dict[str, Any],
+        concurrency: int,
+        rows: List[Tuple],
+        point_queries: int,
+) -> List[Dict[str, Any]]:
+    """Run the insert, fetch and point workloads for one connector and concurrency level"""
+    rng = random.Random(concurrency)
+    ids: List[List[int]] = [[rng.randint(1, len(rows)) for _ in range(point_queries)]
+                            for _ in range(concurrency)]
+    reset_table(connector_kwargs)
+    results: List[Dict[str, Any]] = []
+
+    if name == "async":
+        async def run_async() -> List[Tuple[str, float, int, List[float]]]:
+            target = AsyncTarget(connector_kwargs, concurrency)
+            try:
+                insert_time, _ = await target.insert(rows)
+                fetch_time, _ = await target.fetch()
+                point_time, latencies = await target.point(ids)
+            finally:
+                await target.close()
+            return [("insert", insert_time, len(rows), []),
+                    ("fetch", fetch_time, len(rows) * concurrency, []),
+                    ("point", point_time, point_queries * concurrency, latencies)]
+
+        measures = asyncio.run(run_async())
+    else:
+        target = SyncTarget(name, connector_kwargs, concurrency)
+        try:
+            insert_time, _ = target.insert(rows)
+            fetch_time, _ = target.fetch()
+            point_time, latencies = target.point(ids)
+        finally:
+            target.close()
+        measures = [("insert", insert_time, len(rows), []),
+                    ("fetch", fetch_time, len(rows) * concurrency, []),
+                    ("point", point_time, point_queries * concurrency, latencies)]
+
+    for workload, elapsed, nbr_rows, latencies in measures:
+        results.append(summarize(name, workload, concurrency, elapsed, nbr_rows, latencies))
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Return one line per metric worse than the baseline by more than tolerance"""
+    baseline_by_key = {(result["connector"], result["workload"], result["concurrency"]): result
+                       for result in baseline}
+    regressions: List[str] = []
+    for result in results:
+        previous = baseline_by_key.get((result["connector"], result["workload"], result["concurrency"]))
+        if previous is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if not previous.get(metric) or metric not in result:
+                continue
+            ratio: float = result[metric] / previous[metric]
+            if (metric in HIGHER_IS_BETTER and ratio < 1 - tolerance) or (
+                    metric in LOWER_IS_BETTER and ratio > 1 + tolerance):
+                regressions.append(f"{result['connector']}/{result['workload']}/c{result['concurrency']} "
+                                   f"{metric}: {previous[metric]} -> {result[metric]} ({ratio - 1:+.1%})")
+    return regressions
+
+
+def package_version(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def server_version(connector_kwargs: Dict[str, Any]) -> str:
+    results = MySQLConnectorNative(**connector_kwargs).fetch_all_as_dicts(sql_query="SELECT VERSION() AS version")
+    return results[0]["version"] if results else "unknown"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["local", "env"], default="local",
+                        help="start a throwaway local server or use the .env database")
+    parser.add_argument("--mysqld", default=None, help="path of mysqld or mariadbd")
+    parser.add_argument("--port", type=int, default=33061, help="port of the local server")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--point-queries", type=int, default=500, help="point queries per worker")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma separated concurrency levels")
+    parser.add_argument("--connectors", default=",".join(CONNECTORS))
+    parser.add_argument("--output", default=None, help="JSON file the results are written to")
+    parser.add_argument("--baseline", default=None, help="JSON file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change reported as regression")
+    args = parser.parse_args(argv)
+
+    concurrency_levels: List[int] = [int(level) for level in args.concurrency.split(",")]
+    connector_names: List[str] = [name.strip() for name in args.connectors.split(",")]
+    unknown_names = set(connector_names) - set(CONNECTORS)
+    if unknown_names:
+        parser.error(f"unknown connectors: {sorted(unknown_names)}, choose among {CONNECTORS}")
+
+    with ExitStack() as stack:
+        if args.server == "local":
+            from benchmarks.local_server import LocalMySQLServer
+            server = stack.enter_context(LocalMySQLServer(port=args.port, mysqld_path=args.mysqld))
+            connector_kwargs: Dict[str, Any] = server.connector_kwargs()
+        else:
+            from dotenv import load_dotenv
+            load_dotenv()
+            connector_kwargs = {}
+            stack.callback(lambda: MySQLConnectorNative().execute_one_query(
+                sql_query=f"DROP TABLE IF EXISTS {TABLE_NAME}"))
+
+        rows: List[Tuple] = make_rows(args.rows)
+        results: List[Dict[str, Any]] = []
+        for name in connector_names:
+            for concurrency in concurrency_levels:
+                for result in bench_target(name, connector_kwargs, concurrency, rows, args.point_queries):
+                    results.append(result)
+                    print(json.dumps(result), flush=True)
+
+        report: Dict[str, Any] = {
+            "meta": {
+                "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+                "mysql_helpers": package_version("mysql_helpers"),
+                "mysql_connector_python": package_version("mysql-connector-python"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "server": server_version(connector_kwargs),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline: List[Dict[str, Any]] = json.load(baseline_file)["results"]
+        regressions: List[str] = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+""" Compares DataFrame builders on rows shaped like cursor.fetchall() results
+
+run: python -m benchmarks.bench_fetch_df --rows 1000000
+"""
+import argparse
+import datetime as dt
+from time import perf_counter
+from typing import (List, Tuple, Callable)
+
+import pandas as pd
+from mysql.connector.constants import FieldType, FieldFlag
+from mysql.connector.conversion import MySQLConverter
+
+from mysql_helpers.mysql_con.df_helpers import rows_to_df
+
+# name, type_code, display_size, internal_size, precision, scale, null_ok, flags
+DESCRIPTION: List[Tuple] = [
+    ("proxy_id", FieldType.LONG, None, None, None, None, False, FieldFlag.NOT_NULL),
+    ("updatetime", FieldType.TIMESTAMP, None, None, None, None, False, FieldFlag.NOT_NULL),
+    ("proxy_url", FieldType.VAR_STRING, None, None, None, None, False, FieldFlag.NOT_NULL),
+    ("proxy_speed", FieldType.LONG, None, None, None, None, True, 0),
+    ("score", FieldType.DOUBLE, None, None, None, None, True, 0),
+]
+
+
+def make_rows(nbr_rows: int) -> List[Tuple]:
+    start = dt.datetime(2024, 1, 1)
+    return [
+        (n, start + dt.timedelta(seconds=n), f"https://www.example{n}.com",
+         None if n % 10 == 0 else n % 5000, n / 7)
+        for n in range(nbr_rows)
+    ]
+
+
+def make_raw_rows(rows: List[Tuple]) -> List[Tuple]:
+    """the same rows as sent by the server and returned by a raw cursor (engine="c")"""
+    return [tuple(None if value is None else str(value).encode() for value in row) for row in rows]
+
+
+def build_from_dicts(rows: List[Tuple]) -> pd.DataFrame:
+    """previous MySQLConnectorNative path: dictionary cursor then DataFrame"""
+    column_names = [column[0] for column in DESCRIPTION]
+    return pd.DataFrame([dict(zip(column_names, row)) for row in rows])
+
+
+def build_from_tuples(rows: List[Tuple]) -> pd.DataFrame:
+    """previous pool and async path: DataFrame from tuples then set columns"""
+    result_df = pd.DataFrame(rows)
+    result_df.columns = [column[0] for column in DESCRIPTION]
+    return result_df
+
+
+def build_columnar(rows: List[Tuple]) -> pd.DataFrame:
+    return rows_to_df(rows, DESCRIPTION)
+
+
+def build_converted_columnar(rows: List[Tuple]) -> pd.DataFrame:
+    """pure Python engine: the protocol converts each raw value, then columnar build"""
+    converter = MySQLConverter()
+    fields = [column + (45,) for column in DESCRIPTION]  # utf8mb4 charset id
+    return rows_to_df([converter.row_to_python(row, fields) for row in rows], DESCRIPTION)
+
+
+def build_columnar_raw(rows: List[Tuple]) -> pd.DataFrame:
+    """C engine: raw values parsed column by column by numpy"""
+    return rows_to_df(rows, DESCRIPTION, raw=True)
+
+
+def time_builder(builder: Callable, rows: List[Tuple], repeat: int) -> float:
+    best: float = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        builder(rows)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bench_rows = make_rows(args.rows)
+    bench_raw_rows = make_raw_rows(bench_rows)
+    for builder_name, bench_builder, builder_rows in (("dicts", build_from_dicts, bench_rows),
+                                                      ("tuples", build_from_tuples, bench_rows),
+                                                      ("columnar", build_columnar, bench_rows),
+                                                      ("converted", build_converted_columnar, bench_raw_rows),
+                                                      ("raw", build_columnar_raw, bench_raw_rows)):
+        print(f"{builder_name:>10}: {time_builder(bench_builder, builder_rows, args.repeat):.3f}s "
+              f"for {args.rows:,} rows")
@@ -0,0 +1,76 @@
+""" Import time and memory of the connector modules, measured in fresh interpreters
+
+pandas and numpy are only imported by the DataFrame methods: importing a connector
+module must not load them.
+
+run: python -m benchmarks.bench_import_time --repeat 5 --output import_time.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import (Dict, List, Any)
+
+MODULES: List[str] = [
+    "mysql_helpers.mysql_con.mysql_sync",
+    "mysql_helpers.mysql_con.mysql_pool_sync",
+    "mysql_helpers.mysql_con.mysql_async",
+]
+HEAVY_MODULES: List[str] = ["pandas", "numpy"]
+
+# run in a fresh interpreter: time the import, then report the peak RSS and heavy modules
+PROBE: str = """
+import json, sys
+from time import perf_counter
+started = perf_counter()
+import {module}
+elapsed = perf_counter() - started
+try:
+    import resource
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        max_rss_kb //= 1024
+except ImportError:
+    max_rss_kb = None
+print(json.dumps({{"seconds": elapsed, "max_rss_kb": max_rss_kb,
+                  "heavy_modules": [name for name in {heavy_modules!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str, repeat: int) -> Dict[str, Any]:
+    """Best of repeat imports of module, each in a new interpreter"""
+    runs: List[Dict[str, Any]] = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy_modules=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["seconds"])
+    return {
+        "module": module,
+        "import_ms": round(best["seconds"] * 1000, 1),
+        "max_rss_mb": None if best["max_rss_kb"] is None else round(best["max_rss_kb"] / 1024, 1),
+        "heavy_modules": best["heavy_modules"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="JSON file the results are written to")
+    parser.add_argument("--max-ms", type=float, default=None, help="exit with 1 above this import time")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = [measure_import(module, args.repeat) for module in MODULES]
+    failed: bool = False
+    for result in results:
+        print(f"{result['module']:>42}: {result['import_ms']:>7.1f} ms, "
+              f"max RSS {result['max_rss_mb']} MB, heavy modules loaded: {result['heavy_modules'] or 'none'}")
+        if result["heavy_modules"] or (args.max_ms is not None and result["import_ms"] > args.max_ms):
+            failed = True
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"python": sys.version.split()[0], "results": results}, output_file, indent=2)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,152 @@
+""" Throwaway local MySQL or MariaDB server for the benchmarks
+
+A data directory is initialized in a temporary folder, the server listens on 127.0.0.1
+with a root user without password, and everything is deleted when the server stops.
+"""
+import logging
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import (Union, Optional, Dict, List, Any)
+
+import mysql.connector
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+SERVER_BINARIES: List[str] = ["mysqld", "mariadbd"]
+START_TIMEOUT: float = 60.0
+
+
+def find_server_binary(mysqld_path: Optional[str] = None) -> str:
+    """Return the path of the mysqld/mariadbd binary, raise FileNotFoundError if none"""
+    if mysqld_path:
+        return mysqld_path
+    for binary in SERVER_BINARIES:
+        binary_path = shutil.which(binary)
+        if binary_path is not None:
+            return binary_path
+    raise FileNotFoundError(f"None of {SERVER_BINARIES} found in PATH, "
+                            f"install MySQL or MariaDB or pass --mysqld")
+
+
+class LocalMySQLServer:
+    """Context manager starting a mysqld on a throwaway data directory
+
+        with LocalMySQLServer(port=33061) as server:
+            connector = MySQLConnectorNative(**server.connector_kwargs())
+    """
+
+    def __init__(
+            self,
+            port: int = 33061,
+            mysqld_path: Optional[str] = None,
+            db_name: str = "mysql_helpers_bench",
+            extra_args: Optional[List[str]] = None,
+    ):
+        """
+        :param port: TCP port the server listens on
+        :param mysqld_path: path of mysqld or mariadbd, looked up in PATH if None
+        :param db_name: database created for the benchmarks
+        :param extra_args: more mysqld options, e.g. ["--innodb-buffer-pool-size=1G"]
+        """
+        self.port: int = port
+        self.mysqld_path: str = find_server_binary(mysqld_path)
+        self.db_name: str = db_name
+        self.extra_args: List[str] = extra_args or []
+        self.base_dir: Union[None, Path] = None
+        self.process: Union[None, subprocess.Popen] = None
+        self.is_mariadb: bool = "mariadb" in self._version_text().lower()
+
+    def _version_text(self) -> str:
+        return subprocess.run([self.mysqld_path, "--version"], capture_output=True, text=True).stdout
+
+    def _initialize(self, data_dir: Path):
+        if self.is_mariadb:
+            install_db = shutil.which("mariadb-install-db") or shutil.which("mysql_install_db")
+            if install_db is None:
+                raise FileNotFoundError("mariadb-install-db not found in PATH")
+            command = [install_db, f"--datadir={data_dir}", "--auth-root-authentication-method=normal",
+                       "--skip-test-db"]
+        else:
+            command = [self.mysqld_path, "--no-defaults", "--initialize-insecure", f"--datadir={data_dir}"]
+        subprocess.run(command, check=True, capture_output=True)
+
+    def start(self) -> "LocalMySQLServer":
+        self.base_dir = Path(tempfile.mkdtemp(prefix="mysql_helpers_bench_"))
+        data_dir: Path = self.base_dir / "data"
+        data_dir.mkdir()
+        self._initialize(data_dir)
+
+        command = [
+            self.mysqld_path,
+            "--no-defaults",
+            f"--datadir={data_dir}",
+            f"--socket={self.base_dir / 'mysqld.sock'}",
+            f"--pid-file={self.base_dir / 'mysqld.pid'}",
+            f"--log-error={self.base_dir / 'mysqld.err'}",
+            f"--port={self.port}",
+            "--bind-address=127.0.0.1",
+            "--local-infile=1",
+            "--skip-log-bin",
+            *self.extra_args,
+        ]
+        logger.info(f"Starting {' '.join(command)}")
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_until_ready()
+
+        connection = mysql.connector.connect(**self.connection_config(database=None))
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{self.db_name}`")
+            cursor.close()
+        finally:
+            connection.close()
+        return self
+
+    def _wait_until_ready(self):
+        deadline: float = time.monotonic() + START_TIMEOUT
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"mysqld exited with code {self.process.returncode}, "
+                                   f"see {self.base_dir / 'mysqld.err'}")
+            try:
+                mysql.connector.connect(**self.connection_config(database=None)).close()
+                return
+            except mysql.connector.Error:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"mysqld not ready after {START_TIMEOUT}s")
+                time.sleep(0.2)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        if self.base_dir is not None:
+            shutil.rmtree(self.base_dir, ignore_errors=True)
+            self.base_dir = None
+
+    def connection_config(self, database: Optional[str] = "") -> Dict[str, Any]:
+        return dict(host="127.0.0.1", port=self.port, user="root", password="",
+                    database=self.db_name if database == "" else database)
+
+    def connector_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments of the connectors constructors"""
+        return dict(db_host="127.0.0.1", db_port=self.port, db_user="root", db_password="",
+                    db_name=self.db_name)
+
+    def __enter__(self) -> "LocalMySQLServer":
+        try:
+            return self.start()
+        except BaseException:
+            self.stop()
+            raise
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,185 @@
+""" Builds Apache Arrow tables and record batches column by column from raw cursor rows"""
+from __future__ import annotations
+
+from decimal import Decimal
+from operator import itemgetter
+from typing import (Union, Optional, List, Tuple, Sequence, Any)
+
+from mysql.connector.constants import FieldType, FieldFlag
+
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+
+# imported by the first conversion, not by the connectors modules
+pa = LazyModule("pyarrow", extra="arrow")
+pl = LazyModule("polars", extra="polars")
+
+STRING_TYPES = frozenset([FieldType.VARCHAR, FieldType.VAR_STRING, FieldType.STRING, FieldType.ENUM,
+                          FieldType.SET, FieldType.JSON, FieldType.TINY_BLOB, FieldType.MEDIUM_BLOB,
+                          FieldType.LONG_BLOB, FieldType.BLOB])
+DECIMAL_TYPES = frozenset([FieldType.DECIMAL, FieldType.NEWDECIMAL])
+DECIMAL128_MAX_PRECISION: int = 38
+DECIMAL256_MAX_PRECISION: int = 76
+
+
+def arrow_type(field_type: int, flags: int = 0) -> Union[None, pa.DataType]:
+    """Return the Arrow type matching a MySQL field type, None when it depends on the values
+    (DECIMAL, whose scale is not in the cursor description, see decimal_type)
+    :param field_type: the type_code of a cursor.description entry
+    :param flags: the flags of a cursor.description entry
+    """
+    unsigned: bool = bool(flags & FieldFlag.UNSIGNED)
+    if field_type == FieldType.TINY:
+        return pa.uint8() if unsigned else pa.int8()
+    if field_type in (FieldType.SHORT, FieldType.YEAR):
+        return pa.uint16() if unsigned else pa.int16()
+    if field_type in (FieldType.INT24, FieldType.LONG):
+        return pa.uint32() if unsigned else pa.int32()
+    if field_type == FieldType.LONGLONG:
+        return pa.uint64() if unsigned else pa.int64()
+    if field_type == FieldType.FLOAT:
+        return pa.float32()
+    if field_type == FieldType.DOUBLE:
+        return pa.float64()
+    if field_type in (FieldType.DATE, FieldType.NEWDATE):
+        return pa.date32()
+    if field_type in (FieldType.DATETIME, FieldType.TIMESTAMP):
+        return pa.timestamp("us")
+    if field_type == FieldType.TIME:
+        return pa.duration("us")
+    if field_type == FieldType.NULL:
+        return pa.null()
+    if field_type in STRING_TYPES:
+        return pa.binary() if flags & FieldFlag.BINARY else pa.string()
+    if field_type == FieldType.BIT:
+        return pa.uint64()
+    if field_type == FieldType.GEOMETRY:
+        return pa.binary()
+    return None
+
+
+def _decimal(precision: int, scale: int) -> pa.DataType:
+    """The widest decimal type of a scale, so that the chunks of a stream share it"""
+    if precision <= DECIMAL128_MAX_PRECISION:
+        return pa.decimal128(DECIMAL128_MAX_PRECISION, scale)
+    return pa.decimal256(DECIMAL256_MAX_PRECISION, scale)
+
+
+def decimal_type(values: Sequence[Any]) -> Union[None, pa.DataType]:
+    """Return the Arrow type of the values of a DECIMAL column: all the values of a column
+    have its scale, the precision is the max one, None when all the values are NULL
+    """
+    scale: Union[None, int] = None
+    integer_digits: int = 0
+    for value in values:
+        if not isinstance(value, Decimal):
+            continue
+        _, digits, exponent = value.as_tuple()
+        scale = max(scale or 0, -exponent)
+        integer_digits = max(integer_digits, len(digits) + exponent)
+    if scale is None:
+        return None
+    return _decimal(integer_digits + scale, scale)
+
+
+def unify_types(previous_type: pa.DataType, data_type: pa.DataType) -> pa.DataType:
+    """Return the type holding the values of both types, for a column whose type was
+    inferred from its values: a NULL only column takes the type of the values that follow,
+    decimals get the larger scale and precision. The previous type otherwise.
+    """
+    if previous_type == data_type or pa.types.is_null(data_type):
+        return previous_type
+    if pa.types.is_null(previous_type):
+        return data_type
+    if pa.types.is_decimal(previous_type) and pa.types.is_decimal(data_type):
+        scale: int = max(previous_type.scale, data_type.scale)
+        integer_digits: int = max(previous_type.precision - previous_type.scale,
+                                  data_type.precision - data_type.scale)
+        return _decimal(integer_digits + scale, scale)
+    return previous_type
+
+
+def unify_schemas(previous_schema: pa.Schema, schema: pa.Schema) -> pa.Schema:
+    """unify_types applied to each field of two schemas with the same columns"""
+    return pa.schema([
+        previous_field.with_type(unify_types(previous_field.type, field.type))
+        for previous_field, field in zip(previous_schema, schema)
+    ])
+
+
+def cast_batch(batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+    """Cast the columns of a record batch to the types of a wider schema"""
+    if batch.schema == schema:
+        return batch
+    return pa.RecordBatch.from_arrays(
+        [column if column.type == field.type else column.cast(field.type)
+         for column, field in zip(batch.columns, schema)],
+        schema=schema,
+    )
+
+
+def column_to_arrow(values: Sequence[Any], data_type: Union[None, pa.DataType]) -> pa.Array:
+    """Convert the values of one column to a typed Arrow array, in Arrow's C++ converter
+    NULLs become Arrow nulls, no float or object fallback is needed for integer columns
+    """
+    if data_type is not None:
+        try:
+            return pa.array(values, type=data_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            # e.g. zero dates returned as strings, or text returned as bytes
+            pass
+    return pa.array(values)
+
+
+def _column_arrays(
+        rows: Sequence[Tuple],
+        description: Sequence[Tuple],
+        schema: Optional[pa.Schema] = None,
+) -> List[pa.Array]:
+    arrays: List[pa.Array] = []
+    for index, column in enumerate(description):
+        values: List[Any] = list(map(itemgetter(index), rows))
+        flags: int = column[7] if len(column) > 7 else 0
+        data_type: Union[None, pa.DataType] = arrow_type(column[1], flags)
+        if data_type is None and column[1] in DECIMAL_TYPES:
+            data_type = decimal_type(values)
+        array = column_to_arrow(values, data_type)
+        if schema is not None:
+            # the type of the previous chunks, widened when these values need it
+            unified_type: pa.DataType = unify_types(schema.field(index).type, array.type)
+            if array.type != unified_type:
+                array = array.cast(unified_type)
+        arrays.append(array)
+    return arrays
+
+
+def rows_to_arrow(rows: Sequence[Tuple], description: Optional[Sequence[Tuple]]) -> pa.Table:
+    """Transpose raw cursor rows into one typed Arrow array per column
+    table.to_pandas(types_mapper=pd.ArrowDtype) and polars.from_arrow(table) then wrap the
+    Arrow buffers without copying them
+    :param rows: the rows returned by cursor.fetchall/fetchmany, as tuples
+    :param description: the cursor.description of the query
+    :return: a pyarrow Table with the cursor column names
+    """
+    if not description:
+        return pa.table({})
+    return pa.Table.from_arrays(_column_arrays(rows, description),
+                                names=[column[0] for column in description])
+
+
+def rows_to_record_batch(
+        rows: Sequence[Tuple],
+        description: Sequence[Tuple],
+        schema: Optional[pa.Schema] = None,
+) -> pa.RecordBatch:
+    """Same as rows_to_arrow for one chunk of a streamed result
+    :param schema: the schema of the previous chunks: the columns keep their type, except
+                   the ones inferred from the values, which widen when a chunk needs it (a
+                   column NULL in all the previous chunks, a larger DECIMAL)
+    """
+    return pa.RecordBatch.from_arrays(_column_arrays(rows, description, schema),
+                                      names=[column[0] for column in description])
+
+
+def arrow_to_polars(table: pa.Table) -> pl.DataFrame:
+    """Wrap an Arrow table in a polars DataFrame, without copy for most types"""
+    return pl.from_arrow(table)
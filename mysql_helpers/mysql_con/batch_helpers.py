@@ -0,0 +1,53 @@
+""" Helpers to split rows into multi-row statements that fit in a MySQL packet"""
+from typing import (Iterable, Iterator, List, Sequence, Any)
+
+# share of max_allowed_packet a batch may use, the rest is kept for the
+# statement itself and for escaping overhead
+PACKET_SAFETY_RATIO: float = 0.8
+# bytes added per value once rendered: quotes, comma, escaping margin
+VALUE_OVERHEAD_BYTES: int = 4
+DEFAULT_MAX_ALLOWED_PACKET: int = 4 * 1024 * 1024
+
+
+def estimate_row_size(row: Sequence[Any]) -> int:
+    """Rough size in bytes of a row once rendered in a VALUES (...) clause"""
+    row_size: int = 2  # parentheses
+    for value in row:
+        if value is None:
+            row_size += 4  # NULL
+        elif isinstance(value, (bytes, bytearray)):
+            row_size += 2 * len(value)  # worst case hex escaping
+        else:
+            row_size += len(str(value).encode("utf-8"))
+        row_size += VALUE_OVERHEAD_BYTES
+    return row_size
+
+
+def iter_batches(
+        rows: Iterable[Sequence[Any]],
+        batch_size: int,
+        max_allowed_packet: int = DEFAULT_MAX_ALLOWED_PACKET,
+        sql_query: str = "",
+) -> Iterator[List[Sequence[Any]]]:
+    """Yield lists of rows holding at most batch_size rows and whose rendered size
+    stays below max_allowed_packet
+    :param rows: the rows to split, can be a generator
+    :param batch_size: max number of rows per batch
+    :param max_allowed_packet: the server max_allowed_packet in bytes
+    :param sql_query: the statement the rows are used with, counted in the packet size
+    """
+    if batch_size <= 0:
+        raise ValueError(f"batch_size must be a positive integer, got: {batch_size}")
+
+    max_batch_bytes: int = int(max_allowed_packet * PACKET_SAFETY_RATIO) - len(sql_query)
+    batch: List[Sequence[Any]] = []
+    batch_bytes: int = 0
+    for row in rows:
+        row_size: int = estimate_row_size(row) + 1  # comma between rows
+        if batch and (len(batch) >= batch_size or batch_bytes + row_size > max_batch_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(row)
+        batch_bytes += row_size
+    if batch:
+        yield batch
@@ -0,0 +1,94 @@
+""" Builds pandas DataFrames column by column from raw cursor rows"""
+from __future__ import annotations
+
+from operator import itemgetter
+from typing import (Union, Optional, List, Tuple, Sequence, Any)
+
+from mysql.connector.constants import FieldType, FieldFlag
+
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+from mysql_helpers.mysql_con.raw_helpers import raw_column_to_array
+
+# imported by the first conversion, not by the connectors modules
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+INTEGER_TYPES = frozenset([FieldType.TINY, FieldType.SHORT, FieldType.LONG,
+                           FieldType.INT24, FieldType.LONGLONG, FieldType.YEAR])
+FLOAT_TYPES = frozenset([FieldType.FLOAT, FieldType.DOUBLE])
+DATETIME_TYPES = frozenset([FieldType.DATETIME, FieldType.TIMESTAMP])
+TIME_TYPES = frozenset([FieldType.TIME])
+
+
+def column_dtype(field_type: int, flags: int = 0) -> Union[None, np.dtype]:
+    """Return the numpy dtype matching a MySQL field type, None for object columns
+    :param field_type: the type_code of a cursor.description entry
+    :param flags: the flags of a cursor.description entry
+    """
+    if field_type in INTEGER_TYPES:
+        if field_type == FieldType.LONGLONG and flags & FieldFlag.UNSIGNED:
+            return np.dtype(np.uint64)
+        return np.dtype(np.int64)
+    if field_type in FLOAT_TYPES:
+        return np.dtype(np.float64)
+    if field_type in DATETIME_TYPES:
+        return np.dtype("datetime64[ns]")
+    if field_type in TIME_TYPES:
+        return np.dtype("timedelta64[ns]")
+    return None
+
+
+def column_to_array(values: Sequence[Any], dtype: Union[None, np.dtype]) -> np.ndarray:
+    """Convert the values of one column to a typed numpy array
+    NULLs become NaN/NaT, integer columns holding NULLs are stored as float64 like pandas does
+    """
+    if dtype is not None:
+        if not values:
+            return np.empty(0, dtype=dtype)
+        try:
+            # pandas parses datetime objects much faster than numpy does, the resolution it
+            # infers depends on its version and on the values (s for dates)
+            if dtype.kind == "M":
+                return pd.to_datetime(values).to_numpy().astype(dtype)
+            if dtype.kind == "m":
+                return pd.to_timedelta(values).to_numpy().astype(dtype)
+            if dtype.kind in "iu" and None in values:
+                dtype = np.dtype(np.float64)
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            # e.g. zero dates returned as strings, fall back to plain objects
+            pass
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def rows_to_df(
+        rows: Sequence[Tuple],
+        description: Optional[Sequence[Tuple]],
+        raw: bool = False,
+) -> pd.DataFrame:
+    """Transpose raw cursor rows into one typed numpy array per column and wrap them in a
+    DataFrame without per-row dicts nor object dtype inference
+    :param rows: the rows returned by cursor.fetchall/fetchmany, as tuples
+    :param description: the cursor.description of the query
+    :param raw: the rows come from a raw cursor and hold the byte strings sent by the server
+    :return: a pandas DataFrame with the cursor column names
+    """
+    if not description:
+        return pd.DataFrame()
+
+    column_names: List[str] = [column[0] for column in description]
+    arrays = {}
+    for index, column in enumerate(description):
+        # one pass per column is much cheaper than zip(*rows) on large results
+        values: List[Any] = list(map(itemgetter(index), rows))
+        flags: int = column[7] if len(column) > 7 else 0
+        if raw:
+            arrays[index] = raw_column_to_array(values, column[1], flags)
+        else:
+            arrays[index] = column_to_array(values, column_dtype(column[1], flags))
+    result_df = pd.DataFrame(arrays, copy=False)
+    # set afterwards so that duplicated column names are kept
+    result_df.columns = column_names
+    return result_df
@@ -0,0 +1,53 @@
+""" Selection of the protocol implementation: the C extension or the pure Python one"""
+import logging
+from pathlib import Path
+from typing import (Type, Any)
+
+from mysql.connector import HAVE_CEXT, MySQLConnection
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+ENGINE_AUTO: str = "auto"
+ENGINE_C: str = "c"
+ENGINE_PURE: str = "pure"
+ENGINES: frozenset = frozenset([ENGINE_AUTO, ENGINE_C, ENGINE_PURE])
+
+
+def c_extension_available() -> bool:
+    """True when the _mysql_connector C extension can be loaded: it is missing from some
+    wheels and fails to load when its libmysqlclient or OpenSSL dependencies do not match
+    """
+    return HAVE_CEXT
+
+
+def resolve_engine(engine: str, c_supported: bool = True) -> str:
+    """Return the engine actually used, ENGINE_C or ENGINE_PURE, the connectors return the
+    same results with both (upsert_df counts its duplicates without the info message the C
+    extension does not return, DataFrames get the same dtypes)
+    :param engine: ENGINE_AUTO picks the C extension when it is available and falls back
+                   to pure Python, ENGINE_C requires it, ENGINE_PURE never uses it
+    :param c_supported: False for the drivers that have no C implementation (asyncio)
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {sorted(ENGINES)}, got: {engine}")
+    if engine == ENGINE_PURE:
+        return ENGINE_PURE
+    if not c_supported:
+        if engine == ENGINE_C:
+            raise ValueError("The asyncio driver has no C extension, use engine='auto' or 'pure'")
+        return ENGINE_PURE
+    if c_extension_available():
+        return ENGINE_C
+    if engine == ENGINE_C:
+        raise ValueError("The MySQL Connector/Python C extension is not available, "
+                         "install mysql-connector-python with its C extension or use engine='pure'")
+    logger.debug("C extension not available, using the pure Python protocol")
+    return ENGINE_PURE
+
+
+def connection_class(engine: str) -> Type[Any]:
+    """Return the connection class of a resolved engine"""
+    if engine == ENGINE_C:
+        from mysql.connector.connection_cext import CMySQLConnection
+        return CMySQLConnection
+    return MySQLConnection
@@ -0,0 +1,180 @@
+""" Writes streamed Arrow record batches to Parquet or CSV files, split at a size limit"""
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import (Union, Optional, List, Any)
+
+from mysql_helpers.mysql_con.arrow_helpers import unify_schemas, cast_batch
+from mysql_helpers.mysql_con.lazy_imports import LazyModule, import_optional
+
+pa = LazyModule("pyarrow", extra="arrow")
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+EXPORT_FORMATS = ("parquet", "csv")
+# compression of the whole CSV file, Parquet compresses each column chunk itself
+CSV_COMPRESSIONS = ("gzip", "bz2", "zstd", "lz4")
+
+
+class ExportFileWriter:
+    """Append record batches to a Parquet or CSV file, one Parquet row group per batch
+    Only the current batch is held in memory. With max_file_size the output is split: a
+    new file is started once the current one reaches the limit, the files being named
+    path stem + "-00000", "-00001"... + suffix.
+    The columns whose type comes from their values can widen in later batches (see
+    rows_to_record_batch): batches are cast to the widest schema, CSV files go on with the
+    wider types, a split Parquet output starts a new file, a single Parquet file is
+    rewritten with the wider schema one row group at a time.
+
+        writer = ExportFileWriter("proxies.parquet", "parquet", compression="zstd")
+        for batch in my_connector.fetch_arrow_batches(sql_query, chunk_size=100_000):
+            writer.write(batch)
+        paths = writer.close()
+    """
+
+    def __init__(
+            self,
+            path: Union[str, os.PathLike],
+            file_format: str = "parquet",
+            compression: Optional[str] = None,
+            max_file_size: Optional[int] = None,
+    ):
+        """
+        :param path: the file to write, the base name of the parts when split
+        :param file_format: "parquet" or "csv"
+        :param compression: Parquet column codec ("snappy", the default, "zstd", "gzip",
+                            "none"...), or whole file codec for CSV ("gzip", "zstd"...)
+        :param max_file_size: bytes after which a new file is started, checked between
+                              batches so files exceed it by up to one batch; no split if None
+        """
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {EXPORT_FORMATS}, got: {file_format}")
+        if file_format == "csv" and compression is not None and compression not in CSV_COMPRESSIONS:
+            raise ValueError(f"CSV compression must be one of {CSV_COMPRESSIONS}, got: {compression}")
+        if max_file_size is not None and max_file_size <= 0:
+            raise ValueError(f"max_file_size must be a positive integer, got: {max_file_size}")
+
+        self.path: Path = Path(path)
+        self.file_format: str = file_format
+        self.compression: Optional[str] = compression
+        self.max_file_size: Optional[int] = max_file_size
+        self.paths: List[str] = []
+        self.rows_written: int = 0
+        self._sink: Any = None
+        self._compressed_stream: Any = None
+        self._writer: Any = None
+        self._schema: Any = None
+
+    def _part_path(self) -> Path:
+        if self.max_file_size is None:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}-{len(self.paths):05d}{self.path.suffix}")
+
+    def _open(self, schema: pa.Schema):
+        part_path: Path = self._part_path()
+        self._sink = pa.OSFile(str(part_path), "wb")
+        self.paths.append(str(part_path))
+        if self.file_format == "parquet":
+            parquet = import_optional("pyarrow.parquet", extra="arrow")
+            self._writer = parquet.ParquetWriter(self._sink, schema, compression=self.compression or "snappy")
+        else:
+            csv = import_optional("pyarrow.csv", extra="arrow")
+            if self.compression is not None:
+                self._compressed_stream = pa.CompressedOutputStream(self._sink, self.compression)
+            self._writer = csv.CSVWriter(self._compressed_stream or self._sink, schema)
+
+    def _close_file(self):
+        writer, self._writer = self._writer, None
+        compressed_stream, self._compressed_stream = self._compressed_stream, None
+        sink, self._sink = self._sink, None
+        try:
+            if writer is not None:
+                writer.close()
+            # the writers do not close the streams they were given
+            if compressed_stream is not None and not compressed_stream.closed:
+                compressed_stream.close()
+        finally:
+            if sink is not None and not sink.closed:
+                sink.close()
+
+    def _widen(self, schema: pa.Schema):
+        """Go on with the wider types of a later batch"""
+        if self._writer is not None:
+            if self.file_format == "csv":
+                csv = import_optional("pyarrow.csv", extra="arrow")
+                # same file, the header is already written
+                self._writer.close()
+                self._writer = csv.CSVWriter(self._compressed_stream or self._sink, schema,
+                                             write_options=csv.WriteOptions(include_header=False))
+            elif self.max_file_size is not None:
+                self._close_file()
+            else:
+                self._rewrite_parquet(schema)
+        self._schema = schema
+
+    def _rewrite_parquet(self, schema: pa.Schema):
+        """Copy the row groups written so far into a new file with the wider schema
+        A Parquet file has one schema, the types usually widen in the first batches (a column
+        NULL in the first rows), so the copy is short; one row group is held at a time.
+        """
+        parquet = import_optional("pyarrow.parquet", extra="arrow")
+        self._close_file()
+        previous_path: Path = self.path.with_name(f"{self.path.name}.widening")
+        os.replace(self.paths.pop(), previous_path)
+        try:
+            self._open(schema)
+            previous_file = parquet.ParquetFile(str(previous_path))
+            for index in range(previous_file.num_row_groups):
+                row_group: pa.Table = previous_file.read_row_group(index)
+                self._writer.write_table(row_group.cast(schema), row_group_size=max(1, row_group.num_rows))
+                del row_group
+            previous_file.close()
+        finally:
+            os.remove(previous_path)
+
+    def _write_batch(self, batch: pa.RecordBatch):
+        if self.file_format == "parquet":
+            self._writer.write_batch(batch, row_group_size=max(1, batch.num_rows))
+        else:
+            self._writer.write_batch(batch)
+            if self._compressed_stream is not None and self.max_file_size is not None:
+                # the compressed size is only known once the codec buffer is flushed
+                self._compressed_stream.flush()
+        self.rows_written += batch.num_rows
+
+    def write(self, batch: pa.RecordBatch):
+        """Write one batch, as one row group in Parquet files"""
+        if self._schema is None:
+            self._schema = batch.schema
+        else:
+            schema: pa.Schema = unify_schemas(self._schema, batch.schema)
+            if schema != self._schema:
+                self._widen(schema)
+            batch = cast_batch(batch, self._schema)
+        if self._writer is not None and self.max_file_size is not None and self._sink.tell() >= self.max_file_size:
+            self._close_file()
+        if self._writer is None:
+            self._open(self._schema)
+        self._write_batch(batch)
+
+    def close(self) -> List[str]:
+        """Finish the current file
+        :return: the paths of the files written, empty when no batch was written
+        """
+        self._close_file()
+        return self.paths
+
+    def abort(self):
+        """Close and delete the files written, a failed export leaves no partial output"""
+        try:
+            self._close_file()
+        except Exception as ex:
+            logger.debug(f"Error while closing the export file: {ex}")
+        for part_path in self.paths:
+            try:
+                os.remove(part_path)
+            except OSError as ex:
+                logger.debug(f"Error while removing {part_path}: {ex}")
+        self.paths = []
@@ -0,0 +1,57 @@
+""" Helpers of the persistent connection mode: lost connection detection, reconnect backoff
+and closing of the persistent connections at interpreter exit"""
+import atexit
+import logging
+import weakref
+from pathlib import Path
+from typing import (Iterator, Any)
+
+from mysql.connector.errors import InterfaceError, OperationalError
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+# CR_SERVER_GONE_ERROR, CR_SERVER_LOST, CR_SERVER_LOST_EXTENDED, ER_CLIENT_INTERACTION_TIMEOUT
+LOST_CONNECTION_ERRNOS: frozenset = frozenset([2006, 2013, 2055, 4031])
+
+_persistent_connectors: "weakref.WeakSet[Any]" = weakref.WeakSet()
+_atexit_registered: bool = False
+
+
+def is_connection_lost(ex: Exception) -> bool:
+    """True when the error means the connection is dead (server gone, wait_timeout reached)
+    rather than a problem with the query itself
+    """
+    if not isinstance(ex, (InterfaceError, OperationalError)):
+        return False
+    # -1: "MySQL Connection not available", raised by cursor() on a closed connection
+    return ex.errno in LOST_CONNECTION_ERRNOS or ex.errno == -1
+
+
+def backoff_delays(attempts: int, base_delay: float, max_delay: float = 5.0) -> Iterator[float]:
+    """Yield the seconds to wait before each reconnect attempt: 0 then doubling delays"""
+    delay: float = base_delay
+    for attempt in range(attempts):
+        if attempt == 0:
+            yield 0.0
+        else:
+            yield min(delay, max_delay)
+            delay *= 2
+
+
+def close_at_exit(connector: Any):
+    """Close the persistent connection of a connector when the interpreter exits
+    The connector is referenced weakly and must implement _close_at_exit()
+    """
+    global _atexit_registered
+    _persistent_connectors.add(connector)
+    if not _atexit_registered:
+        atexit.register(_close_persistent_connectors)
+        _atexit_registered = True
+
+
+def _close_persistent_connectors():
+    for connector in list(_persistent_connectors):
+        try:
+            connector._close_at_exit()
+        except Exception as ex:
+            logger.debug(f"Error while closing persistent connection at exit: {ex}")
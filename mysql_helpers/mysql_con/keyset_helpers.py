@@ -0,0 +1,101 @@
+""" Helpers to scan a table with keyset (seek) pagination on an indexed key"""
+from __future__ import annotations
+
+from typing import (Union, Optional, List, Tuple, Dict, Sequence, Any, TYPE_CHECKING)
+
+from mysql_helpers.mysql_con.lazy_imports import is_dataframe
+from mysql_helpers.mysql_con.load_data_helpers import quote_identifier
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def key_columns_list(key_column: Union[str, Sequence[str]]) -> List[str]:
+    """Return the key columns as a list, a single column can be given as a string"""
+    key_columns: List[str] = [key_column] if isinstance(key_column, str) else list(key_column)
+    if not key_columns:
+        raise ValueError("key_column must name at least one column")
+    return key_columns
+
+
+def seek_condition(key_columns: Sequence[str]) -> str:
+    """Return the condition selecting the rows after a key, with one %s per key column
+    The row constructor (a, b) > (%s, %s) is written out so that the range on the first
+    column can use the index: a >= %s AND (a > %s OR (a = %s AND b > %s))
+    """
+    quoted: List[str] = [quote_identifier(column) for column in key_columns]
+    condition: str = f"{quoted[-1]} > %s"
+    for column in reversed(quoted[:-1]):
+        condition = f"{column} > %s OR ({column} = %s AND ({condition}))"
+    if len(quoted) > 1:
+        condition = f"{quoted[0]} >= %s AND ({condition})"
+    return condition
+
+
+def seek_variables(last_key: Sequence[Any]) -> Tuple:
+    """Return the parameters of seek_condition for the last key read"""
+    variables: List[Any] = [last_key[-1]]
+    for value in reversed(last_key[:-1]):
+        variables = [value, value] + variables
+    if len(last_key) > 1:
+        variables = [last_key[0]] + variables
+    return tuple(variables)
+
+
+def build_keyset_query(
+        table: str,
+        key_columns: Sequence[str],
+        page_size: int,
+        columns: Optional[Sequence[str]] = None,
+        where: Optional[str] = None,
+        seek: bool = True,
+) -> str:
+    """Return the query of one page, ordered by the key
+    :param table: the table name, can be prefixed by the schema name
+    :param key_columns: the columns of a unique index, the pages are read in their order
+    :param page_size: max number of rows of the page
+    :param columns: the columns to read, all of them if None, the key columns are added
+                    when missing
+    :param where: an extra filter, with %s placeholders for its parameters, which come
+                  before the seek_variables
+    :param seek: read the rows after the last key, False for the first page
+    """
+    if page_size <= 0:
+        raise ValueError(f"page_size must be a positive integer, got: {page_size}")
+
+    if columns:
+        selected: List[str] = list(columns) + [column for column in key_columns if column not in columns]
+        column_list: str = ", ".join(quote_identifier(column) for column in selected)
+    else:
+        column_list = "*"
+    conditions: List[str] = []
+    if where:
+        conditions.append(f"({where})")
+    if seek:
+        conditions.append(f"({seek_condition(key_columns)})")
+    sql_query: str = f"SELECT {column_list} FROM {quote_identifier(table)}"
+    if conditions:
+        sql_query += f" WHERE {' AND '.join(conditions)}"
+    order_by: str = ", ".join(quote_identifier(column) for column in key_columns)
+    return f"{sql_query} ORDER BY {order_by} LIMIT {int(page_size)}"
+
+
+def page_last_key(page: Union[List[Dict], pd.DataFrame], key_columns: Sequence[str]) -> Union[None, Tuple]:
+    """Return the key of the last row of a page, to save and pass back as start_after to
+    resume an interrupted scan. None for an empty page.
+    """
+    if len(page) == 0:
+        return None
+    if is_dataframe(page):
+        # tolist() gives back Python scalars the connector can send as parameters
+        return tuple(page[list(key_columns)].iloc[[-1]].to_numpy(dtype=object)[0].tolist())
+    return tuple(page[-1][column] for column in key_columns)
+
+
+def rows_last_key(rows: Sequence[Union[Dict, Tuple]], key_columns: Sequence[str], description: Sequence[Tuple]) -> Tuple:
+    """Return the key of the last row fetched, the rows being dicts or tuples"""
+    last_row = rows[-1]
+    if isinstance(last_row, dict):
+        return tuple(last_row[column] for column in key_columns)
+    column_names: List[str] = [column[0] for column in description]
+    return tuple(last_row[column_names.index(column)] for column in key_columns)
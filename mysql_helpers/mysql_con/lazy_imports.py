@@ -0,0 +1,47 @@
+""" Optional heavy dependencies (pandas, numpy, pyarrow, polars) imported on first use"""
+import importlib
+import sys
+from types import ModuleType
+from typing import (Union, Any)
+
+INSTALL_HINT: str = "pip install mysql_helpers[{extra}]"
+
+
+def import_optional(name: str, extra: str = "pandas") -> ModuleType:
+    """Import a module needed by the DataFrame methods, with an install hint if missing
+    :param extra: the setup.py extra installing the module
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError as ex:
+        raise ImportError(f"{name} is required by this method, install it with: "
+                          f"{INSTALL_HINT.format(extra=extra)}") from ex
+
+
+class LazyModule:
+    """Stand-in for a module, imported on the first attribute access
+
+        pd = LazyModule("pandas")
+        pd.DataFrame(...)  # pandas is imported here
+    """
+
+    def __init__(self, name: str, extra: str = "pandas"):
+        self._name: str = name
+        self._extra: str = extra
+        self._module: Union[None, ModuleType] = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        if self._module is None:
+            self._module = import_optional(self._name, self._extra)
+        return getattr(self._module, attribute)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{'' if self._module is None else ' (loaded)'}>"
+
+
+def is_dataframe(value: Any) -> bool:
+    """isinstance(value, pd.DataFrame) without importing pandas: when pandas was never
+    imported the value cannot be a DataFrame
+    """
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(value, pandas.DataFrame)
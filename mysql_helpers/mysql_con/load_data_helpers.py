@@ -0,0 +1,93 @@
+""" Helpers to bulk load pandas DataFrames with LOAD DATA LOCAL INFILE"""
+from __future__ import annotations
+
+import csv
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import (Iterator, List)
+
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+
+pd = LazyModule("pandas")
+
+LOAD_DATA_MODES = {"append": "", "replace": "REPLACE", "ignore": "IGNORE"}
+NULL_MARKER: str = "\\N"
+DATETIME_FORMAT: str = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def quote_identifier(identifier: str) -> str:
+    """Quote a table or column name with backticks, schema.table names are quoted per part"""
+    return ".".join(f"`{part.replace('`', '``')}`" for part in str(identifier).split("."))
+
+
+def build_load_data_query(table: str, columns: List[str], file_path: str, mode: str = "append") -> str:
+    """Return the LOAD DATA LOCAL INFILE statement matching the csv written by df_to_csv
+    :param table: the table name, can be prefixed by the schema name
+    :param columns: the columns of the csv, in order
+    :param file_path: the csv path on the client
+    :param mode: append fails on duplicate keys, replace overwrites them, ignore skips them
+    """
+    if mode not in LOAD_DATA_MODES:
+        raise ValueError(f"mode must be one of {list(LOAD_DATA_MODES)}, got: {mode}")
+
+    escaped_path: str = file_path.replace("\\", "\\\\").replace("'", "\\'")
+    column_list: str = ", ".join(quote_identifier(column) for column in columns)
+    return (
+        f"LOAD DATA LOCAL INFILE '{escaped_path}' {LOAD_DATA_MODES[mode]} "
+        f"INTO TABLE {quote_identifier(table)} CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+        f"LINES TERMINATED BY '\\n' ({column_list})"
+    )
+
+
+def df_to_csv(df: pd.DataFrame, file_path: str, chunk_size: int = 100_000):
+    """Write a DataFrame in the csv dialect read by build_load_data_query
+    NULLs (None, NaN, NaT) are written as \\N, backslashes in text are escaped, booleans as 1/0
+    """
+    # shallow copy, only the columns needing a conversion are replaced
+    df = df.copy(deep=False)
+    for column_name, column in df.items():
+        if pd.api.types.is_bool_dtype(column):
+            df[column_name] = column.astype("Int8")
+        elif pd.api.types.infer_dtype(column, skipna=True) == "string":
+            df[column_name] = column.str.replace("\\", "\\\\", regex=False)
+        elif pd.api.types.is_object_dtype(column):
+            df[column_name] = column.map(
+                lambda value: value.replace("\\", "\\\\") if isinstance(value, str) else value
+            )
+
+    df.to_csv(
+        file_path,
+        index=False,
+        header=False,
+        na_rep=NULL_MARKER,
+        date_format=DATETIME_FORMAT,
+        quoting=csv.QUOTE_MINIMAL,
+        quotechar='"',
+        doublequote=True,
+        lineterminator="\n",
+        encoding="utf-8",
+        chunksize=chunk_size,
+    )
+
+
+@contextmanager
+def temporary_csv_path() -> Iterator[str]:
+    """Yield the path of an empty temporary csv file, deleted on exit"""
+    file_descriptor, file_path = tempfile.mkstemp(prefix="mysql_helpers_", suffix=".csv")
+    os.close(file_descriptor)
+    try:
+        yield file_path
+    finally:
+        os.remove(file_path)
+
+
+@contextmanager
+def df_as_csv_file(df: pd.DataFrame, chunk_size: int = 100_000) -> Iterator[str]:
+    """Write the DataFrame to a temporary csv file, deleted on exit
+    :return: the temporary file path
+    """
+    with temporary_csv_path() as file_path:
+        df_to_csv(df, file_path, chunk_size=chunk_size)
+        yield file_path
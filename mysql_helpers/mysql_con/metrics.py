@@ -0,0 +1,215 @@
+""" Counters and histograms of the connectors activity, with a Prometheus text exposition"""
+import threading
+from bisect import bisect_left
+from typing import (Union, Optional, Dict, List, Tuple, Sequence, Any)
+
+from mysql_helpers.mysql_con.batch_helpers import estimate_row_size
+
+# upper bounds in seconds, from sub-millisecond point selects to long reports
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+# rows used to estimate the size of a result
+SIZE_SAMPLE_ROWS: int = 20
+
+COUNTERS: Tuple[str, ...] = (
+    "queries", "rows_returned", "bytes_sent", "bytes_received", "commits", "rollbacks",
+)
+HISTOGRAMS: Tuple[str, ...] = ("checkout_wait_seconds", "execute_seconds", "fetch_seconds")
+HELP_TEXTS: Dict[str, str] = {
+    "queries": "Statements executed",
+    "rows_returned": "Rows fetched from the server",
+    "bytes_sent": "Estimated bytes of the statements sent",
+    "bytes_received": "Estimated bytes of the rows received",
+    "commits": "Commits",
+    "rollbacks": "Rollbacks",
+    "errors": "Errors by exception class",
+    "checkout_wait_seconds": "Time to get a connection from the pool or to open one",
+    "execute_seconds": "Time to execute a statement, until the first result packet",
+    "fetch_seconds": "Time to fetch the rows of a result",
+    "connections_in_use": "Connections checked out",
+    "connections_idle": "Open connections waiting in the pool",
+}
+
+
+def estimate_rows_bytes(rows: Sequence[Any]) -> int:
+    """Rough size in bytes of rows on the wire, extrapolated from the first rows"""
+    if not rows:
+        return 0
+    sample = rows[:SIZE_SAMPLE_ROWS]
+    sample_size: int = sum(
+        estimate_row_size(row.values() if isinstance(row, dict) else row) for row in sample
+    )
+    return sample_size * len(rows) // len(sample)
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, not thread-safe on its own"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative: int = 0
+        buckets: Dict[str, int] = {}
+        for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += bucket_count
+            buckets["+Inf" if upper_bound == float("inf") else repr(upper_bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class ConnectorMetrics:
+    """Activity metrics of one or several connectors
+
+    Recording is a few additions under a lock, cheap enough to stay on in production.
+    Pass enabled=False to turn it off, or share one instance between connectors.
+    """
+
+    def __init__(self, enabled: bool = True, latency_buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        """
+        :param enabled: record the activity, when False every call is a no-op
+        :param latency_buckets: upper bounds in seconds of the latency histograms
+        """
+        self.enabled: bool = enabled
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.errors: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {
+            name: Histogram(latency_buckets) for name in HISTOGRAMS
+        }
+        self._lock = threading.Lock()
+
+    def observe_checkout(self, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.histograms["checkout_wait_seconds"].observe(seconds)
+
+    def observe_execute(self, seconds: float, sql_query: str = ""):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.histograms["execute_seconds"].observe(seconds)
+            self.counters["queries"] += 1
+            self.counters["bytes_sent"] += len(sql_query)
+
+    def observe_fetch(self, seconds: float, rows: Sequence[Any]):
+        if not self.enabled:
+            return
+        bytes_received: int = estimate_rows_bytes(rows)
+        with self._lock:
+            self.histograms["fetch_seconds"].observe(seconds)
+            self.counters["rows_returned"] += len(rows)
+            self.counters["bytes_received"] += bytes_received
+
+    def observe_rows_sent(self, rows: Sequence[Sequence[Any]]):
+        """Count the parameters of bulk statements in bytes_sent"""
+        if not self.enabled:
+            return
+        bytes_sent: int = estimate_rows_bytes(rows)
+        with self._lock:
+            self.counters["bytes_sent"] += bytes_sent
+
+    def record_commit(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters["commits"] += 1
+
+    def record_rollback(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters["rollbacks"] += 1
+
+    def record_error(self, ex: BaseException):
+        if not self.enabled:
+            return
+        error_name: str = ex.__class__.__name__
+        with self._lock:
+            self.errors[error_name] = self.errors.get(error_name, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the counters, errors and histograms"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+            stats["errors"] = dict(self.errors)
+            for name, histogram in self.histograms.items():
+                stats[name] = histogram.snapshot()
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.errors = {}
+            for name, histogram in self.histograms.items():
+                self.histograms[name] = Histogram(histogram.buckets)
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+def prometheus_text(
+        stats: Dict[str, Any],
+        namespace: str = "mysql_helpers",
+        labels: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Render a stats() snapshot in the Prometheus text exposition format
+    :param stats: the snapshot returned by a connector stats() or ConnectorMetrics.snapshot()
+    :param namespace: prefix of the metric names
+    :param labels: labels added to every sample, e.g. the host and database
+    """
+    labels = labels or {}
+    lines: List[str] = []
+
+    def add_header(metric_name: str, name: str, metric_type: str):
+        lines.append(f"# HELP {metric_name} {HELP_TEXTS.get(name, name)}")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+
+    for name in COUNTERS:
+        if name in stats:
+            metric_name: str = f"{namespace}_{name}_total"
+            add_header(metric_name, name, "counter")
+            lines.append(f"{metric_name}{_format_labels(labels)} {stats[name]}")
+
+    if "errors" in stats:
+        metric_name = f"{namespace}_errors_total"
+        add_header(metric_name, "errors", "counter")
+        for error_name, error_count in sorted(stats["errors"].items()):
+            lines.append(f"{metric_name}{_format_labels({**labels, 'exception': error_name})} {error_count}")
+
+    for name in ("connections_in_use", "connections_idle"):
+        value: Union[None, int] = stats.get(name)
+        if value is not None:
+            metric_name = f"{namespace}_{name}"
+            add_header(metric_name, name, "gauge")
+            lines.append(f"{metric_name}{_format_labels(labels)} {value}")
+
+    for name in HISTOGRAMS:
+        histogram: Union[None, Dict[str, Any]] = stats.get(name)
+        if histogram is None:
+            continue
+        metric_name = f"{namespace}_{name}"
+        add_header(metric_name, name, "histogram")
+        for upper_bound, bucket_count in histogram["buckets"].items():
+            lines.append(f"{metric_name}_bucket{_format_labels({**labels, 'le': upper_bound})} {bucket_count}")
+        lines.append(f"{metric_name}_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{metric_name}_count{_format_labels(labels)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
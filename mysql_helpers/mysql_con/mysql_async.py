@@ -1,17 +1,51 @@
 """inspired from docs
 https://dev.mysql.com/doc/connector-python/en/connector-python-asyncio.html
 """
+from __future__ import annotations
+
 import asyncio
 import logging
-from os import environ
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from os import environ, PathLike
 from pathlib import Path
-from typing import (Union, Optional, Dict, List, Tuple)
+from time import perf_counter, monotonic
+from typing import (Union, Optional, Dict, List, Tuple, Iterable, Sequence, Any, AsyncIterator,
+                    FrozenSet, TYPE_CHECKING)
 
-import pandas as pd
 from mysql.connector.aio import MySQLConnectionAbstract as _MySQLConnectionAbstract
 from mysql.connector.aio import connect as _connect
 from mysql.connector.aio.cursor import MySQLCursorAbstract as _MySQLCursorAbstract
 
+from mysql_helpers.mysql_con.arrow_helpers import rows_to_arrow, rows_to_record_batch, arrow_to_polars
+from mysql_helpers.mysql_con.batch_helpers import iter_batches
+from mysql_helpers.mysql_con.df_helpers import rows_to_df
+from mysql_helpers.mysql_con.engine_helpers import ENGINE_AUTO, resolve_engine
+from mysql_helpers.mysql_con.export_helpers import ExportFileWriter
+from mysql_helpers.mysql_con.keep_alive import is_connection_lost, backoff_delays, close_at_exit
+from mysql_helpers.mysql_con.keyset_helpers import (key_columns_list, build_keyset_query, seek_variables,
+                                                    rows_last_key)
+from mysql_helpers.mysql_con.load_data_helpers import (build_load_data_query, df_to_csv,
+                                                        temporary_csv_path)
+from mysql_helpers.mysql_con.metrics import ConnectorMetrics, prometheus_text
+from mysql_helpers.mysql_con.mysql_async_pool import MySQLAsyncPool
+from mysql_helpers.mysql_con.partition_helpers import (partition_bounds, build_bounds_query,
+                                                       build_partition_queries, partitions_to_df)
+from mysql_helpers.mysql_con.prepared_cache import PreparedStatementCache
+from mysql_helpers.mysql_con.query_cache import QueryResultCache, is_read_query, referenced_tables
+from mysql_helpers.mysql_con.record_helpers import ColumnarResult, rows_to_records
+from mysql_helpers.mysql_con.slow_query_log import (SlowQueryLog, QueryProfile, PhaseTimer,
+                                                    is_explainable, parse_explain)
+from mysql_helpers.mysql_con.upsert_helpers import (build_upsert_query, df_to_sql_values, split_values,
+                                                    upsert_counts, RESET_DUPLICATES_QUERY,
+                                                    READ_DUPLICATES_QUERY)
+from mysql_helpers.mysql_con.write_buffer import AsyncWriteBuffer
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import polars as pl
+    import pyarrow as pa
+
 logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
 
 
@@ -24,7 +58,54 @@ class MySQLConnectorNativeAsync:
             db_password: Optional[str] = None,
             db_name: Optional[str] = None,
             raise_on_warnings: bool = False,
+            allow_local_infile: bool = False,
+            use_prepared_statements: bool = False,
+            prepared_cache_size: int = 128,
+            result_cache: Optional[QueryResultCache] = None,
+            metrics: Optional[ConnectorMetrics] = None,
+            slow_query_log: Optional[SlowQueryLog] = None,
+            pool_size: Optional[int] = None,
+            pool_min_size: int = 1,
+            pool_acquire_timeout: float = 10.0,
+            pool_max_idle: Optional[int] = None,
+            pool_health_check_interval: float = 0.0,
+            persistent: bool = False,
+            idle_ping_interval: float = 30.0,
+            reconnect_attempts: int = 3,
+            reconnect_backoff: float = 0.2,
+            engine: str = ENGINE_AUTO,
     ):
+        """
+        :param allow_local_infile: allow LOAD DATA LOCAL INFILE, needed by write_df
+        :param use_prepared_statements: run fetch_all_as_df, fetch_all_as_dicts and
+                                        execute_one_query as server side prepared statements
+                                        (binary protocol), cached per connection
+        :param prepared_cache_size: max number of prepared statements kept per connection
+        :param result_cache: cache of fetch_all_as_df and fetch_all_as_dicts results, can be
+                             shared between connectors, invalidated by this connector writes
+        :param metrics: where the activity is recorded, a new ConnectorMetrics if None,
+                        ConnectorMetrics(enabled=False) turns the recording off
+        :param slow_query_log: profile each call (connect or checkout, execute, fetch, DataFrame
+                               conversion) and log the queries slower than its threshold
+        :param pool_size: when set, each call borrows a connection from a MySQLAsyncPool
+                          of at most pool_size connections so concurrent calls run in parallel,
+                          and gives it back at its end whatever close_connection: a kept
+                          connection would be shared by concurrent tasks, use transaction()
+        :param pool_min_size: connections opened when the pool initializes
+        :param pool_acquire_timeout: seconds to wait for a free pooled connection
+        :param pool_max_idle: max number of idle pooled connections kept open
+        :param pool_health_check_interval: ping pooled connections idle for longer than this
+        :param persistent: without pool, keep the connection open between calls whatever
+                           close_connection says, reconnect when it was lost and replay a failed
+                           read once. Close it with close_connection(force=True) or async with,
+                           else it is closed at interpreter exit if its event loop still exists
+        :param idle_ping_interval: in persistent mode, ping the connection before reusing it
+                                   only when it was idle for longer than this, in seconds
+        :param reconnect_attempts: in persistent mode, connection attempts before giving up
+        :param reconnect_backoff: seconds before the second attempt, doubled at each attempt
+        :param engine: accepted for parity with the sync connectors, the asyncio driver only
+                       has the pure Python protocol: "auto" and "pure" select it, "c" raises
+        """
         self.db_host: str = environ["MYSQL_DB_HOST"] if db_host is None else db_host
         self.db_port: Union[int, str] = (
             int(environ["MYSQL_DB_PORT"]) if db_port is None else int(db_port)
@@ -35,62 +116,534 @@ class MySQLConnectorNativeAsync:
         )
         self.db_name: str = environ["MYSQL_DB_NAME"] if db_name is None else db_name
         self.raise_on_warnings: bool = raise_on_warnings
+        self.allow_local_infile: bool = allow_local_infile
         self.mysql_connection: Union[None, _MySQLConnectionAbstract] = None
+        self.max_allowed_packet: Union[None, int] = None
+        self.prepared_cache: Union[None, PreparedStatementCache] = (
+            PreparedStatementCache(max_size=prepared_cache_size) if use_prepared_statements else None
+        )
+        self.result_cache: Union[None, QueryResultCache] = result_cache
+        self.metrics: ConnectorMetrics = ConnectorMetrics() if metrics is None else metrics
+        self.slow_query_log: Union[None, SlowQueryLog] = slow_query_log
+        # {"connection": ..., "depth": ..., "tables": [...]} of the transaction opened by the
+        # current task, its written tables are invalidated in the result cache on commit
+        self._transaction_state: ContextVar[Union[None, Dict]] = ContextVar(
+            f"mysql_helpers_transaction_{id(self)}", default=None
+        )
+
+        # the pool keeps its connections open and pings them with pool_health_check_interval
+        self.persistent: bool = persistent and pool_size is None
+        self.idle_ping_interval: float = idle_ping_interval
+        self.reconnect_attempts: int = max(1, reconnect_attempts)
+        self.reconnect_backoff: float = reconnect_backoff
+        # monotonic time the persistent connection was last known alive
+        self.last_used: float = 0.0
+        # ping the persistent connection before its next use, set after an error
+        self._check_connection: bool = False
+        # the event loop the connection streams belong to
+        self._connection_loop: Union[None, asyncio.AbstractEventLoop] = None
+        self.engine: str = resolve_engine(engine, c_supported=False)
+        if self.persistent:
+            close_at_exit(self)
+
+        self.mysql_pool: Union[None, MySQLAsyncPool] = None
+        if pool_size is not None:
+            self.mysql_pool = MySQLAsyncPool(
+                connection_config=self.connection_config(),
+                min_size=min(pool_min_size, pool_size),
+                max_size=pool_size,
+                acquire_timeout=pool_acquire_timeout,
+                max_idle=pool_max_idle,
+                health_check_interval=pool_health_check_interval,
+                on_close=self._forget_prepared_statements,
+            )
+
+    def connection_config(self) -> Dict:
+        """Return the keyword arguments used to open a connection"""
+        return dict(
+            host=self.db_host,
+            port=self.db_port,
+            user=self.db_user,
+            password=self.db_password,
+            database=self.db_name,
+            get_warnings=True,
+            raise_on_warnings=self.raise_on_warnings,
+            allow_local_infile=self.allow_local_infile,
+        )
 
     async def open_connection(self) -> _MySQLConnectionAbstract:
-        """Return mysql connection if needed or raise an error"""
-        if self.mysql_connection is not None and await self.mysql_connection.is_connected():
+        """Return mysql connection if needed or raise an error
+        In pool mode the connection is borrowed from the pool and kept until close_connection,
+        for the caller's own use: the methods of the connector borrow their own connections
+        """
+        if self.mysql_pool is not None:
+            if self.mysql_connection is None:
+                self.mysql_connection = await self._acquire_pooled_connection()
             return self.mysql_connection
 
-        try:
-            self.mysql_connection = await _connect(
-                host=self.db_host,
-                port=self.db_port,
-                user=self.db_user,
-                password=self.db_password,
-                database=self.db_name,
-                get_warnings=True,
-                raise_on_warnings=self.raise_on_warnings,
-            )
+        if self.mysql_connection is not None and await self._connection_alive():
             return self.mysql_connection
-        except Exception as ex:
-            raise ConnectionError(f'Failed to connect to database\n'
-                                  f'Exception: {ex}')
 
-    async def close_connection(self):
+        self._forget_prepared_statements(self.mysql_connection)
+        started: float = perf_counter()
+        attempts: int = self.reconnect_attempts if self.persistent else 1
+        for delay in backoff_delays(attempts, self.reconnect_backoff):
+            await asyncio.sleep(delay)
+            try:
+                self.mysql_connection = await _connect(**self.connection_config())
+                self.metrics.observe_checkout(perf_counter() - started)
+                self.last_used = monotonic()
+                self._connection_loop = asyncio.get_running_loop()
+                return self.mysql_connection
+            except Exception as ex:
+                self.metrics.record_error(ex)
+                connection_error: Exception = ex
+        raise ConnectionError(f'Failed to connect to database\n'
+                              f'Exception: {connection_error}')
+
+    async def _connection_alive(self) -> bool:
+        """Ping the connection, in persistent mode only when idle for longer than
+        idle_ping_interval or after an error
+        """
+        if (self.persistent and not self._check_connection
+                and monotonic() - self.last_used < self.idle_ping_interval):
+            return True
+        self._check_connection = False
+        if not await self.mysql_connection.is_connected():
+            return False
+        self.last_used = monotonic()
+        return True
+
+    async def close_connection(self, force: bool = False):
+        """Close the connection, or give it back to the pool in pool mode
+        :param force: close it in persistent mode too, where it is kept open otherwise
+        """
+        if self.mysql_pool is not None:
+            if self.mysql_connection is not None:
+                connection, self.mysql_connection = self.mysql_connection, None
+                await self.mysql_pool.release(connection)
+            return
+        if self.persistent and not force:
+            self.last_used = monotonic()
+            return
+
+        self._forget_prepared_statements(self.mysql_connection)
         if self.mysql_connection is not None and await self.mysql_connection.is_connected():
             await self.mysql_connection.close()
+        self.mysql_connection = None
+
+    async def _drop_connection(self):
+        """Close the connection without the ping of close_connection(), which fails while an
+        unbuffered result is unread: the rest of the result is dropped with the socket
+        instead of being read
+        """
+        self._forget_prepared_statements(self.mysql_connection)
+        try:
+            await self.mysql_connection.close()
+        except Exception as ex:
+            logger.debug(f"Error while closing connection: {ex}")
+        self.mysql_connection = None
+
+    async def close_pool(self):
+        """Release the kept connection and close all pooled connections"""
+        if self.mysql_pool is not None:
+            await self.close_connection()
+            await self.mysql_pool.close()
+
+    async def __aenter__(self) -> "MySQLConnectorNativeAsync":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.mysql_pool is not None:
+            await self.close_pool()
+        else:
+            await self.close_connection(force=True)
+
+    def _close_at_exit(self):
+        """The connection can only be closed on the event loop it was opened in: when that
+        loop was closed (asyncio.run) the socket is left to the operating system
+        """
+        if self.mysql_connection is None:
+            return
+        loop = self._connection_loop
+        if loop is not None and not loop.is_closed() and not loop.is_running():
+            loop.run_until_complete(self.close_connection(force=True))
+        else:
+            logger.warning("Persistent connection still open at exit, close it with "
+                           "await close_connection(force=True) or async with before the event loop ends")
+
+    @property
+    def in_transaction(self) -> bool:
+        """True inside a transaction() block opened by the current task"""
+        return self._transaction_state.get() is not None
+
+    async def _acquire_pooled_connection(self) -> _MySQLConnectionAbstract:
+        started: float = perf_counter()
+        connection = await self.mysql_pool.acquire()
+        self.metrics.observe_checkout(perf_counter() - started)
+        return connection
+
+    async def _acquire_connection(self) -> _MySQLConnectionAbstract:
+        """Return the connection of the current transaction if any, else a connection from
+        the pool, or the connection of the connector without pool
+        """
+        transaction_state = self._transaction_state.get()
+        if transaction_state is not None:
+            return transaction_state["connection"]
+        if self.mysql_pool is not None:
+            return await self._acquire_pooled_connection()
+        return await self.open_connection()
+
+    async def _release_connection(self,
+                                  connection: _MySQLConnectionAbstract,
+                                  close_connection: bool):
+        """Give back a pooled connection, close the connection of the connector or keep it
+        for the next calls. The connection of the current transaction stays open until the
+        block ends
+        """
+        transaction_state = self._transaction_state.get()
+        if transaction_state is not None and connection is transaction_state["connection"]:
+            return
+        if self.mysql_pool is not None:
+            # concurrent tasks must not share it, see pool_size
+            await self.mysql_pool.release(connection)
+        elif close_connection:
+            await self.close_connection()
+
+    async def _end_stream(self,
+                          connection: _MySQLConnectionAbstract,
+                          mysql_cursor: Union[_MySQLCursorAbstract, None],
+                          finished: bool,
+                          close_connection: bool):
+        """Release the connection of an unbuffered stream. A stream stopped before the end of
+        its result (break, a limit, an error) closes its connection rather than reading the
+        rest of the result, except the transaction one and a kept connection
+        """
+        stopped: bool = mysql_cursor is not None and not finished and not self.in_transaction
+        if stopped and self.mysql_pool is not None:
+            await self.mysql_pool.discard(connection)
+            return
+        if stopped and close_connection and not self.persistent:
+            await self._drop_connection()
+        elif mysql_cursor is not None:
+            await connection.consume_results()
+            await mysql_cursor.close()
+        await self._release_connection(connection, close_connection)
+
+    async def _run_statement(self, connection: _MySQLConnectionAbstract, sql_query: str):
+        mysql_cursor = await connection.cursor()
+        await mysql_cursor.execute(sql_query)
+        await mysql_cursor.close()
+
+    @asynccontextmanager
+    async def transaction(
+            self,
+            close_connection: Optional[bool] = True,
+    ) -> AsyncIterator["MySQLConnectorNativeAsync"]:
+        """Unit of work: the statements run by the current task inside the block share one
+        connection and are committed once at the end, or rolled back if the block raises.
+        Inside the block the methods raise their errors instead of logging them, and results
+        are not cached. Nested blocks use savepoints, rolled back alone when the nested block
+        raises. The statements of a transaction must not run concurrently (asyncio.gather).
+
+            async with my_connector.transaction():
+                await my_connector.execute_one_query(...)
+                await my_connector.execute_one_query(...)
+
+        :param close_connection: close connection after the outermost block ends
+        """
+        transaction_state = self._transaction_state.get()
+        if transaction_state is not None:
+            connection = transaction_state["connection"]
+            savepoint_name: str = f"mysql_helpers_sp_{transaction_state['depth']}"
+            await self._run_statement(connection, f"SAVEPOINT {savepoint_name}")
+            transaction_state["depth"] += 1
+            try:
+                yield self
+            except BaseException:
+                await self._run_statement(connection, f"ROLLBACK TO SAVEPOINT {savepoint_name}")
+                raise
+            else:
+                await self._run_statement(connection, f"RELEASE SAVEPOINT {savepoint_name}")
+            finally:
+                transaction_state["depth"] -= 1
+            return
+
+        connection = await self._acquire_connection()
+        try:
+            if connection.in_transaction:
+                # ends the snapshot left open by previous reads, as START TRANSACTION would
+                await connection.commit()
+            await connection.start_transaction()
+        except BaseException:
+            await self._release_connection(connection, close_connection)
+            raise
+
+        token = self._transaction_state.set({"connection": connection, "depth": 1, "tables": []})
+        try:
+            yield self
+        except BaseException:
+            try:
+                await connection.rollback()
+                self.metrics.record_rollback()
+            except Exception as ex:
+                logger.error(f"Error while rolling back transaction: {ex}")
+            raise
+        else:
+            await connection.commit()
+            self.metrics.record_commit()
+            for tables in self._transaction_state.get()["tables"]:
+                self.result_cache.invalidate_tables(tables)
+        finally:
+            self._transaction_state.reset(token)
+            await self._release_connection(connection, close_connection)
+
+    def _forget_prepared_statements(self, connection: Union[None, _MySQLConnectionAbstract]):
+        """Drop the cached statements of a connection, the server frees them on disconnect"""
+        if self.prepared_cache is not None and connection is not None:
+            self.prepared_cache.forget_connection(connection.connection_id)
+
+    async def _execute_query(
+            self,
+            connection: _MySQLConnectionAbstract,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            dictionary: bool = False,
+            profile: Optional[QueryProfile] = None,
+    ) -> _MySQLCursorAbstract:
+        """Return a cursor on which the query was executed
+        In prepared statements mode the cursor comes from the prepared statement cache
+        and must be released with _close_cursor, not closed
+        """
+        started: float = perf_counter()
+        if self.prepared_cache is None:
+            mysql_cursor = await connection.cursor(dictionary=dictionary)
+            await mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            return mysql_cursor
+
+        connection_id: int = connection.connection_id
+        key: Tuple[str, bool] = (sql_query, dictionary)
+        cached_statement = self.prepared_cache.lookup(connection_id, key)
+        if cached_statement is None:
+            mysql_cursor = await connection.cursor(prepared=True, dictionary=dictionary)
+            for evicted_cursor in self.prepared_cache.store(connection_id, key, sql_query, mysql_cursor):
+                await evicted_cursor.close()
+            cached_statement = (sql_query, mysql_cursor)
+
+        prepared_query, mysql_cursor = cached_statement
+        try:
+            await mysql_cursor.execute(prepared_query, sql_variables)
+        except Exception:
+            self.prepared_cache.discard(connection_id, key)
+            try:
+                await mysql_cursor.close()
+            except Exception as ex:
+                logger.debug(f"Error while closing prepared statement: {ex}")
+            raise
+        self._observe_execute(started, sql_query, profile)
+        return mysql_cursor
+
+    async def _execute_read(
+            self,
+            connection: _MySQLConnectionAbstract,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            dictionary: bool = False,
+            profile: Optional[QueryProfile] = None,
+    ) -> Tuple[_MySQLConnectionAbstract, _MySQLCursorAbstract, List]:
+        """Execute a query and fetch its rows. In persistent mode a read query that failed
+        because the connection was lost is replayed once on a new connection, outside of
+        transactions only
+        :return: the connection used, the cursor and the rows
+        """
+        try:
+            mysql_cursor = await self._execute_query(connection, sql_query, sql_variables,
+                                                     dictionary=dictionary, profile=profile)
+            return connection, mysql_cursor, await self._fetch_all(mysql_cursor, profile)
+        except Exception as ex:
+            if not (self.persistent and connection is self.mysql_connection and not self.in_transaction
+                    and is_connection_lost(ex) and is_read_query(sql_query)):
+                raise
+            logger.warning(f"Connection lost, replaying the query on a new connection: {ex}")
+            self.metrics.record_error(ex)
+        self._forget_prepared_statements(self.mysql_connection)
+        self.mysql_connection = None
+        connection = await self.open_connection()
+        mysql_cursor = await self._execute_query(connection, sql_query, sql_variables,
+                                                 dictionary=dictionary, profile=profile)
+        return connection, mysql_cursor, await self._fetch_all(mysql_cursor, profile)
+
+    def _observe_execute(self, started: float, sql_query: str, profile: Optional[QueryProfile]):
+        elapsed: float = perf_counter() - started
+        self.metrics.observe_execute(elapsed, sql_query)
+        if profile is not None:
+            profile.add_phase("execute", elapsed)
+
+    def _observe_fetch(self, started: float, rows: List, profile: Optional[QueryProfile]):
+        elapsed: float = perf_counter() - started
+        self.metrics.observe_fetch(elapsed, rows)
+        if profile is not None:
+            profile.add_phase("fetch", elapsed)
+            profile.add_rows(len(rows))
+
+    def _record_error(self, ex: Exception, profile: Optional[QueryProfile]):
+        self.metrics.record_error(ex)
+        self._check_connection = True
+        if profile is not None:
+            profile.error = ex.__class__.__name__
+
+    def _start_profile(self, sql_query: str, sql_variables: Any, method: str) -> Union[None, QueryProfile]:
+        if self.slow_query_log is None:
+            return None
+        return self.slow_query_log.start(sql_query=sql_query, sql_variables=sql_variables, method=method)
+
+    async def _finish_profile(self, profile: Optional[QueryProfile]):
+        """Aggregate the profile and log the query if it is slow, with its plan if required"""
+        if profile is None or not self.slow_query_log.finish(profile):
+            return
+        explain = None
+        if self.slow_query_log.capture_explain and is_explainable(profile.sql_query):
+            explain = await self.explain(profile.sql_query, profile.sql_variables)
+        self.slow_query_log.report(profile,
+                                   connector=f"{self.db_host}:{self.db_port}/{self.db_name}",
+                                   explain=explain)
+
+    async def explain(self, sql_query: str, sql_variables: Optional[Tuple] = None) -> Any:
+        """Return the EXPLAIN FORMAT=JSON plan of a query, or the error message
+        It runs on a separate connection so that the kept or pooled ones, which may be
+        streaming a result or in a transaction, are left untouched
+        """
+        try:
+            side_connection = await _connect(**self.connection_config())
+            try:
+                mysql_cursor = await side_connection.cursor()
+                await mysql_cursor.execute(f"EXPLAIN FORMAT=JSON {sql_query}", sql_variables)
+                return parse_explain(await mysql_cursor.fetchall())
+            finally:
+                await side_connection.close()
+        except Exception as ex:
+            logger.debug(f"Error while explaining query: {ex}")
+            return f"{ex.__class__.__name__}: {ex}"
+
+    async def _fetch_all(self, mysql_cursor: _MySQLCursorAbstract,
+                         profile: Optional[QueryProfile] = None) -> List:
+        started: float = perf_counter()
+        rows = await mysql_cursor.fetchall()
+        self._observe_fetch(started, rows, profile)
+        return rows
+
+    async def _close_cursor(self, mysql_cursor: _MySQLCursorAbstract):
+        """Close a cursor returned by _execute_query, prepared ones stay cached"""
+        if self.prepared_cache is None:
+            await mysql_cursor.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the activity metrics and of the pool occupancy"""
+        stats: Dict[str, Any] = self.metrics.snapshot()
+        if self.mysql_pool is not None:
+            stats["connections_in_use"] = self.mysql_pool.in_use_count
+            stats["connections_idle"] = self.mysql_pool.idle_count
+        else:
+            stats["connections_in_use"] = int(self.mysql_connection is not None and self.in_transaction)
+            stats["connections_idle"] = int(self.mysql_connection is not None and not self.in_transaction)
+        stats["engine"] = self.engine
+        return stats
+
+    def prometheus_metrics(self) -> str:
+        """Return stats() in the Prometheus text exposition format"""
+        return prometheus_text(self.stats(),
+                               labels={"connector": self.__class__.__name__,
+                                       "engine": self.engine,
+                                       "host": self.db_host,
+                                       "database": self.db_name})
+
+    def prepared_statements_stats(self) -> Dict:
+        """Return the prepared statement cache hit/miss counters, empty if not in use"""
+        return {} if self.prepared_cache is None else self.prepared_cache.stats()
+
+    def _result_cache_key(
+            self,
+            kind: str,
+            sql_query: str,
+            sql_variables: Optional[Tuple],
+            cache_ttl: Optional[float],
+    ) -> Union[None, Tuple]:
+        """Return the result cache key of a read query, None when not cached"""
+        if self.result_cache is None or cache_ttl == 0 or self.in_transaction:
+            return None
+        return self.result_cache.make_key(namespace=f"{self.db_host}:{self.db_port}/{self.db_name}",
+                                          kind=kind,
+                                          sql_query=sql_query,
+                                          sql_variables=sql_variables)
+
+    def _invalidate_tables(self, tables: FrozenSet[str]):
+        """Invalidate the cached results of the written tables, once committed inside a
+        transaction: a connector sharing the cache could re-cache the rows before the commit
+        """
+        if self.result_cache is None:
+            return
+        transaction_state = self._transaction_state.get()
+        if transaction_state is not None:
+            transaction_state["tables"].append(tables)
+        else:
+            self.result_cache.invalidate_tables(tables)
+
+    def _invalidate_result_cache(self, sql_query: str):
+        if self.result_cache is not None:
+            self._invalidate_tables(referenced_tables(sql_query))
+
+    def result_cache_stats(self) -> Dict:
+        """Return the result cache hit/miss counters, empty if not in use"""
+        return {} if self.result_cache is None else self.result_cache.stats()
 
     async def fetch_all_as_df(
             self,
             sql_query: str,
             sql_variables: Optional[Tuple] = None,
             close_connection: Optional[bool] = True,
+            cache_ttl: Optional[float] = None,
     ) -> Union[pd.DataFrame, None]:
         """
         :param sql_query: the MySQL query
         :param sql_variables: parameters ordered with %s usage in the sql_query
         :param close_connection: close connection after the method ends
+        :param cache_ttl: seconds the result stays in the result cache, default TTL of the
+                          cache if None, 0 to bypass it
         :return: return a pandas DataFrame if there are results or None if error
         """
+        cache_key = self._result_cache_key("df", sql_query, sql_variables, cache_ttl)
+        if cache_key is not None:
+            result_df = self.result_cache.get(cache_key)
+            if result_df is not None:
+                if close_connection:
+                    await self.close_connection()
+                return result_df
 
-        await self.open_connection()
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_df")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
 
-        result_df = Union[pd.DataFrame, None]
+        result_df: Union[pd.DataFrame, None] = None
         try:
-            mysql_cursor = await self.mysql_connection.cursor()
-            await mysql_cursor.execute(sql_query, sql_variables)
-            result_df = pd.DataFrame(await mysql_cursor.fetchall())
-            result_df.columns = mysql_cursor.column_names
-            await mysql_cursor.close()
+            connection, mysql_cursor, rows = await self._execute_read(connection, sql_query, sql_variables,
+                                                                      profile=profile)
+            with PhaseTimer(profile, "to_df"):
+                result_df = rows_to_df(rows, mysql_cursor.description)
+            await self._close_cursor(mysql_cursor)
         except Exception as ex:
+            self._record_error(ex, profile)
             logger.error(
                 f"Error while fetching data : {ex}. Exception is {ex.__class__.__name__}"
             )
+            if self.in_transaction:
+                raise
         finally:
-            if close_connection:
-                await self.close_connection()
+            await self._release_connection(connection, close_connection)
+            await self._finish_profile(profile)
 
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result_df, sql_query, ttl=cache_ttl)
         return result_df
 
     async def fetch_all_as_dicts(
@@ -98,24 +651,38 @@ class MySQLConnectorNativeAsync:
             sql_query: str,
             sql_variables: Optional[Tuple] = None,
             close_connection: Optional[bool] = True,
+            cache_ttl: Optional[float] = None,
     ) -> Union[List[Dict], None]:
         """
         :param sql_query: the MySQL query
         :param sql_variables: parameters ordered with %s usage in the sql_query
         :param close_connection: close connection after the method ends
+        :param cache_ttl: seconds the result stays in the result cache, default TTL of the
+                          cache if None, 0 to bypass it
         :return: return a pandas DataFrame if there are results or None if error
         """
-        # open connection if needed
-        await self.open_connection()
+        cache_key = self._result_cache_key("dicts", sql_query, sql_variables, cache_ttl)
+        if cache_key is not None:
+            results = self.result_cache.get(cache_key)
+            if results is not None:
+                if close_connection:
+                    await self.close_connection()
+                return results
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_dicts")
+        # open or borrow a connection if needed
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
 
         mysql_cursor: Union[_MySQLCursorAbstract, None] = None
         results: Union[List[Dict], None] = None
         try:
-            mysql_cursor = await self.mysql_connection.cursor(dictionary=True)
-            await mysql_cursor.execute(sql_query, sql_variables)
-            results = await mysql_cursor.fetchall()
-            await mysql_cursor.close()
+            connection, mysql_cursor, results = await self._execute_read(
+                connection, sql_query, sql_variables, dictionary=True, profile=profile
+            )
+            await self._close_cursor(mysql_cursor)
         except Exception as ex:
+            self._record_error(ex, profile)
             if mysql_cursor:
                 logger.error(
                     f"Error while inserting new score: {ex}. SQL Statement used: {mysql_cursor.statement}"
@@ -126,12 +693,470 @@ class MySQLConnectorNativeAsync:
                     f"SQL statement used: {sql_query} - "
                     f"SQL variables used: {sql_variables} - "
                 )
+            if self.in_transaction:
+                raise
         finally:
-            if close_connection:
-                await self.close_connection()
+            await self._release_connection(connection, close_connection)
+            await self._finish_profile(profile)
 
+        if cache_key is not None:
+            self.result_cache.put(cache_key, results, sql_query, ttl=cache_ttl)
         return results
 
+    async def fetch_all_as_records(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: Optional[bool] = True,
+            columnar: bool = False,
+    ) -> Union[List[Any], ColumnarResult, None]:
+        """Fetch the results as records: tuples readable by attribute (row.proxy_url) and by
+        key (row["proxy_url"]), several times smaller than the dicts of fetch_all_as_dicts.
+        With columnar=True the values are kept column by column, in typed arrays for the
+        numeric columns, and the records are only built when rows are accessed.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :param columnar: return a ColumnarResult instead of a list of records
+        :return: return a list of records or a ColumnarResult if there are results or None if error
+        """
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_records")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
+
+        result_records: Union[List[Any], ColumnarResult, None] = None
+        try:
+            connection, mysql_cursor, rows = await self._execute_read(connection, sql_query, sql_variables,
+                                                                      profile=profile)
+            with PhaseTimer(profile, "to_records"):
+                if columnar:
+                    result_records = ColumnarResult.from_rows(rows, mysql_cursor.description)
+                else:
+                    result_records = rows_to_records(rows, mysql_cursor.description)
+            await self._close_cursor(mysql_cursor)
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while fetching data : {ex}. Exception is {ex.__class__.__name__}"
+            )
+            if self.in_transaction:
+                raise
+        finally:
+            await self._release_connection(connection, close_connection)
+            await self._finish_profile(profile)
+        return result_records
+
+    async def fetch_all_as_arrow(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: Optional[bool] = True,
+    ) -> Union[pa.Table, None]:
+        """Fetch the results as an Apache Arrow table, typed from the MySQL field types
+        table.to_pandas(types_mapper=pd.ArrowDtype) converts it to pandas without copy
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :return: return a pyarrow Table if there are results or None if error
+        """
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_arrow")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
+
+        result_table: Union[pa.Table, None] = None
+        try:
+            connection, mysql_cursor, rows = await self._execute_read(connection, sql_query, sql_variables,
+                                                                      profile=profile)
+            with PhaseTimer(profile, "to_arrow"):
+                result_table = rows_to_arrow(rows, mysql_cursor.description)
+            await self._close_cursor(mysql_cursor)
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while fetching data : {ex}. Exception is {ex.__class__.__name__}"
+            )
+            if self.in_transaction:
+                raise
+        finally:
+            await self._release_connection(connection, close_connection)
+            await self._finish_profile(profile)
+        return result_table
+
+    async def fetch_all_as_polars(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: Optional[bool] = True,
+    ) -> Union[pl.DataFrame, None]:
+        """Fetch the results as a polars DataFrame, built from fetch_all_as_arrow without copy
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :return: return a polars DataFrame if there are results or None if error
+        """
+        result_table = await self.fetch_all_as_arrow(sql_query=sql_query,
+                                                     sql_variables=sql_variables,
+                                                     close_connection=close_connection)
+        return None if result_table is None else arrow_to_polars(result_table)
+
+    async def _fetch_rows(self, sql_query: str, sql_variables: Optional[Tuple] = None) -> Tuple[List[Tuple], Any]:
+        """Return the raw rows and the cursor description of a query, errors are raised.
+        In pool mode each call borrows its own connection so that calls can run concurrently
+        """
+        own_connection: bool = self.mysql_pool is not None and not self.in_transaction
+        if own_connection:
+            connection = await self._acquire_pooled_connection()
+        else:
+            connection = await self._acquire_connection()
+        try:
+            mysql_cursor = await self._execute_query(connection, sql_query, sql_variables)
+            rows = await self._fetch_all(mysql_cursor)
+            description = mysql_cursor.description
+            await self._close_cursor(mysql_cursor)
+            return rows, description
+        except Exception as ex:
+            self.metrics.record_error(ex)
+            raise
+        finally:
+            if own_connection:
+                await self.mysql_pool.release(connection)
+            else:
+                await self._release_connection(connection, close_connection=False)
+
+    async def read_table_parallel(
+            self,
+            table: str,
+            partition_column: str,
+            num_partitions: int = 8,
+            columns: Optional[Sequence[str]] = None,
+            where: Optional[str] = None,
+            sql_variables: Optional[Tuple] = None,
+            max_workers: Optional[int] = None,
+            convert_processes: Optional[int] = None,
+            close_connection: Optional[bool] = True,
+    ) -> Union[pd.DataFrame, None]:
+        """Read a table into one DataFrame by slicing the range of an integer column
+        (e.g. an auto-increment id) into num_partitions equal ranges. The slices are fetched
+        concurrently in pool mode (pool_size set), one after the other on the connection
+        otherwise. Rows whose partition column is NULL are not read.
+        :param table: the table name, can be prefixed by the schema name
+        :param partition_column: the integer column to slice on, it should be indexed
+        :param num_partitions: number of slices
+        :param columns: the columns to read, all of them if None
+        :param where: an extra filter, with %s placeholders for sql_variables
+        :param sql_variables: parameters of the where filter
+        :param max_workers: max number of slices fetched at the same time, defaults to pool_size
+        :param convert_processes: convert the slices to DataFrames in a pool of this many
+                                  processes, by default the rows are converted once in a thread
+        :param close_connection: close connection after the method ends
+        :return: return a pandas DataFrame, or None if error
+        """
+        if max_workers is None:
+            max_workers = self.mysql_pool.max_size if self.mysql_pool is not None else 1
+        if max_workers <= 0:
+            raise ValueError(f"max_workers must be a positive integer, got: {max_workers}")
+        if num_partitions <= 0:
+            raise ValueError(f"num_partitions must be a positive integer, got: {num_partitions}")
+
+        try:
+            bounds_rows, _ = await self._fetch_rows(build_bounds_query(table, partition_column, where),
+                                                    sql_variables)
+            min_value, max_value = bounds_rows[0]
+            if min_value is None:
+                # empty table: one query gives the columns of the empty DataFrame
+                bounds: List[Tuple[int, int]] = [(0, 0)]
+            else:
+                bounds = partition_bounds(min_value, max_value, num_partitions)
+            queries = build_partition_queries(table=table,
+                                              partition_column=partition_column,
+                                              bounds=bounds,
+                                              columns=columns,
+                                              where=where,
+                                              sql_variables=sql_variables)
+
+            if self.mysql_pool is None or self.in_transaction:
+                results = [await self._fetch_rows(*query) for query in queries]
+            else:
+                semaphore = asyncio.Semaphore(max_workers)
+
+                async def fetch_partition(query: Tuple[str, Tuple]) -> Tuple[List[Tuple], Any]:
+                    async with semaphore:
+                        return await self._fetch_rows(*query)
+
+                results = await asyncio.gather(*(fetch_partition(query) for query in queries))
+            description = results[0][1]
+            partitions: List[List[Tuple]] = [rows for rows, _ in results]
+            del results
+            # the conversion runs in a thread not to block the event loop on large tables
+            return await asyncio.get_running_loop().run_in_executor(
+                None, partitions_to_df, partitions, description, convert_processes
+            )
+        except Exception as ex:
+            logger.error(
+                f"Error while reading {table} in parallel: {ex} - "
+                f"Partition column: {partition_column} - Partitions: {num_partitions}"
+            )
+            if self.in_transaction:
+                raise
+            return None
+        finally:
+            if close_connection and not self.in_transaction:
+                await self.close_connection()
+
+    async def fetch_chunks(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 10_000,
+            as_df: bool = False,
+            close_connection: Optional[bool] = True,
+    ) -> AsyncIterator[Union[List[Dict], pd.DataFrame]]:
+        """Stream the results with an unbuffered cursor, chunk_size rows at a time, so memory
+        use does not depend on the size of the result. Errors are logged and raised.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows per chunk
+        :param as_df: yield pandas DataFrames instead of lists of dicts
+        :param close_connection: close connection after the last chunk
+        :return: an async generator of lists of dicts or of pandas DataFrames
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive integer, got: {chunk_size}")
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_chunks")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
+
+        mysql_cursor: Union[_MySQLCursorAbstract, None] = None
+        finished: bool = False
+        try:
+            mysql_cursor = await connection.cursor(buffered=False, dictionary=not as_df)
+            started: float = perf_counter()
+            await mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            while True:
+                started = perf_counter()
+                rows = await mysql_cursor.fetchmany(chunk_size)
+                self._observe_fetch(started, rows, profile)
+                if not rows:
+                    finished = True
+                    break
+                if as_df:
+                    with PhaseTimer(profile, "to_df"):
+                        chunk_df = rows_to_df(rows, mysql_cursor.description)
+                    yield chunk_df
+                else:
+                    yield rows
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while streaming data: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"SQL variables used: {sql_variables} - "
+            )
+            raise
+        finally:
+            await self._end_stream(connection, mysql_cursor, finished, close_connection)
+            await self._finish_profile(profile)
+
+    async def fetch_iter(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 1_000,
+            close_connection: Optional[bool] = True,
+    ) -> AsyncIterator[Dict]:
+        """Stream the results row by row, see fetch_chunks
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows fetched from the server at a time
+        :param close_connection: close connection after the last row
+        :return: an async generator of dicts
+        """
+        chunks = self.fetch_chunks(sql_query=sql_query,
+                                   sql_variables=sql_variables,
+                                   chunk_size=chunk_size,
+                                   close_connection=close_connection)
+        try:
+            async for rows in chunks:
+                for row in rows:
+                    yield row
+        finally:
+            await chunks.aclose()
+
+    async def iter_table(
+            self,
+            table: str,
+            key_column: Union[str, Sequence[str]],
+            page_size: int = 10_000,
+            where: Optional[str] = None,
+            where_variables: Optional[Tuple] = None,
+            columns: Optional[Sequence[str]] = None,
+            as_df: bool = False,
+            start_after: Optional[Sequence[Any]] = None,
+            close_connection: Optional[bool] = True,
+    ) -> AsyncIterator[Union[List[Dict], pd.DataFrame]]:
+        """Scan a table page by page with keyset pagination: each page is read after the key
+        of the previous one (WHERE key > last key ORDER BY key LIMIT page_size), so each
+        query seeks in the index instead of skipping rows like OFFSET does. Errors are
+        logged and raised.
+        :param table: the table name, can be prefixed by the schema name
+        :param key_column: the column of a unique index, or the columns of a composite one
+        :param page_size: number of rows per page
+        :param where: an extra filter, with %s placeholders for where_variables
+        :param where_variables: parameters of the where filter
+        :param columns: the columns to read, all of them if None, the key columns are added
+        :param as_df: yield pandas DataFrames instead of lists of dicts
+        :param start_after: resume the scan after this key, e.g. the page_last_key of the
+                            last page processed by an interrupted job
+        :param close_connection: close connection after the last page
+        :return: an async generator of lists of dicts or of pandas DataFrames
+        """
+        key_columns: List[str] = key_columns_list(key_column)
+        if start_after is not None and len(start_after) != len(key_columns):
+            raise ValueError(f"start_after must hold one value per key column {key_columns}, got: {start_after}")
+        first_query: str = build_keyset_query(table, key_columns, page_size, columns, where, seek=False)
+        next_query: str = build_keyset_query(table, key_columns, page_size, columns, where, seek=True)
+        last_key: Union[None, Tuple] = None if start_after is None else tuple(start_after)
+
+        connection = await self._acquire_connection()
+        try:
+            while True:
+                if last_key is None:
+                    sql_query, sql_variables = first_query, where_variables
+                else:
+                    sql_query, sql_variables = next_query, tuple(where_variables or ()) + seek_variables(last_key)
+                profile = self._start_profile(sql_query, sql_variables, "iter_table")
+                try:
+                    connection, mysql_cursor, rows = await self._execute_read(connection, sql_query, sql_variables,
+                                                                              dictionary=not as_df, profile=profile)
+                    if rows:
+                        last_key = rows_last_key(rows, key_columns, mysql_cursor.description)
+                    if as_df:
+                        with PhaseTimer(profile, "to_df"):
+                            page = rows_to_df(rows, mysql_cursor.description)
+                    else:
+                        page = rows
+                    await self._close_cursor(mysql_cursor)
+                except Exception as ex:
+                    self._record_error(ex, profile)
+                    logger.error(
+                        f"Error while paging through {table}: {ex} - "
+                        f"SQL statement used: {sql_query} - "
+                        f"SQL variables used: {sql_variables} - "
+                    )
+                    raise
+                finally:
+                    await self._finish_profile(profile)
+                if not rows:
+                    return
+                yield page
+                if len(rows) < page_size:
+                    return
+        finally:
+            await self._release_connection(connection, close_connection)
+
+    async def export_query(
+            self,
+            sql_query: str,
+            path: Union[str, PathLike],
+            file_format: str = "parquet",
+            sql_variables: Optional[Tuple] = None,
+            row_group_size: int = 100_000,
+            compression: Optional[str] = None,
+            max_file_size: Optional[int] = None,
+            close_connection: Optional[bool] = True,
+    ) -> List[str]:
+        """Stream the results of a query to a Parquet or CSV file, one row group at a time:
+        rows are read with an unbuffered cursor and written as Arrow record batches of
+        row_group_size rows, so memory use depends on row_group_size, not on the result
+        size. No file is written for an empty result. Errors are logged and raised, the
+        files of a failed export are deleted.
+        :param sql_query: the MySQL query
+        :param path: the file to write, the base name of the parts with max_file_size
+        :param file_format: "parquet" or "csv"
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param row_group_size: number of rows read and written at a time
+        :param compression: Parquet column codec ("snappy" by default, "zstd", "gzip",
+                            "none"...), or whole file codec for CSV ("gzip", "zstd"...)
+        :param max_file_size: split the output in files of about this many bytes, named
+                              path stem + "-00000", "-00001"... + suffix
+        :param close_connection: close connection after the export
+        :return: the paths of the files written
+        """
+        writer = ExportFileWriter(path, file_format, compression=compression, max_file_size=max_file_size)
+        try:
+            loop = asyncio.get_running_loop()
+            async for batch in self.fetch_arrow_batches(sql_query=sql_query,
+                                                        sql_variables=sql_variables,
+                                                        chunk_size=row_group_size,
+                                                        close_connection=close_connection):
+                await loop.run_in_executor(None, writer.write, batch)
+            paths: List[str] = await loop.run_in_executor(None, writer.close)
+        except Exception as ex:
+            logger.error(
+                f"Error while exporting to {path}: {ex}. Exception is {ex.__class__.__name__}"
+            )
+            writer.abort()
+            raise
+        logger.debug(f"Exported {writer.rows_written} rows to {len(paths)} file(s): {path}")
+        return paths
+
+    async def fetch_arrow_batches(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 10_000,
+            close_connection: Optional[bool] = True,
+    ) -> AsyncIterator[pa.RecordBatch]:
+        """Stream the results as Arrow record batches of chunk_size rows, see fetch_chunks.
+        A column typed from its values (DECIMAL, NULL in all the previous rows) can get a
+        wider type in a later batch, see rows_to_record_batch and arrow_helpers.cast_batch.
+        polars.from_arrow(batch) wraps a batch without copy.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows per batch
+        :param close_connection: close connection after the last batch
+        :return: an async generator of pyarrow RecordBatches
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive integer, got: {chunk_size}")
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_arrow_batches")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
+
+        mysql_cursor: Union[_MySQLCursorAbstract, None] = None
+        finished: bool = False
+        try:
+            mysql_cursor = await connection.cursor(buffered=False)
+            started: float = perf_counter()
+            await mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            schema: Union[pa.Schema, None] = None
+            while True:
+                started = perf_counter()
+                rows = await mysql_cursor.fetchmany(chunk_size)
+                self._observe_fetch(started, rows, profile)
+                if not rows:
+                    finished = True
+                    break
+                with PhaseTimer(profile, "to_arrow"):
+                    record_batch = rows_to_record_batch(rows, mysql_cursor.description, schema)
+                schema = record_batch.schema
+                yield record_batch
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while streaming data: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"SQL variables used: {sql_variables} - "
+            )
+            raise
+        finally:
+            await self._end_stream(connection, mysql_cursor, finished, close_connection)
+            await self._finish_profile(profile)
+
     async def execute_one_query(
             self,
             sql_query: str,
@@ -145,17 +1170,24 @@ class MySQLConnectorNativeAsync:
         :return: returns the number of rows affected, -1 if connection error ONLY
         """
 
-        await self.open_connection()
+        profile = self._start_profile(sql_query, sql_variables, "execute_one_query")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
 
         rows_affected: int = 0
         mysql_cursor: Union[_MySQLCursorAbstract, None] = None
         try:
-            mysql_cursor = await self.mysql_connection.cursor()
-            await mysql_cursor.execute(sql_query, sql_variables)
+            mysql_cursor = await self._execute_query(connection, sql_query, sql_variables,
+                                                     profile=profile)
             rows_affected = mysql_cursor.rowcount
-            await self.mysql_connection.commit()
-            await mysql_cursor.close()
+            if profile is not None:
+                profile.add_rows(rows_affected)
+            if not self.in_transaction:
+                await connection.commit()
+                self.metrics.record_commit()
+            await self._close_cursor(mysql_cursor)
         except Exception as ex:
+            self._record_error(ex, profile)
             if mysql_cursor:
                 logger.error(
                     f"Error while inserting new score: {ex}. SQL Statement used: {mysql_cursor.statement}"
@@ -166,10 +1198,298 @@ class MySQLConnectorNativeAsync:
                     f"SQL statement used: {sql_query} - "
                     f"SQL variables used: {sql_variables} - "
                 )
+            if self.in_transaction:
+                raise
         finally:
-            if close_connection:
-                await self.close_connection()
+            await self._release_connection(connection, close_connection)
+            await self._finish_profile(profile)
+
+        self._invalidate_result_cache(sql_query)
+        return rows_affected
+
+    async def write_df(
+            self,
+            df: pd.DataFrame,
+            table: str,
+            mode: str = "append",
+            close_connection: Optional[bool] = True,
+    ) -> Tuple[int, int]:
+        """Bulk load a DataFrame with LOAD DATA LOCAL INFILE through a temporary csv file,
+        the write-side counterpart of fetch_all_as_df. Needs allow_local_infile=True and
+        local_infile enabled on the server.
+        :param df: the DataFrame to load, its column names must match the table ones
+        :param table: the table name, can be prefixed by the schema name
+        :param mode: append fails on duplicate keys, replace overwrites them, ignore skips them
+        :param close_connection: close connection after the method ends
+        :return: returns the number of rows loaded and the number of warnings
+        """
+
+        profile = self._start_profile(f"LOAD DATA LOCAL INFILE INTO TABLE {table}", None, "write_df")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
+
+        rows_loaded: int = 0
+        warning_count: int = 0
+        mysql_cursor: Union[_MySQLCursorAbstract, None] = None
+        try:
+            # the csv is written in a thread not to block the event loop on large DataFrames
+            with temporary_csv_path() as file_path:
+                with PhaseTimer(profile, "to_csv"):
+                    await asyncio.get_running_loop().run_in_executor(None, df_to_csv, df, file_path)
+                sql_query: str = build_load_data_query(table=table,
+                                                       columns=list(df.columns),
+                                                       file_path=file_path,
+                                                       mode=mode)
+                mysql_cursor = await connection.cursor()
+                started: float = perf_counter()
+                await mysql_cursor.execute(sql_query)
+                self._observe_execute(started, sql_query, profile)
+                rows_loaded = mysql_cursor.rowcount
+                warning_count = mysql_cursor.warning_count
+                if not self.in_transaction:
+                    await connection.commit()
+                    self.metrics.record_commit()
+                await mysql_cursor.close()
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while loading DataFrame into {table}: {ex} - "
+                f"Rows: {len(df)} - Mode: {mode}"
+            )
+            if self.in_transaction:
+                raise
+        finally:
+            await self._release_connection(connection, close_connection)
+            if profile is not None:
+                profile.add_rows(rows_loaded)
+            await self._finish_profile(profile)
+
+        self._invalidate_tables(frozenset([table]))
+        return rows_loaded, warning_count
+
+    async def upsert_df(
+            self,
+            df: pd.DataFrame,
+            table: str,
+            key_columns: Sequence[str],
+            update_columns: Optional[Sequence[str]] = None,
+            batch_size: int = 1000,
+            close_connection: Optional[bool] = True,
+    ) -> Dict[str, int]:
+        """Upsert a DataFrame with multi-row INSERT ... ON DUPLICATE KEY UPDATE statements,
+        rendered column by column and split to fit in max_allowed_packet, one commit per batch
+        :param df: the DataFrame to upsert, its column names must match the table ones
+        :param table: the table name, can be prefixed by the schema name
+        :param key_columns: the columns of the unique key the duplicates are detected on
+        :param update_columns: the columns overwritten on duplicates, all but the keys if None,
+                               none if empty: existing rows are then left unchanged
+        :param batch_size: max number of rows per statement
+        :param close_connection: close connection after the method ends
+        :return: the numbers of inserted, updated and unchanged rows of the committed batches
+        """
+        prefix, suffix = build_upsert_query(table, list(df.columns), key_columns, update_columns)
+        counts: Dict[str, int] = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if df.empty:
+            return counts
+
+        profile = self._start_profile(f"{prefix}(...){suffix}", None, "upsert_df")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
+        try:
+            max_allowed_packet: int = await self.get_max_allowed_packet(connection)
+            with PhaseTimer(profile, "to_sql"):
+                values = df_to_sql_values(df)
+            await connection.cmd_query(RESET_DUPLICATES_QUERY)
+            duplicates: int = 0
+            for start, end in split_values(values=values,
+                                           max_allowed_packet=max_allowed_packet,
+                                           statement_size=len(prefix) + len(suffix),
+                                           batch_size=batch_size):
+                sql_query: str = prefix + ",".join(values[start:end]) + suffix
+                started: float = perf_counter()
+                result = await connection.cmd_query(sql_query)
+                self._observe_execute(started, sql_query, profile)
+                if not self.in_transaction:
+                    await connection.commit()
+                    self.metrics.record_commit()
+                mysql_cursor = await connection.cursor()
+                await mysql_cursor.execute(READ_DUPLICATES_QUERY)
+                total_duplicates: int = int((await mysql_cursor.fetchone())[0])
+                await mysql_cursor.close()
+                batch_counts = upsert_counts(end - start, result["affected_rows"], total_duplicates - duplicates)
+                duplicates = total_duplicates
+                for name, count in batch_counts.items():
+                    counts[name] += count
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while upserting DataFrame into {table}: {ex} - "
+                f"Rows: {len(df)} - Rows committed before error: {sum(counts.values())}"
+            )
+            if self.in_transaction:
+                raise
+            if await connection.is_connected():
+                await connection.rollback()
+                self.metrics.record_rollback()
+        finally:
+            await self._release_connection(connection, close_connection)
+            if profile is not None:
+                profile.add_rows(sum(counts.values()))
+            await self._finish_profile(profile)
+
+        self._invalidate_tables(frozenset([table]))
+        return counts
+
+    async def get_max_allowed_packet(self, connection: _MySQLConnectionAbstract) -> int:
+        """Return the server max_allowed_packet in bytes, queried once per instance"""
+        if self.max_allowed_packet is None:
+            mysql_cursor = await connection.cursor()
+            await mysql_cursor.execute("SELECT @@max_allowed_packet")
+            self.max_allowed_packet = int((await mysql_cursor.fetchone())[0])
+            await mysql_cursor.close()
+        return self.max_allowed_packet
+
+    async def execute_many(
+            self,
+            sql_query: str,
+            rows: Iterable[Sequence[Any]],
+            batch_size: int = 1000,
+            close_connection: Optional[bool] = True,
+    ) -> int:
+        """method that handles bulk writes: INSERT statements are rewritten by the connector
+        into multi-row VALUES batches sized to fit in max_allowed_packet, one commit per batch
+        :param sql_query: the MySQL query, with %s placeholders for one row
+        :param rows: iterable of sql_variables, one per row
+        :param batch_size: max number of rows sent per batch
+        :param close_connection: close connection after the method ends
+        :return: returns the total number of rows affected by the committed batches
+        """
+
+        profile = self._start_profile(sql_query, None, "execute_many")
+        with PhaseTimer(profile, "checkout"):
+            connection = await self._acquire_connection()
+
+        rows_affected: int = 0
+        mysql_cursor: Union[_MySQLCursorAbstract, None] = None
+        try:
+            max_allowed_packet: int = await self.get_max_allowed_packet(connection)
+            mysql_cursor = await connection.cursor()
+            for batch in iter_batches(rows=rows,
+                                      batch_size=batch_size,
+                                      max_allowed_packet=max_allowed_packet,
+                                      sql_query=sql_query):
+                started: float = perf_counter()
+                await mysql_cursor.executemany(sql_query, batch)
+                self._observe_execute(started, sql_query, profile)
+                self.metrics.observe_rows_sent(batch)
+                if not self.in_transaction:
+                    await connection.commit()
+                    self.metrics.record_commit()
+                rows_affected += mysql_cursor.rowcount
+            await mysql_cursor.close()
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while executing many: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"Rows committed before error: {rows_affected}"
+            )
+            if self.in_transaction:
+                raise
+            if await connection.is_connected():
+                await connection.rollback()
+                self.metrics.record_rollback()
+        finally:
+            await self._release_connection(connection, close_connection)
+            if profile is not None:
+                profile.add_rows(rows_affected)
+            await self._finish_profile(profile)
+
+        self._invalidate_result_cache(sql_query)
+        return rows_affected
+
+    def write_behind(
+            self,
+            max_batch_rows: int = 1000,
+            flush_interval: float = 0.5,
+            max_queue_size: int = 10_000,
+    ) -> AsyncWriteBuffer:
+        """Return a write-behind buffer: single-row writes are queued and flushed in the
+        background as multi-row INSERTs, one transaction per statement and flush. Flushes run
+        on a pooled connection in pool mode, else on a connection opened for the flush, never
+        on the connection of the other calls.
+
+            async with my_connector.write_behind() as buffer:
+                for row in rows:
+                    await buffer.enqueue(sql_query=..., sql_variables=row)
+
+        :param max_batch_rows: rows flushed at most at once, a flush starts when reached
+        :param flush_interval: max seconds a row waits in the buffer before its flush starts
+        :param max_queue_size: rows queued at most, enqueue waits above
+        :return: an AsyncWriteBuffer, flushed and stopped by close() or at the end of async with
+        """
+        return AsyncWriteBuffer(write_rows=self._write_rows,
+                                acquire=self._acquire_write_connection,
+                                release=self._release_write_connection,
+                                max_batch_rows=max_batch_rows,
+                                flush_interval=flush_interval,
+                                max_queue_size=max_queue_size)
+
+    async def _acquire_write_connection(self) -> _MySQLConnectionAbstract:
+        if self.mysql_pool is not None:
+            return await self._acquire_pooled_connection()
+        started: float = perf_counter()
+        connection = await _connect(**self.connection_config())
+        self.metrics.observe_checkout(perf_counter() - started)
+        return connection
+
+    async def _release_write_connection(self, connection: _MySQLConnectionAbstract):
+        if self.mysql_pool is not None:
+            await self.mysql_pool.release(connection)
+        else:
+            await connection.close()
+
+    async def _write_rows(
+            self,
+            connection: _MySQLConnectionAbstract,
+            sql_query: str,
+            rows: List[Sequence[Any]],
+    ) -> int:
+        """Write the rows of one statement in multi-row batches and commit them at once,
+        errors are rolled back and raised
+        :return: the number of rows affected
+        """
+        profile = self._start_profile(sql_query, None, "write_behind")
+        rows_affected: int = 0
+        try:
+            max_allowed_packet: int = await self.get_max_allowed_packet(connection)
+            mysql_cursor = await connection.cursor()
+            try:
+                for batch in iter_batches(rows=rows,
+                                          batch_size=len(rows),
+                                          max_allowed_packet=max_allowed_packet,
+                                          sql_query=sql_query):
+                    started: float = perf_counter()
+                    await mysql_cursor.executemany(sql_query, batch)
+                    self._observe_execute(started, sql_query, profile)
+                    self.metrics.observe_rows_sent(batch)
+                    rows_affected += mysql_cursor.rowcount
+            finally:
+                await mysql_cursor.close()
+            await connection.commit()
+            self.metrics.record_commit()
+        except Exception as ex:
+            self._record_error(ex, profile)
+            if await connection.is_connected():
+                await connection.rollback()
+                self.metrics.record_rollback()
+            raise
+        finally:
+            if profile is not None:
+                profile.add_rows(rows_affected)
+            await self._finish_profile(profile)
 
+        self._invalidate_result_cache(sql_query)
         return rows_affected
 
 
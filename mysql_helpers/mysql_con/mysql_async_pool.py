@@ -0,0 +1,221 @@
+""" asyncio connection pool for the mysql-python native async connector"""
+import asyncio
+import logging
+from pathlib import Path
+from time import monotonic
+from typing import (Union, Optional, Dict, List, Tuple, Any, Callable)
+
+from mysql.connector.aio import MySQLConnectionAbstract as _MySQLConnectionAbstract
+from mysql.connector.aio import connect as _connect
+from mysql.connector.errors import PoolError
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+
+class MySQLAsyncPool:
+    """Pool of asyncio MySQL connections
+
+    Connections are opened on demand up to max_size, idle ones are reused LIFO and
+    pinged on checkout when they have been idle for more than health_check_interval.
+    The pool belongs to the event loop it is used in: used from another one (a second
+    asyncio.run), it starts over without the connections of the previous loop
+    """
+
+    def __init__(
+            self,
+            connection_config: Dict[str, Any],
+            min_size: int = 1,
+            max_size: int = 10,
+            acquire_timeout: float = 10.0,
+            max_idle: Optional[int] = None,
+            health_check_interval: float = 0.0,
+            on_close: Optional[Callable[[_MySQLConnectionAbstract], None]] = None,
+    ):
+        """
+        :param connection_config: keyword arguments passed to mysql.connector.aio.connect
+        :param min_size: number of connections opened when the pool initializes
+        :param max_size: max number of connections open at the same time
+        :param acquire_timeout: seconds to wait for a free connection before raising PoolError
+        :param max_idle: max number of idle connections kept open, defaults to max_size
+        :param health_check_interval: ping on checkout connections idle for longer than this
+        :param on_close: called with each connection the pool closes
+        """
+        if min_size < 0 or max_size <= 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool sizes: min_size={min_size}, max_size={max_size}")
+
+        self.connection_config: Dict[str, Any] = connection_config
+        self.min_size: int = min_size
+        self.max_size: int = max_size
+        self.acquire_timeout: float = acquire_timeout
+        self.max_idle: int = max_size if max_idle is None else max(min_size, max_idle)
+        self.health_check_interval: float = health_check_interval
+        self.on_close: Union[None, Callable[[_MySQLConnectionAbstract], None]] = on_close
+
+        # idle connections with the monotonic time they were released at
+        self._idle: List[Tuple[_MySQLConnectionAbstract, float]] = []
+        self._size: int = 0  # open connections, idle and in use
+        self._condition: Union[None, asyncio.Condition] = None
+        self._loop: Union[None, asyncio.AbstractEventLoop] = None
+        self._initialized: bool = False
+        self._closed: bool = False
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    @property
+    def in_use_count(self) -> int:
+        return self._size - len(self._idle)
+
+    def _bind_loop(self):
+        """Create the condition in the running event loop. The connections of a previous
+        loop can not be used, nor closed, from this one: they are dropped
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            logger.debug(f"Event loop changed, dropping {self._size} connections of the previous loop")
+            for connection, _ in self._idle:
+                if self.on_close is not None:
+                    self.on_close(connection)
+            self._idle.clear()
+            self._size = 0
+            self._initialized = False
+            self._closed = False
+        self._loop = loop
+        self._condition = asyncio.Condition()
+
+    async def initialize(self):
+        """Open min_size connections, called on first acquire"""
+        self._bind_loop()
+        if self._initialized:
+            return
+        self._initialized = True
+        for _ in range(self.min_size - self._size):
+            self._size += 1
+            try:
+                connection = await self._connect()
+            except BaseException:
+                await self._free_slot()
+                raise
+            self._idle.append((connection, monotonic()))
+
+    async def _connect(self) -> _MySQLConnectionAbstract:
+        try:
+            return await _connect(**self.connection_config)
+        except Exception as ex:
+            raise ConnectionError(f'Failed to connect to database\n'
+                                  f'Exception: {ex}')
+
+    async def _free_slot(self):
+        """Give back the slot of a connection that failed to open, also when cancelled
+        (asyncio.wait_for around a query): the slot is freed before any await and the
+        waiters are notified in a shielded task
+        """
+        self._size -= 1
+
+        async def notify():
+            async with self._condition:
+                self._condition.notify()
+        await asyncio.shield(notify())
+
+    async def _discard(self, connection: _MySQLConnectionAbstract):
+        """Close a connection and free its slot in the pool"""
+        async with self._condition:
+            self._size -= 1
+            self._condition.notify()
+        if self.on_close is not None:
+            self.on_close(connection)
+        try:
+            await connection.close()
+        except Exception as ex:
+            logger.debug(f"Error while closing pooled connection: {ex}")
+
+    async def acquire(self) -> _MySQLConnectionAbstract:
+        """Return a healthy connection, waiting up to acquire_timeout for one to be released
+        :return: an open connection, to be given back with release()
+        """
+        await self.initialize()
+        deadline: float = monotonic() + self.acquire_timeout
+
+        while True:
+            connection: Union[None, _MySQLConnectionAbstract] = None
+            released_at: float = 0.0
+            async with self._condition:
+                while True:
+                    if self._closed:
+                        raise PoolError("Pool is closed")
+                    if self._idle:
+                        connection, released_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining: float = deadline - monotonic()
+                    if remaining <= 0:
+                        raise PoolError(f"No connection available after {self.acquire_timeout}s, "
+                                        f"pool exhausted (max_size={self.max_size})")
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+
+            if connection is None:
+                try:
+                    return await self._connect()
+                except BaseException:
+                    await self._free_slot()
+                    raise
+
+            try:
+                if (monotonic() - released_at < self.health_check_interval
+                        or await connection.is_connected()):
+                    return connection
+            except BaseException:
+                # cancelled or failed during the ping: the connection is neither idle nor returned
+                await asyncio.shield(self._discard(connection))
+                raise
+            logger.info("Discarding stale pooled connection")
+            await self._discard(connection)
+
+    async def discard(self, connection: _MySQLConnectionAbstract):
+        """Close a checked out connection instead of giving it back, e.g. one left in the
+        middle of an unbuffered result, and free its slot
+        """
+        await self._discard(connection)
+
+    async def release(self, connection: _MySQLConnectionAbstract):
+        """Give a connection back to the pool, closing it when the idle cap is reached"""
+        try:
+            if connection.in_transaction:
+                await connection.rollback()
+        except Exception as ex:
+            logger.error(f"Error while rolling back released connection: {ex}")
+            await self._discard(connection)
+            return
+
+        async with self._condition:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append((connection, monotonic()))
+                self._condition.notify()
+                return
+        await self._discard(connection)
+
+    async def close(self):
+        """Close idle connections and refuse new checkouts, in use ones close on release"""
+        if self._condition is None:
+            self._closed = True
+            return
+        self._bind_loop()
+        async with self._condition:
+            self._closed = True
+            idle_connections = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._condition.notify_all()
+        for connection in idle_connections:
+            await self._discard(connection)
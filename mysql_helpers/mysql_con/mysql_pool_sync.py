@@ -1,13 +1,47 @@
 """ Handles queries to MySQL using the mysql-python native connector"""
+from __future__ import annotations
+
 import logging
-from os import environ
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from os import environ, PathLike
 from pathlib import Path
-from typing import Union, Optional, List, Tuple, Dict
+from time import perf_counter
+from typing import (Union, Optional, List, Tuple, Dict, Iterable, Iterator, Sequence, Any, FrozenSet,
+                    TYPE_CHECKING)
 
-import pandas as pd
+from mysql.connector.abstracts import MySQLConnectionAbstract
 from mysql.connector.cursor import MySQLCursor
+from mysql.connector import connect as _connect
 from mysql.connector.errors import InterfaceError
-from mysql.connector.pooling import PooledMySQLConnection, MySQLConnectionPool
+
+from mysql_helpers.mysql_con.arrow_helpers import rows_to_arrow, rows_to_record_batch, arrow_to_polars
+from mysql_helpers.mysql_con.batch_helpers import iter_batches
+from mysql_helpers.mysql_con.df_helpers import rows_to_df
+from mysql_helpers.mysql_con.engine_helpers import ENGINE_AUTO, ENGINE_C, resolve_engine
+from mysql_helpers.mysql_con.export_helpers import ExportFileWriter
+from mysql_helpers.mysql_con.keyset_helpers import (key_columns_list, build_keyset_query, seek_variables,
+                                                    rows_last_key)
+from mysql_helpers.mysql_con.load_data_helpers import (build_load_data_query, df_to_csv,
+                                                        temporary_csv_path)
+from mysql_helpers.mysql_con.metrics import ConnectorMetrics, prometheus_text
+from mysql_helpers.mysql_con.mysql_thread_pool import MySQLThreadPool
+from mysql_helpers.mysql_con.partition_helpers import (partition_bounds, build_bounds_query,
+                                                       build_partition_queries, partitions_to_df)
+from mysql_helpers.mysql_con.prepared_cache import PreparedStatementCache
+from mysql_helpers.mysql_con.query_cache import QueryResultCache, referenced_tables
+from mysql_helpers.mysql_con.record_helpers import ColumnarResult, rows_to_records
+from mysql_helpers.mysql_con.slow_query_log import (SlowQueryLog, QueryProfile, PhaseTimer,
+                                                    is_explainable, parse_explain)
+from mysql_helpers.mysql_con.upsert_helpers import (build_upsert_query, df_to_sql_values, split_values,
+                                                    upsert_counts, RESET_DUPLICATES_QUERY,
+                                                    READ_DUPLICATES_QUERY)
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import polars as pl
+    import pyarrow as pa
 
 logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
 
@@ -25,9 +59,51 @@ class MySQLConnectorPoolNative:
             raise_on_warnings: bool = False,
             pool_size: int = 30,
             pool_name: Optional[str] = None,
+            pool_max_overflow: int = 10,
+            pool_acquire_timeout: float = 30.0,
+            pool_max_idle_time: Optional[float] = 300.0,
+            pool_max_lifetime: Optional[float] = 3600.0,
+            pool_health_check_interval: float = 0.0,
+            allow_local_infile: bool = False,
+            use_prepared_statements: bool = False,
+            prepared_cache_size: int = 128,
+            result_cache: Optional[QueryResultCache] = None,
+            metrics: Optional[ConnectorMetrics] = None,
+            slow_query_log: Optional[SlowQueryLog] = None,
+            engine: str = ENGINE_AUTO,
     ):
-        self.pool_size: int = min(32, pool_size)  # max siwe is 32
+        """
+        :param pool_size: number of connections kept open when idle
+        :param pool_max_overflow: number of connections opened above pool_size under load
+        :param pool_acquire_timeout: seconds a thread waits for a free connection before the
+                                     call fails, waiting threads are served in arrival order
+        :param pool_max_idle_time: seconds after which idle overflow connections are closed
+        :param pool_max_lifetime: seconds after which connections are closed and replaced
+        :param pool_health_check_interval: ping on checkout connections idle for longer than this
+        :param allow_local_infile: allow LOAD DATA LOCAL INFILE, needed by write_df
+        :param use_prepared_statements: run fetch_all_as_df, fetch_all_as_dicts and
+                                        execute_one_query as server side prepared statements
+                                        (binary protocol), cached per pooled connection.
+                                        Pooled sessions are then not reset on checkout as
+                                        resetting them deallocates the statements.
+        :param prepared_cache_size: max number of prepared statements kept per connection
+        :param result_cache: cache of fetch_all_as_df and fetch_all_as_dicts results, can be
+                             shared between connectors, invalidated by this connector writes
+        :param metrics: where the activity is recorded, a new ConnectorMetrics if None,
+                        ConnectorMetrics(enabled=False) turns the recording off
+        :param slow_query_log: profile each call (pool checkout, execute, fetch, DataFrame
+                               conversion) and log the queries slower than its threshold
+        :param engine: "c" opens the pooled connections with the C extension and reads the
+                       DataFrame results with raw cursors converted by numpy, "pure" uses
+                       the pure Python protocol, "auto" the C extension when it is available
+        """
+        self.pool_size: int = pool_size
         self.pool_name: Union[str, None] = pool_name
+        self.pool_max_overflow: int = pool_max_overflow
+        self.pool_acquire_timeout: float = pool_acquire_timeout
+        self.pool_max_idle_time: Union[None, float] = pool_max_idle_time
+        self.pool_max_lifetime: Union[None, float] = pool_max_lifetime
+        self.pool_health_check_interval: float = pool_health_check_interval
 
         self.db_host: str = environ["MYSQL_DB_HOST"] if db_host is None else db_host
         self.db_port: Union[int, str] = (
@@ -39,27 +115,61 @@ class MySQLConnectorPoolNative:
         )
         self.db_name: str = environ["MYSQL_DB_NAME"] if db_name is None else db_name
         self.raise_on_warnings: bool = raise_on_warnings
+        self.allow_local_infile: bool = allow_local_infile
+        self.max_allowed_packet: Union[None, int] = None
+        self.prepared_cache: Union[None, PreparedStatementCache] = (
+            PreparedStatementCache(max_size=prepared_cache_size) if use_prepared_statements else None
+        )
+        self.result_cache: Union[None, QueryResultCache] = result_cache
+        self.metrics: ConnectorMetrics = ConnectorMetrics() if metrics is None else metrics
+        self.slow_query_log: Union[None, SlowQueryLog] = slow_query_log
+        self.engine: str = resolve_engine(engine)
 
-        self.mysql_pool: Union[None, MySQLConnectionPool] = self.create_pool()
+        self.mysql_pool: Union[None, MySQLThreadPool] = self.create_pool()
         self.pool_connections: Dict = (
             {}
         )  # {'a_name_of_conn':Connection1},{'another_name_of_conn':Connection2} ]
+        # a named connection is taken out of pool_connections while a thread uses it
+        self._pool_connections_lock = threading.RLock()
+        # connection and savepoint depth of the transaction opened by each thread
+        self._transaction_state = threading.local()
+
+    def connection_config(self) -> Dict:
+        """Return the keyword arguments used to open a connection"""
+        return dict(
+            host=self.db_host,
+            port=self.db_port,
+            user=self.db_user,
+            passwd=self.db_password,
+            database=self.db_name,
+            get_warnings=True,
+            raise_on_warnings=self.raise_on_warnings,
+            allow_local_infile=self.allow_local_infile,
+            use_pure=self.engine != ENGINE_C,
+        )
+
+    @property
+    def raw_fetch(self) -> bool:
+        """DataFrames are built from raw cursors, prepared statements have no raw mode"""
+        return self.engine == ENGINE_C and self.prepared_cache is None
 
-    def create_pool(self) -> Union[None, MySQLConnectionPool]:
+    def create_pool(self) -> Union[None, MySQLThreadPool]:
         """Return mysql connection or None if failure to establish one"""
 
         try:
-            self.mysql_pool = MySQLConnectionPool(
-                pool_name=self.pool_name,
+            self.mysql_pool = MySQLThreadPool(
+                connection_config=self.connection_config(),
                 pool_size=self.pool_size,
-                host=self.db_host,
-                port=self.db_port,
-                user=self.db_user,
-                passwd=self.db_password,
-                database=self.db_name,
-                get_warnings=True,
-                raise_on_warnings=self.raise_on_warnings,
+                max_overflow=self.pool_max_overflow,
+                acquire_timeout=self.pool_acquire_timeout,
+                max_idle_time=self.pool_max_idle_time,
+                max_lifetime=self.pool_max_lifetime,
+                health_check_interval=self.pool_health_check_interval,
+                reset_session=self.prepared_cache is None,
+                on_close=self._forget_prepared_statements,
+                name=self.pool_name,
             )
+            self.mysql_pool.initialize()
 
             return self.mysql_pool
         except InterfaceError as ex:
@@ -68,49 +178,466 @@ class MySQLConnectorPoolNative:
             )
 
         except Exception as ex:
-            print(f"Unhandled,connection error: {ex}")
+            logger.error(f"Unhandled connection error ({ex.__class__.__name__}) while creating the pool: {ex}")
 
         return None
 
+    def _execute_query(
+            self,
+            conn: MySQLConnectionAbstract,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            dictionary: bool = False,
+            profile: Optional[QueryProfile] = None,
+            raw: bool = False,
+    ) -> MySQLCursor:
+        """Return a cursor on which the query was executed
+        In prepared statements mode the cursor comes from the prepared statement cache
+        and must be released with _close_cursor, not closed
+        :param raw: return the values as sent by the server, see raw_fetch
+        """
+        started: float = perf_counter()
+        if self.prepared_cache is None:
+            mysql_cursor: MySQLCursor = conn.cursor(raw=True) if raw else conn.cursor(dictionary=dictionary)
+            mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            return mysql_cursor
+
+        connection_id: int = conn.connection_id
+        key: Tuple[str, bool] = (sql_query, dictionary)
+        cached_statement = self.prepared_cache.lookup(connection_id, key)
+        if cached_statement is None:
+            mysql_cursor = conn.cursor(prepared=True, dictionary=dictionary)
+            for evicted_cursor in self.prepared_cache.store(connection_id, key, sql_query, mysql_cursor):
+                evicted_cursor.close()
+            cached_statement = (sql_query, mysql_cursor)
+
+        prepared_query, mysql_cursor = cached_statement
+        try:
+            mysql_cursor.execute(prepared_query, sql_variables)
+        except Exception:
+            self.prepared_cache.discard(connection_id, key)
+            try:
+                mysql_cursor.close()
+            except Exception as ex:
+                logger.debug(f"Error while closing prepared statement: {ex}")
+            raise
+        self._observe_execute(started, sql_query, profile)
+        return mysql_cursor
+
+    def _observe_execute(self, started: float, sql_query: str, profile: Optional[QueryProfile]):
+        elapsed: float = perf_counter() - started
+        self.metrics.observe_execute(elapsed, sql_query)
+        if profile is not None:
+            profile.add_phase("execute", elapsed)
+
+    def _observe_fetch(self, started: float, rows: List, profile: Optional[QueryProfile]):
+        elapsed: float = perf_counter() - started
+        self.metrics.observe_fetch(elapsed, rows)
+        if profile is not None:
+            profile.add_phase("fetch", elapsed)
+            profile.add_rows(len(rows))
+
+    def _record_error(self, ex: Exception, profile: Optional[QueryProfile]):
+        self.metrics.record_error(ex)
+        if profile is not None:
+            profile.error = ex.__class__.__name__
+
+    def _start_profile(self, sql_query: str, sql_variables: Any, method: str) -> Union[None, QueryProfile]:
+        if self.slow_query_log is None:
+            return None
+        return self.slow_query_log.start(sql_query=sql_query, sql_variables=sql_variables, method=method)
+
+    def _finish_profile(self, profile: Optional[QueryProfile]):
+        """Aggregate the profile and log the query if it is slow, with its plan if required"""
+        if profile is None or not self.slow_query_log.finish(profile):
+            return
+        explain = None
+        if self.slow_query_log.capture_explain and is_explainable(profile.sql_query):
+            explain = self.explain(profile.sql_query, profile.sql_variables)
+        self.slow_query_log.report(profile,
+                                   connector=f"{self.db_host}:{self.db_port}/{self.db_name}",
+                                   explain=explain)
+
+    def explain(self, sql_query: str, sql_variables: Optional[Tuple] = None) -> Any:
+        """Return the EXPLAIN FORMAT=JSON plan of a query, or the error message
+        It runs on a connection opened outside of the pool so that an exhausted pool
+        does not delay it and pooled sessions are left untouched
+        """
+        try:
+            side_connection: MySQLConnectionAbstract = _connect(**self.connection_config())
+            try:
+                mysql_cursor: MySQLCursor = side_connection.cursor()
+                mysql_cursor.execute(f"EXPLAIN FORMAT=JSON {sql_query}", sql_variables)
+                return parse_explain(mysql_cursor.fetchall())
+            finally:
+                side_connection.close()
+        except Exception as ex:
+            logger.debug(f"Error while explaining query: {ex}")
+            return f"{ex.__class__.__name__}: {ex}"
+
+    def _fetch_all(self, mysql_cursor: MySQLCursor, profile: Optional[QueryProfile] = None) -> List:
+        started: float = perf_counter()
+        rows = mysql_cursor.fetchall()
+        self._observe_fetch(started, rows, profile)
+        return rows
+
+    def _close_cursor(self, mysql_cursor: MySQLCursor):
+        """Close a cursor returned by _execute_query, prepared ones stay cached"""
+        if self.prepared_cache is None:
+            mysql_cursor.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the activity metrics and of the pool occupancy"""
+        stats: Dict[str, Any] = self.metrics.snapshot()
+        if self.mysql_pool is not None:
+            stats["connections_in_use"] = self.mysql_pool.in_use_count
+            stats["connections_idle"] = self.mysql_pool.idle_count
+        stats["engine"] = self.engine
+        return stats
+
+    def prometheus_metrics(self) -> str:
+        """Return stats() in the Prometheus text exposition format"""
+        return prometheus_text(self.stats(),
+                               labels={"connector": self.__class__.__name__,
+                                       "engine": self.engine,
+                                       "host": self.db_host,
+                                       "database": self.db_name})
+
+    @property
+    def in_transaction(self) -> bool:
+        """True inside a transaction() block opened by the current thread"""
+        return getattr(self._transaction_state, "connection", None) is not None
+
+    def _forget_prepared_statements(self, conn: MySQLConnectionAbstract):
+        """Drop the cached statements of a connection closed by the pool"""
+        if self.prepared_cache is not None:
+            self.prepared_cache.forget_connection(conn.connection_id)
+
+    def _get_connection(
+            self,
+            connection_name: Optional[str] = None,
+            profile: Optional[QueryProfile] = None,
+    ) -> MySQLConnectionAbstract:
+        """Return the connection of the current transaction, the named connection or a
+        connection from the pool. A named connection is used by one thread at a time: while
+        it is checked out, other threads asking for the same name get a pooled connection
+        """
+        transaction_connection = getattr(self._transaction_state, "connection", None)
+        if transaction_connection is not None:
+            return transaction_connection
+        if connection_name:
+            with self._pool_connections_lock:
+                conn = self.pool_connections.pop(connection_name, None)
+            if conn is not None:
+                return conn
+        started: float = perf_counter()
+        conn = self.mysql_pool.acquire()
+        elapsed: float = perf_counter() - started
+        self.metrics.observe_checkout(elapsed)
+        if profile is not None:
+            profile.add_phase("checkout", elapsed)
+        return conn
+
+    def _put_connection(
+            self,
+            conn: MySQLConnectionAbstract,
+            close_connection: bool,
+            connection_name: Optional[str] = None,
+    ):
+        """Give a connection back to the pool or keep it under its name,
+        the connection of the current transaction stays checked out until the block ends
+        """
+        if conn is getattr(self._transaction_state, "connection", None):
+            return
+        if not close_connection:
+            with self._pool_connections_lock:
+                if self.pool_connections.get(connection_name) is None:
+                    self.pool_connections[connection_name] = conn
+                    return
+        self.mysql_pool.release(conn)
+
+    def _end_stream(
+            self,
+            conn: MySQLConnectionAbstract,
+            mysql_cursor: Union[MySQLCursor, None],
+            finished: bool,
+            close_connection: bool,
+            connection_name: Optional[str] = None,
+    ):
+        """Give back the connection of an unbuffered stream. A stream stopped before the end
+        of its result (break, islice, an error) closes its connection rather than reading
+        the rest of the result, except the transaction one and a connection kept by name
+        """
+        if (mysql_cursor is not None and not finished and close_connection
+                and conn is not getattr(self._transaction_state, "connection", None)):
+            self.mysql_pool.discard(conn)
+            return
+        conn.consume_results()
+        if mysql_cursor is not None:
+            mysql_cursor.close()
+        self._put_connection(conn, close_connection, connection_name)
+
+    def _run_statement(self, conn: MySQLConnectionAbstract, sql_query: str):
+        mysql_cursor: MySQLCursor = conn.cursor()
+        mysql_cursor.execute(sql_query)
+        mysql_cursor.close()
+
+    @contextmanager
+    def transaction(
+            self,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Iterator["MySQLConnectorPoolNative"]:
+        """Unit of work: the statements run by the current thread inside the block share one
+        pooled connection and are committed once at the end, or rolled back if the block
+        raises. Inside the block the methods raise their errors instead of logging them,
+        and results are not cached. Nested blocks use savepoints, rolled back alone when
+        the nested block raises.
+
+            with my_connector.transaction():
+                my_connector.execute_one_query(...)
+                my_connector.execute_one_query(...)
+
+        :param close_connection: give the connection back to the pool after the outermost block
+        :param connection_name: run the transaction on this named connection
+        """
+        state = self._transaction_state
+        if self.in_transaction:
+            savepoint_name: str = f"mysql_helpers_sp_{state.depth}"
+            self._run_statement(state.connection, f"SAVEPOINT {savepoint_name}")
+            state.depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._run_statement(state.connection, f"ROLLBACK TO SAVEPOINT {savepoint_name}")
+                raise
+            else:
+                self._run_statement(state.connection, f"RELEASE SAVEPOINT {savepoint_name}")
+            finally:
+                state.depth -= 1
+            return
+
+        conn: MySQLConnectionAbstract = self._get_connection(connection_name)
+        if conn.in_transaction:
+            # ends the snapshot left open by previous reads, as START TRANSACTION would
+            conn.commit()
+        conn.start_transaction()
+        state.connection = conn
+        state.depth = 1
+        # tables written by the transaction, invalidated in the result cache on commit
+        state.tables = []
+        try:
+            yield self
+        except BaseException:
+            try:
+                conn.rollback()
+                self.metrics.record_rollback()
+            except Exception as ex:
+                logger.error(f"Error while rolling back transaction: {ex}")
+            raise
+        else:
+            conn.commit()
+            self.metrics.record_commit()
+            for tables in state.tables:
+                self.result_cache.invalidate_tables(tables)
+        finally:
+            state.connection = None
+            state.depth = 0
+            state.tables = []
+            self._put_connection(conn, close_connection, connection_name)
+
+    def prepared_statements_stats(self) -> Dict:
+        """Return the prepared statement cache hit/miss counters, empty if not in use"""
+        return {} if self.prepared_cache is None else self.prepared_cache.stats()
+
+    def _result_cache_key(
+            self,
+            kind: str,
+            sql_query: str,
+            sql_variables: Optional[Tuple],
+            cache_ttl: Optional[float],
+    ) -> Union[None, Tuple]:
+        """Return the result cache key of a read query, None when not cached"""
+        if self.result_cache is None or cache_ttl == 0 or self.in_transaction:
+            return None
+        return self.result_cache.make_key(namespace=f"{self.db_host}:{self.db_port}/{self.db_name}",
+                                          kind=kind,
+                                          sql_query=sql_query,
+                                          sql_variables=sql_variables)
+
+    def _invalidate_tables(self, tables: FrozenSet[str]):
+        """Invalidate the cached results of the written tables, once committed inside a
+        transaction: a connector sharing the cache could re-cache the rows before the commit
+        """
+        if self.result_cache is None:
+            return
+        if self.in_transaction:
+            self._transaction_state.tables.append(tables)
+        else:
+            self.result_cache.invalidate_tables(tables)
+
+    def _invalidate_result_cache(self, sql_query: str):
+        if self.result_cache is not None:
+            self._invalidate_tables(referenced_tables(sql_query))
+
+    def result_cache_stats(self) -> Dict:
+        """Return the result cache hit/miss counters, empty if not in use"""
+        return {} if self.result_cache is None else self.result_cache.stats()
+
     def fetch_all_as_df(
             self,
             sql_query: str,
             sql_variables: Optional[Tuple] = None,
             close_connection: bool = True,
             connection_name: Optional[str] = None,
+            cache_ttl: Optional[float] = None,
     ) -> Union[pd.DataFrame, None]:
         """
         :param sql_query: the MySQL query
         :param sql_variables: parameters ordered with %s usage in the sql_query
         :param close_connection: close connection after the method ends
+        :param cache_ttl: seconds the result stays in the result cache, default TTL of the
+                          cache if None, 0 to bypass it
         :return: return a pandas DataFrame if there are results or None if error
         """
+        cache_key = self._result_cache_key("df", sql_query, sql_variables, cache_ttl)
+        if cache_key is not None:
+            result_df = self.result_cache.get(cache_key)
+            if result_df is not None:
+                if close_connection and connection_name:
+                    self.close_connection(connection_name)
+                return result_df
 
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_df")
+        conn: Union[MySQLConnectionAbstract, None] = None
         try:
-            if (
-                    connection_name
-                    and self.pool_connections.get(connection_name) is not None
-            ):
-                conn: PooledMySQLConnection = self.pool_connections[connection_name]
-            else:
-                conn: PooledMySQLConnection = self.mysql_pool.get_connection()
+            conn = self._get_connection(connection_name, profile)
 
-            mysql_cursor = conn.cursor()
-            mysql_cursor.execute(sql_query, sql_variables)
-            result_df = pd.DataFrame(mysql_cursor.fetchall())
-            result_df.columns = mysql_cursor.column_names
-            mysql_cursor.close()
+            raw: bool = self.raw_fetch
+            mysql_cursor = self._execute_query(conn, sql_query, sql_variables, profile=profile, raw=raw)
+            rows = self._fetch_all(mysql_cursor, profile)
+            with PhaseTimer(profile, "to_df"):
+                result_df = rows_to_df(rows, mysql_cursor.description, raw=raw)
+            self._close_cursor(mysql_cursor)
 
-            if close_connection:
-                conn.close()
-            else:
-                self.pool_connections[connection_name] = conn
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result_df, sql_query, ttl=cache_ttl)
             return result_df
         except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while fetching data : {ex}. Exception is {ex.__class__.__name__}"
+            )
+            if self.in_transaction:
+                raise
+            return None
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            self._finish_profile(profile)
+
+    def fetch_all_as_records(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: bool = True,
+            columnar: bool = False,
+            connection_name: Optional[str] = None,
+    ) -> Union[List[Any], ColumnarResult, None]:
+        """Fetch the results as records: tuples readable by attribute (row.proxy_url) and by
+        key (row["proxy_url"]), several times smaller than the dicts of fetch_all_as_dicts.
+        With columnar=True the values are kept column by column, in typed arrays for the
+        numeric columns, and the records are only built when rows are accessed.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :param columnar: return a ColumnarResult instead of a list of records
+        :return: return a list of records or a ColumnarResult if there are results or None if error
+        """
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_records")
+        conn: Union[MySQLConnectionAbstract, None] = None
+        try:
+            conn = self._get_connection(connection_name, profile)
+
+            mysql_cursor = self._execute_query(conn, sql_query, sql_variables, profile=profile)
+            rows = self._fetch_all(mysql_cursor, profile)
+            with PhaseTimer(profile, "to_records"):
+                if columnar:
+                    result_records = ColumnarResult.from_rows(rows, mysql_cursor.description)
+                else:
+                    result_records = rows_to_records(rows, mysql_cursor.description)
+            self._close_cursor(mysql_cursor)
+            return result_records
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while fetching data : {ex}. Exception is {ex.__class__.__name__}"
+            )
+            if self.in_transaction:
+                raise
+            return None
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            self._finish_profile(profile)
+
+    def fetch_all_as_arrow(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Union[pa.Table, None]:
+        """Fetch the results as an Apache Arrow table, typed from the MySQL field types
+        table.to_pandas(types_mapper=pd.ArrowDtype) converts it to pandas without copy
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :return: return a pyarrow Table if there are results or None if error
+        """
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_arrow")
+        conn: Union[MySQLConnectionAbstract, None] = None
+        try:
+            conn = self._get_connection(connection_name, profile)
+
+            mysql_cursor = self._execute_query(conn, sql_query, sql_variables, profile=profile)
+            rows = self._fetch_all(mysql_cursor, profile)
+            with PhaseTimer(profile, "to_arrow"):
+                result_table = rows_to_arrow(rows, mysql_cursor.description)
+            self._close_cursor(mysql_cursor)
+            return result_table
+        except Exception as ex:
+            self._record_error(ex, profile)
             logger.error(
                 f"Error while fetching data : {ex}. Exception is {ex.__class__.__name__}"
             )
+            if self.in_transaction:
+                raise
             return None
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            self._finish_profile(profile)
+
+    def fetch_all_as_polars(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Union[pl.DataFrame, None]:
+        """Fetch the results as a polars DataFrame, built from fetch_all_as_arrow without copy
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :return: return a polars DataFrame if there are results or None if error
+        """
+        result_table = self.fetch_all_as_arrow(sql_query=sql_query,
+                                               sql_variables=sql_variables,
+                                               close_connection=close_connection,
+                                               connection_name=connection_name)
+        return None if result_table is None else arrow_to_polars(result_table)
 
     def fetch_all_as_dicts(
             self,
@@ -118,40 +645,442 @@ class MySQLConnectorPoolNative:
             sql_variables: Optional[Tuple] = None,
             close_connection: bool = True,
             connection_name: Optional[str] = None,
-    ) -> Union[List[Tuple], None]:
+            cache_ttl: Optional[float] = None,
+            dictionary: bool = False,
+    ) -> Union[List[Tuple], List[Dict], None]:
         """
         :param sql_query: the MySQL query
         :param sql_variables: parameters ordered with %s usage in the sql_query
         :param close_connection: close connection after the method ends
+        :param cache_ttl: seconds the result stays in the result cache, default TTL of the
+                          cache if None, 0 to bypass it
+        :param dictionary: return the rows as dicts instead of tuples
         :return: return a pandas DataFrame if there are results or None if error
         """
+        cache_key = self._result_cache_key("dicts" if dictionary else "tuples",
+                                           sql_query, sql_variables, cache_ttl)
+        if cache_key is not None:
+            results = self.result_cache.get(cache_key)
+            if results is not None:
+                if close_connection and connection_name:
+                    self.close_connection(connection_name)
+                return results
 
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_dicts")
+        conn: Union[MySQLConnectionAbstract, None] = None
         try:
-            if (
-                    connection_name
-                    and self.pool_connections.get(connection_name) is not None
-            ):
-                conn: PooledMySQLConnection = self.pool_connections[connection_name]
-            else:
-                conn: PooledMySQLConnection = self.mysql_pool.get_connection()
+            conn = self._get_connection(connection_name, profile)
 
-            mysql_cursor: MySQLCursor = conn.cursor()
-            mysql_cursor.execute(sql_query, sql_variables)
-            results = mysql_cursor.fetchall()
-            mysql_cursor.close()
+            mysql_cursor: MySQLCursor = self._execute_query(conn, sql_query, sql_variables,
+                                                            dictionary=dictionary, profile=profile)
+            results = self._fetch_all(mysql_cursor, profile)
+            self._close_cursor(mysql_cursor)
 
-            if close_connection:
-                conn.close()
-            else:
-                self.pool_connections[connection_name] = conn
+            if cache_key is not None:
+                self.result_cache.put(cache_key, results, sql_query, ttl=cache_ttl)
             return results
 
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while fetching data : {ex}. SQL Statement used: {sql_query}. "
+                f"Variables used: {sql_variables}."
+            )
+            if self.in_transaction:
+                raise
+            return None
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            self._finish_profile(profile)
+
+    def fetch_many(
+            self,
+            queries: Sequence[Tuple[str, Optional[Tuple]]],
+            max_workers: Optional[int] = None,
+            as_df: bool = False,
+            cache_ttl: Optional[float] = None,
+    ) -> List[Union[pd.DataFrame, List[Dict], None]]:
+        """Run read queries concurrently, each on a connection of the pool, and wait for all
+        of them. A failing query does not fail the others: its result is None and its error
+        is logged. Inside transaction() the queries run one after the other on the connection
+        of the transaction, which the worker threads cannot use, and errors are raised.
+        :param queries: (sql_query, sql_variables) pairs
+        :param max_workers: max number of queries running at the same time, defaults to the
+                            pool capacity (pool_size + pool_max_overflow)
+        :param as_df: return pandas DataFrames instead of lists of dicts
+        :param cache_ttl: seconds the results stay in the result cache, see fetch_all_as_df
+        :return: the results in the order of the queries, None for the failed ones
+        """
+        if not queries:
+            return []
+        if max_workers is None:
+            max_workers = self.pool_size + self.pool_max_overflow
+        if max_workers <= 0:
+            raise ValueError(f"max_workers must be a positive integer, got: {max_workers}")
+
+        def fetch(sql_query: str, sql_variables: Optional[Tuple]) -> Union[pd.DataFrame, List[Dict], None]:
+            if as_df:
+                return self.fetch_all_as_df(sql_query=sql_query, sql_variables=sql_variables,
+                                            close_connection=True, cache_ttl=cache_ttl)
+            return self.fetch_all_as_dicts(sql_query=sql_query, sql_variables=sql_variables,
+                                           close_connection=True, cache_ttl=cache_ttl, dictionary=True)
+
+        if self.in_transaction:
+            return [fetch(sql_query, sql_variables) for sql_query, sql_variables in queries]
+
+        results: List[Union[pd.DataFrame, List[Dict], None]] = [None] * len(queries)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries)),
+                                thread_name_prefix="mysql_helpers_fetch_many") as executor:
+            futures: List[Future] = [
+                executor.submit(fetch, sql_query, sql_variables) for sql_query, sql_variables in queries
+            ]
+            for index, future in enumerate(futures):
+                try:
+                    results[index] = future.result()
+                except Exception as ex:
+                    logger.error(
+                        f"Error ({ex.__class__.__name__}) while fetching query {index} of fetch_many: {ex}"
+                    )
+        return results
+
+    def _fetch_rows(self, sql_query: str, sql_variables: Optional[Tuple] = None) -> Tuple[List[Tuple], Any]:
+        """Return the raw rows and the cursor description of a query run on a pooled
+        connection, errors are raised
+        """
+        conn: MySQLConnectionAbstract = self._get_connection()
+        try:
+            mysql_cursor: MySQLCursor = self._execute_query(conn, sql_query, sql_variables)
+            rows = self._fetch_all(mysql_cursor)
+            description = mysql_cursor.description
+            self._close_cursor(mysql_cursor)
+            return rows, description
+        except Exception as ex:
+            self.metrics.record_error(ex)
+            raise
+        finally:
+            self._put_connection(conn, close_connection=True)
+
+    def read_table_parallel(
+            self,
+            table: str,
+            partition_column: str,
+            num_partitions: int = 8,
+            columns: Optional[Sequence[str]] = None,
+            where: Optional[str] = None,
+            sql_variables: Optional[Tuple] = None,
+            max_workers: Optional[int] = None,
+            convert_processes: Optional[int] = None,
+    ) -> Union[pd.DataFrame, None]:
+        """Read a table into one DataFrame by slicing the range of an integer column
+        (e.g. an auto-increment id) into num_partitions equal ranges fetched concurrently on
+        pooled connections. Rows whose partition column is NULL are not read. Inside
+        transaction() the slices are read one after the other on the transaction connection.
+        :param table: the table name, can be prefixed by the schema name
+        :param partition_column: the integer column to slice on, it should be indexed
+        :param num_partitions: number of slices
+        :param columns: the columns to read, all of them if None
+        :param where: an extra filter, with %s placeholders for sql_variables
+        :param sql_variables: parameters of the where filter
+        :param max_workers: max number of slices fetched at the same time, defaults to the
+                            pool capacity (pool_size + pool_max_overflow)
+        :param convert_processes: convert the slices to DataFrames in a pool of this many
+                                  processes, by default the rows are converted once in the
+                                  calling thread
+        :return: return a pandas DataFrame, or None if error
+        """
+        if max_workers is None:
+            max_workers = self.pool_size + self.pool_max_overflow
+        if max_workers <= 0:
+            raise ValueError(f"max_workers must be a positive integer, got: {max_workers}")
+        if num_partitions <= 0:
+            raise ValueError(f"num_partitions must be a positive integer, got: {num_partitions}")
+
+        try:
+            bounds_rows, _ = self._fetch_rows(build_bounds_query(table, partition_column, where),
+                                              sql_variables)
+            min_value, max_value = bounds_rows[0]
+            if min_value is None:
+                # empty table: one query gives the columns of the empty DataFrame
+                bounds: List[Tuple[int, int]] = [(0, 0)]
+            else:
+                bounds = partition_bounds(min_value, max_value, num_partitions)
+            queries = build_partition_queries(table=table,
+                                              partition_column=partition_column,
+                                              bounds=bounds,
+                                              columns=columns,
+                                              where=where,
+                                              sql_variables=sql_variables)
+
+            if self.in_transaction:
+                # the worker threads cannot use the connection of the transaction
+                results = [self._fetch_rows(*query) for query in queries]
+            else:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(queries)),
+                                        thread_name_prefix="mysql_helpers_read_table") as executor:
+                    results = list(executor.map(lambda query: self._fetch_rows(*query), queries))
+            description = results[0][1]
+            partitions: List[List[Tuple]] = [rows for rows, _ in results]
+            del results
+            return partitions_to_df(partitions, description, convert_processes=convert_processes)
         except Exception as ex:
             logger.error(
-                f"Error while inserting new score: {ex}. SQL Statement used: {mysql_cursor.statement}."
+                f"Error ({ex.__class__.__name__}) while reading {table} in parallel: {ex}. "
+                f"Partition column: {partition_column}, partitions: {num_partitions}."
             )
+            if self.in_transaction:
+                raise
             return None
 
+    def fetch_chunks(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 10_000,
+            as_df: bool = False,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Iterator[Union[List[Tuple], pd.DataFrame]]:
+        """Stream the results with an unbuffered cursor, chunk_size rows at a time, so memory
+        use does not depend on the size of the result. Errors are logged and raised.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows per chunk
+        :param as_df: yield pandas DataFrames instead of lists of tuples
+        :param close_connection: close connection after the last chunk
+        :return: a generator of lists of tuples or of pandas DataFrames
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive integer, got: {chunk_size}")
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_chunks")
+        conn: MySQLConnectionAbstract = self._get_connection(connection_name, profile)
+
+        mysql_cursor: Union[MySQLCursor, None] = None
+        finished: bool = False
+        raw: bool = as_df and self.engine == ENGINE_C
+        try:
+            mysql_cursor = conn.cursor(buffered=False, raw=True) if raw else conn.cursor(buffered=False)
+            started: float = perf_counter()
+            mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            while True:
+                started = perf_counter()
+                rows = mysql_cursor.fetchmany(chunk_size)
+                self._observe_fetch(started, rows, profile)
+                if not rows:
+                    finished = True
+                    break
+                if as_df:
+                    with PhaseTimer(profile, "to_df"):
+                        chunk_df = rows_to_df(rows, mysql_cursor.description, raw=raw)
+                    yield chunk_df
+                else:
+                    yield rows
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while streaming data : {ex}. Exception is {ex.__class__.__name__}"
+            )
+            raise
+        finally:
+            self._end_stream(conn, mysql_cursor, finished, close_connection, connection_name)
+            self._finish_profile(profile)
+
+    def fetch_iter(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 1_000,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Iterator[Tuple]:
+        """Stream the results row by row, see fetch_chunks
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows fetched from the server at a time
+        :param close_connection: close connection after the last row
+        :return: a generator of tuples
+        """
+        for rows in self.fetch_chunks(sql_query=sql_query,
+                                      sql_variables=sql_variables,
+                                      chunk_size=chunk_size,
+                                      close_connection=close_connection,
+                                      connection_name=connection_name):
+            yield from rows
+
+    def iter_table(
+            self,
+            table: str,
+            key_column: Union[str, Sequence[str]],
+            page_size: int = 10_000,
+            where: Optional[str] = None,
+            where_variables: Optional[Tuple] = None,
+            columns: Optional[Sequence[str]] = None,
+            as_df: bool = False,
+            start_after: Optional[Sequence[Any]] = None,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Iterator[Union[List[Dict], pd.DataFrame]]:
+        """Scan a table page by page with keyset pagination: each page is read after the key
+        of the previous one (WHERE key > last key ORDER BY key LIMIT page_size), so each
+        query seeks in the index instead of skipping rows like OFFSET does. Errors are
+        logged and raised.
+        :param table: the table name, can be prefixed by the schema name
+        :param key_column: the column of a unique index, or the columns of a composite one
+        :param page_size: number of rows per page
+        :param where: an extra filter, with %s placeholders for where_variables
+        :param where_variables: parameters of the where filter
+        :param columns: the columns to read, all of them if None, the key columns are added
+        :param as_df: yield pandas DataFrames instead of lists of dicts
+        :param start_after: resume the scan after this key, e.g. the page_last_key of the
+                            last page processed by an interrupted job
+        :param close_connection: close connection after the last page
+        :return: a generator of lists of dicts or of pandas DataFrames
+        """
+        key_columns: List[str] = key_columns_list(key_column)
+        if start_after is not None and len(start_after) != len(key_columns):
+            raise ValueError(f"start_after must hold one value per key column {key_columns}, got: {start_after}")
+        first_query: str = build_keyset_query(table, key_columns, page_size, columns, where, seek=False)
+        next_query: str = build_keyset_query(table, key_columns, page_size, columns, where, seek=True)
+        last_key: Union[None, Tuple] = None if start_after is None else tuple(start_after)
+
+        conn: MySQLConnectionAbstract = self._get_connection(connection_name)
+        try:
+            while True:
+                if last_key is None:
+                    sql_query, sql_variables = first_query, where_variables
+                else:
+                    sql_query, sql_variables = next_query, tuple(where_variables or ()) + seek_variables(last_key)
+                profile = self._start_profile(sql_query, sql_variables, "iter_table")
+                try:
+                    mysql_cursor = self._execute_query(conn, sql_query, sql_variables, dictionary=not as_df,
+                                                       profile=profile)
+                    rows = self._fetch_all(mysql_cursor, profile)
+                    if rows:
+                        last_key = rows_last_key(rows, key_columns, mysql_cursor.description)
+                    if as_df:
+                        with PhaseTimer(profile, "to_df"):
+                            page = rows_to_df(rows, mysql_cursor.description)
+                    else:
+                        page = rows
+                    self._close_cursor(mysql_cursor)
+                except Exception as ex:
+                    self._record_error(ex, profile)
+                    logger.error(
+                        f"Error while paging through {table} : {ex}. Exception is {ex.__class__.__name__}"
+                    )
+                    raise
+                finally:
+                    self._finish_profile(profile)
+                if not rows:
+                    return
+                yield page
+                if len(rows) < page_size:
+                    return
+        finally:
+            self._put_connection(conn, close_connection, connection_name)
+
+    def export_query(
+            self,
+            sql_query: str,
+            path: Union[str, PathLike],
+            file_format: str = "parquet",
+            sql_variables: Optional[Tuple] = None,
+            row_group_size: int = 100_000,
+            compression: Optional[str] = None,
+            max_file_size: Optional[int] = None,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> List[str]:
+        """Stream the results of a query to a Parquet or CSV file, one row group at a time:
+        rows are read with an unbuffered cursor and written as Arrow record batches of
+        row_group_size rows, so memory use depends on row_group_size, not on the result
+        size. No file is written for an empty result. Errors are logged and raised, the
+        files of a failed export are deleted.
+        :param sql_query: the MySQL query
+        :param path: the file to write, the base name of the parts with max_file_size
+        :param file_format: "parquet" or "csv"
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param row_group_size: number of rows read and written at a time
+        :param compression: Parquet column codec ("snappy" by default, "zstd", "gzip",
+                            "none"...), or whole file codec for CSV ("gzip", "zstd"...)
+        :param max_file_size: split the output in files of about this many bytes, named
+                              path stem + "-00000", "-00001"... + suffix
+        :param close_connection: close connection after the export
+        :return: the paths of the files written
+        """
+        writer = ExportFileWriter(path, file_format, compression=compression, max_file_size=max_file_size)
+        try:
+            for batch in self.fetch_arrow_batches(sql_query=sql_query,
+                                                  sql_variables=sql_variables,
+                                                  chunk_size=row_group_size,
+                                                  close_connection=close_connection,
+                                                  connection_name=connection_name):
+                writer.write(batch)
+            paths: List[str] = writer.close()
+        except Exception as ex:
+            logger.error(
+                f"Error while exporting to {path}: {ex}. Exception is {ex.__class__.__name__}"
+            )
+            writer.abort()
+            raise
+        logger.debug(f"Exported {writer.rows_written} rows to {len(paths)} file(s): {path}")
+        return paths
+
+    def fetch_arrow_batches(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 10_000,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Iterator[pa.RecordBatch]:
+        """Stream the results as Arrow record batches of chunk_size rows, see fetch_chunks.
+        A column typed from its values (DECIMAL, NULL in all the previous rows) can get a
+        wider type in a later batch, see rows_to_record_batch and arrow_helpers.cast_batch.
+        polars.from_arrow(batch) wraps a batch without copy.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows per batch
+        :param close_connection: close connection after the last batch
+        :return: a generator of pyarrow RecordBatches
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive integer, got: {chunk_size}")
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_arrow_batches")
+        conn: MySQLConnectionAbstract = self._get_connection(connection_name, profile)
+
+        mysql_cursor: Union[MySQLCursor, None] = None
+        finished: bool = False
+        try:
+            mysql_cursor = conn.cursor(buffered=False)
+            started: float = perf_counter()
+            mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            schema: Union[pa.Schema, None] = None
+            while True:
+                started = perf_counter()
+                rows = mysql_cursor.fetchmany(chunk_size)
+                self._observe_fetch(started, rows, profile)
+                if not rows:
+                    finished = True
+                    break
+                with PhaseTimer(profile, "to_arrow"):
+                    record_batch = rows_to_record_batch(rows, mysql_cursor.description, schema)
+                schema = record_batch.schema
+                yield record_batch
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while streaming data : {ex}. Exception is {ex.__class__.__name__}"
+            )
+            raise
+        finally:
+            self._end_stream(conn, mysql_cursor, finished, close_connection, connection_name)
+            self._finish_profile(profile)
+
     def execute_one_query(
             self,
             sql_query: str,
@@ -166,49 +1095,278 @@ class MySQLConnectorPoolNative:
         :return: returns the number of rows affected, -1 if connection error ONLY
         """
 
+        profile = self._start_profile(sql_query, sql_variables, "execute_one_query")
         rows_affected: int = 0
+        conn: Union[MySQLConnectionAbstract, None] = None
         try:
-            if (
-                    connection_name
-                    and self.pool_connections.get(connection_name) is not None
-            ):
-                conn: PooledMySQLConnection = self.pool_connections[connection_name]
-            else:
-                conn: PooledMySQLConnection = self.mysql_pool.get_connection()
+            conn = self._get_connection(connection_name, profile)
 
-            mysql_cursor: MySQLCursor = conn.cursor()
-            mysql_cursor.execute(sql_query, sql_variables)
+            mysql_cursor: MySQLCursor = self._execute_query(conn, sql_query, sql_variables,
+                                                            profile=profile)
             rows_affected = mysql_cursor.rowcount
-            conn.commit()
-            mysql_cursor.close()
-
-            if close_connection:
-                conn.close()
-            else:
-                self.pool_connections[connection_name] = conn
+            if profile is not None:
+                profile.add_rows(rows_affected)
+            if not self.in_transaction:
+                conn.commit()
+                self.metrics.record_commit()
+            self._close_cursor(mysql_cursor)
 
         except Exception as ex:
+            self._record_error(ex, profile)
             logger.error(
                 f"Error ({ex.__class__.__name__}) while executing query: {ex}. Variables used: {sql_variables}."
             )
             try:
-                logger.error('Statement used: "{mysql_cursor.statement}" ')
+                logger.error(f'Statement used: "{mysql_cursor.statement}" ')
             # TODO: use the appropriate Excetion code for undefined variables
             except Exception as ex:
                 logger.error(
                     f"Error ({ex.__class__.__name__}) while executing sql statement: {ex}"
                 )
+            if self.in_transaction:
+                raise
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            self._finish_profile(profile)
 
+        self._invalidate_result_cache(sql_query)
         return rows_affected
 
+    def write_df(
+            self,
+            df: pd.DataFrame,
+            table: str,
+            mode: str = "append",
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Tuple[int, int]:
+        """Bulk load a DataFrame with LOAD DATA LOCAL INFILE through a temporary csv file,
+        the write-side counterpart of fetch_all_as_df. Needs allow_local_infile=True and
+        local_infile enabled on the server.
+        :param df: the DataFrame to load, its column names must match the table ones
+        :param table: the table name, can be prefixed by the schema name
+        :param mode: append fails on duplicate keys, replace overwrites them, ignore skips them
+        :param close_connection: close connection after the method ends
+        :return: returns the number of rows loaded and the number of warnings
+        """
+
+        profile = self._start_profile(f"LOAD DATA LOCAL INFILE INTO TABLE {table}", None, "write_df")
+        rows_loaded: int = 0
+        warning_count: int = 0
+        conn: Union[MySQLConnectionAbstract, None] = None
+        try:
+            conn = self._get_connection(connection_name, profile)
+
+            with temporary_csv_path() as file_path:
+                with PhaseTimer(profile, "to_csv"):
+                    df_to_csv(df, file_path)
+                sql_query: str = build_load_data_query(table=table,
+                                                       columns=list(df.columns),
+                                                       file_path=file_path,
+                                                       mode=mode)
+                mysql_cursor: MySQLCursor = conn.cursor()
+                started: float = perf_counter()
+                mysql_cursor.execute(sql_query)
+                self._observe_execute(started, sql_query, profile)
+                rows_loaded = mysql_cursor.rowcount
+                warning_count = mysql_cursor.warning_count
+                if not self.in_transaction:
+                    conn.commit()
+                    self.metrics.record_commit()
+                mysql_cursor.close()
+
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error ({ex.__class__.__name__}) while loading DataFrame into {table}: {ex}. "
+                f"Rows: {len(df)}, mode: {mode}."
+            )
+            if self.in_transaction:
+                raise
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            if profile is not None:
+                profile.add_rows(rows_loaded)
+            self._finish_profile(profile)
+
+        self._invalidate_tables(frozenset([table]))
+        return rows_loaded, warning_count
+
     def close_connection(self, connection_name: str):
-        self.pool_connections[connection_name].close()
+        """Give a named connection back to the pool"""
+        with self._pool_connections_lock:
+            conn = self.pool_connections.pop(connection_name, None)
+        if conn is not None:
+            self.mysql_pool.release(conn)
 
     def close_all_connections(self):
-        for conn in self.pool_connections:
-            self.pool_connections[conn].close()
+        with self._pool_connections_lock:
+            connections = list(self.pool_connections.values())
+            self.pool_connections.clear()
+        for conn in connections:
+            self.mysql_pool.release(conn)
+
+    def close_pool(self):
+        """Give the named connections back and close all pooled connections"""
+        self.close_all_connections()
+        if self.mysql_pool is not None:
+            self.mysql_pool.close()
 
-    #:TODO: add execute many using prepared statement
+    def upsert_df(
+            self,
+            df: pd.DataFrame,
+            table: str,
+            key_columns: Sequence[str],
+            update_columns: Optional[Sequence[str]] = None,
+            batch_size: int = 1000,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """Upsert a DataFrame with multi-row INSERT ... ON DUPLICATE KEY UPDATE statements,
+        rendered column by column and split to fit in max_allowed_packet, one commit per batch
+        :param df: the DataFrame to upsert, its column names must match the table ones
+        :param table: the table name, can be prefixed by the schema name
+        :param key_columns: the columns of the unique key the duplicates are detected on
+        :param update_columns: the columns overwritten on duplicates, all but the keys if None,
+                               none if empty: existing rows are then left unchanged
+        :param batch_size: max number of rows per statement
+        :param close_connection: close connection after the method ends
+        :return: the numbers of inserted, updated and unchanged rows of the committed batches
+        """
+        prefix, suffix = build_upsert_query(table, list(df.columns), key_columns, update_columns)
+        counts: Dict[str, int] = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if df.empty:
+            return counts
+
+        profile = self._start_profile(f"{prefix}(...){suffix}", None, "upsert_df")
+        conn: Union[MySQLConnectionAbstract, None] = None
+        try:
+            conn = self._get_connection(connection_name, profile)
+            if self.max_allowed_packet is None:
+                mysql_cursor: MySQLCursor = conn.cursor()
+                mysql_cursor.execute("SELECT @@max_allowed_packet")
+                self.max_allowed_packet = int(mysql_cursor.fetchone()[0])
+                mysql_cursor.close()
+
+            with PhaseTimer(profile, "to_sql"):
+                values = df_to_sql_values(df)
+            conn.cmd_query(RESET_DUPLICATES_QUERY)
+            duplicates: int = 0
+            for start, end in split_values(values=values,
+                                           max_allowed_packet=self.max_allowed_packet,
+                                           statement_size=len(prefix) + len(suffix),
+                                           batch_size=batch_size):
+                sql_query: str = prefix + ",".join(values[start:end]) + suffix
+                started: float = perf_counter()
+                result = conn.cmd_query(sql_query)
+                self._observe_execute(started, sql_query, profile)
+                if not self.in_transaction:
+                    conn.commit()
+                    self.metrics.record_commit()
+                mysql_cursor = conn.cursor()
+                mysql_cursor.execute(READ_DUPLICATES_QUERY)
+                total_duplicates: int = int(mysql_cursor.fetchone()[0])
+                mysql_cursor.close()
+                batch_counts = upsert_counts(end - start, result["affected_rows"], total_duplicates - duplicates)
+                duplicates = total_duplicates
+                for name, count in batch_counts.items():
+                    counts[name] += count
+
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error ({ex.__class__.__name__}) while upserting DataFrame into {table}: {ex}. "
+                f"Rows: {len(df)}, rows committed before error: {sum(counts.values())}."
+            )
+            if self.in_transaction:
+                raise
+            if conn is not None:
+                try:
+                    conn.rollback()
+                    self.metrics.record_rollback()
+                except Exception as rollback_ex:
+                    logger.error(
+                        f"Error ({rollback_ex.__class__.__name__}) while rolling back: {rollback_ex}"
+                    )
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            if profile is not None:
+                profile.add_rows(sum(counts.values()))
+            self._finish_profile(profile)
+
+        self._invalidate_tables(frozenset([table]))
+        return counts
+
+    def execute_many(
+            self,
+            sql_query: str,
+            rows: Iterable[Sequence[Any]],
+            batch_size: int = 1000,
+            close_connection: bool = True,
+            connection_name: Optional[str] = None,
+    ) -> int:
+        """method that handles bulk writes: INSERT statements are rewritten by the connector
+        into multi-row VALUES batches sized to fit in max_allowed_packet, one commit per batch
+        :param sql_query: the MySQL query, with %s placeholders for one row
+        :param rows: iterable of sql_variables, one per row
+        :param batch_size: max number of rows sent per batch
+        :param close_connection: close connection after the method ends
+        :return: returns the total number of rows affected by the committed batches
+        """
+
+        profile = self._start_profile(sql_query, None, "execute_many")
+        rows_affected: int = 0
+        conn: Union[MySQLConnectionAbstract, None] = None
+        try:
+            conn = self._get_connection(connection_name, profile)
+
+            mysql_cursor: MySQLCursor = conn.cursor()
+            if self.max_allowed_packet is None:
+                mysql_cursor.execute("SELECT @@max_allowed_packet")
+                self.max_allowed_packet = int(mysql_cursor.fetchone()[0])
+
+            for batch in iter_batches(rows=rows,
+                                      batch_size=batch_size,
+                                      max_allowed_packet=self.max_allowed_packet,
+                                      sql_query=sql_query):
+                started: float = perf_counter()
+                mysql_cursor.executemany(sql_query, batch)
+                self._observe_execute(started, sql_query, profile)
+                self.metrics.observe_rows_sent(batch)
+                if not self.in_transaction:
+                    conn.commit()
+                    self.metrics.record_commit()
+                rows_affected += mysql_cursor.rowcount
+            mysql_cursor.close()
+
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error ({ex.__class__.__name__}) while executing many: {ex}. "
+                f"Rows committed before error: {rows_affected}."
+            )
+            if self.in_transaction:
+                raise
+            if conn is not None:
+                try:
+                    conn.rollback()
+                    self.metrics.record_rollback()
+                except Exception as rollback_ex:
+                    logger.error(
+                        f"Error ({rollback_ex.__class__.__name__}) while rolling back: {rollback_ex}"
+                    )
+        finally:
+            if conn is not None:
+                self._put_connection(conn, close_connection, connection_name)
+            if profile is not None:
+                profile.add_rows(rows_affected)
+            self._finish_profile(profile)
+
+        self._invalidate_result_cache(sql_query)
+        return rows_affected
 
 
 if __name__ == "__main__":
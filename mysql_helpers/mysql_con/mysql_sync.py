@@ -1,13 +1,42 @@
 """ Handles queries to MySQL using the mysql-python native connector"""
+from __future__ import annotations
+
 import logging
-from os import environ
+from contextlib import contextmanager
+from os import environ, PathLike
 from pathlib import Path
-from typing import (Union, Optional, List, Tuple, Dict)
+from time import perf_counter, monotonic, sleep
+from typing import (Union, Optional, List, Tuple, Dict, Iterable, Iterator, Sequence, Any, FrozenSet,
+                    TYPE_CHECKING)
 
-import pandas as pd
 from mysql.connector import MySQLConnection
 from mysql.connector.cursor import MySQLCursor
 
+from mysql_helpers.mysql_con.arrow_helpers import rows_to_arrow, rows_to_record_batch, arrow_to_polars
+from mysql_helpers.mysql_con.batch_helpers import iter_batches
+from mysql_helpers.mysql_con.df_helpers import rows_to_df
+from mysql_helpers.mysql_con.engine_helpers import ENGINE_AUTO, ENGINE_C, resolve_engine, connection_class
+from mysql_helpers.mysql_con.export_helpers import ExportFileWriter
+from mysql_helpers.mysql_con.keep_alive import is_connection_lost, backoff_delays, close_at_exit
+from mysql_helpers.mysql_con.keyset_helpers import (key_columns_list, build_keyset_query, seek_variables,
+                                                    rows_last_key)
+from mysql_helpers.mysql_con.load_data_helpers import (build_load_data_query, df_to_csv,
+                                                        temporary_csv_path)
+from mysql_helpers.mysql_con.metrics import ConnectorMetrics, prometheus_text
+from mysql_helpers.mysql_con.prepared_cache import PreparedStatementCache
+from mysql_helpers.mysql_con.query_cache import QueryResultCache, is_read_query, referenced_tables
+from mysql_helpers.mysql_con.record_helpers import ColumnarResult, rows_to_records
+from mysql_helpers.mysql_con.slow_query_log import (SlowQueryLog, QueryProfile, PhaseTimer,
+                                                    is_explainable, parse_explain)
+from mysql_helpers.mysql_con.upsert_helpers import (build_upsert_query, df_to_sql_values, split_values,
+                                                    upsert_counts, RESET_DUPLICATES_QUERY,
+                                                    READ_DUPLICATES_QUERY)
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import polars as pl
+    import pyarrow as pa
+
 logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
 
 
@@ -22,7 +51,41 @@ class MySQLConnectorNative:
             db_password: Optional[str] = None,
             db_name: Optional[str] = None,
             raise_on_warnings: bool = False,
+            allow_local_infile: bool = False,
+            use_prepared_statements: bool = False,
+            prepared_cache_size: int = 128,
+            result_cache: Optional[QueryResultCache] = None,
+            metrics: Optional[ConnectorMetrics] = None,
+            slow_query_log: Optional[SlowQueryLog] = None,
+            persistent: bool = False,
+            idle_ping_interval: float = 30.0,
+            reconnect_attempts: int = 3,
+            reconnect_backoff: float = 0.2,
+            engine: str = ENGINE_AUTO,
     ):
+        """
+        :param allow_local_infile: allow LOAD DATA LOCAL INFILE, needed by write_df
+        :param use_prepared_statements: run fetch_all_as_df, fetch_all_as_dicts and
+                                        execute_one_query as server side prepared statements
+                                        (binary protocol), cached per connection
+        :param prepared_cache_size: max number of prepared statements kept per connection
+        :param result_cache: cache of fetch_all_as_df and fetch_all_as_dicts results, can be
+                             shared between connectors, invalidated by this connector writes
+        :param metrics: where the activity is recorded, a new ConnectorMetrics if None,
+                        ConnectorMetrics(enabled=False) turns the recording off
+        :param slow_query_log: profile each call (connect, execute, fetch, DataFrame conversion)
+                               and log the queries slower than its threshold
+        :param persistent: keep the connection open between calls whatever close_connection
+                           says, reconnect when it was lost and replay a failed read once,
+                           close it at interpreter exit or with close_connection(force=True)
+        :param idle_ping_interval: in persistent mode, ping the connection before reusing it
+                                   only when it was idle for longer than this, in seconds
+        :param reconnect_attempts: in persistent mode, connection attempts before giving up
+        :param reconnect_backoff: seconds before the second attempt, doubled at each attempt
+        :param engine: "c" uses the C extension (CMySQLConnection) and reads the DataFrame
+                       results with raw cursors converted by numpy, "pure" the pure Python
+                       protocol, "auto" the C extension when it is available
+        """
         self.db_host: str = environ["MYSQL_DB_HOST"] if db_host is None else db_host
         self.db_port: Union[int, str] = (
             environ["MYSQL_DB_PORT"] if db_port is None else str(db_port)
@@ -33,54 +96,414 @@ class MySQLConnectorNative:
         )
         self.db_name: str = environ["MYSQL_DB_NAME"] if db_name is None else db_name
         self.raise_on_warnings: bool = raise_on_warnings
+        self.allow_local_infile: bool = allow_local_infile
         self.mysql_connection: Union[None, MySQLConnection] = None
+        self.max_allowed_packet: Union[None, int] = None
+        self.prepared_cache: Union[None, PreparedStatementCache] = (
+            PreparedStatementCache(max_size=prepared_cache_size) if use_prepared_statements else None
+        )
+        self.result_cache: Union[None, QueryResultCache] = result_cache
+        self.metrics: ConnectorMetrics = ConnectorMetrics() if metrics is None else metrics
+        self.slow_query_log: Union[None, SlowQueryLog] = slow_query_log
+        # number of nested transaction() blocks, savepoints are used above 1
+        self.transaction_depth: int = 0
+        # tables written by the current transaction, invalidated in the result cache on commit
+        self._transaction_tables: List[FrozenSet[str]] = []
+        self.persistent: bool = persistent
+        self.idle_ping_interval: float = idle_ping_interval
+        self.reconnect_attempts: int = max(1, reconnect_attempts)
+        self.reconnect_backoff: float = reconnect_backoff
+        # monotonic time the persistent connection was last known alive
+        self.last_used: float = 0.0
+        # ping the persistent connection before its next use, set after an error
+        self._check_connection: bool = False
+        self.engine: str = resolve_engine(engine)
+        self.connection_class = connection_class(self.engine)
+        if persistent:
+            close_at_exit(self)
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.transaction_depth > 0
+
+    @property
+    def raw_fetch(self) -> bool:
+        """DataFrames are built from raw cursors, prepared statements have no raw mode"""
+        return self.engine == ENGINE_C and self.prepared_cache is None
+
+    def connection_config(self) -> Dict:
+        """Return the keyword arguments used to open a connection"""
+        return dict(
+            host=self.db_host,
+            port=self.db_port,
+            user=self.db_user,
+            passwd=self.db_password,
+            database=self.db_name,
+            get_warnings=True,
+            raise_on_warnings=self.raise_on_warnings,
+            allow_local_infile=self.allow_local_infile,
+        )
 
     def open_connection(self) -> Union[None, MySQLConnection]:
         """Return mysql connection or None if failure to establish one"""
-        if self.mysql_connection is not None and self.mysql_connection.is_connected():
+        # never reconnect silently in the middle of a transaction
+        if self.in_transaction:
             return self.mysql_connection
-
-        try:
-            self.mysql_connection = MySQLConnection(
-                host=self.db_host,
-                port=self.db_port,
-                user=self.db_user,
-                passwd=self.db_password,
-                database=self.db_name,
-                get_warnings=True,
-                raise_on_warnings=self.raise_on_warnings,
-            )
+        if self.mysql_connection is not None and self._connection_alive():
             return self.mysql_connection
-        except Exception as ex:
-            raise ConnectionError(f'Failed to connect to database\n'
-                                  f'Exception: {ex}')
 
-    def close_connection(self):
+        self._forget_prepared_statements()
+        started: float = perf_counter()
+        attempts: int = self.reconnect_attempts if self.persistent else 1
+        for delay in backoff_delays(attempts, self.reconnect_backoff):
+            sleep(delay)
+            try:
+                self.mysql_connection = self.connection_class(**self.connection_config())
+                self.metrics.observe_checkout(perf_counter() - started)
+                self.last_used = monotonic()
+                return self.mysql_connection
+            except Exception as ex:
+                self.metrics.record_error(ex)
+                connection_error: Exception = ex
+        raise ConnectionError(f'Failed to connect to database\n'
+                              f'Exception: {connection_error}')
+
+    def _connection_alive(self) -> bool:
+        """Ping the connection, in persistent mode only when idle for longer than
+        idle_ping_interval or after an error
+        """
+        if (self.persistent and not self._check_connection
+                and monotonic() - self.last_used < self.idle_ping_interval):
+            return True
+        self._check_connection = False
+        if not self.mysql_connection.is_connected():
+            return False
+        self.last_used = monotonic()
+        return True
+
+    def close_connection(self, force: bool = False):
+        """Close the connection, deferred to the end of the transaction when in one
+        :param force: close it in persistent mode too, where it is kept open otherwise
+        """
+        if self.in_transaction:
+            return
+        if self.persistent and not force:
+            self.last_used = monotonic()
+            return
+        self._forget_prepared_statements()
         if self.mysql_connection is not None and self.mysql_connection.is_connected():
             self.mysql_connection.close()
+        self.mysql_connection = None
+
+    def _drop_connection(self):
+        """Close the connection without the ping of close_connection(), which fails while an
+        unbuffered result is unread: the rest of the result is dropped with the socket
+        instead of being read
+        """
+        self._forget_prepared_statements()
+        try:
+            self.mysql_connection.close()
+        except Exception as ex:
+            logger.debug(f"Error while closing connection: {ex}")
+        self.mysql_connection = None
+
+    def _run_statement(self, sql_query: str):
+        mysql_cursor: MySQLCursor = self.mysql_connection.cursor()
+        mysql_cursor.execute(sql_query)
+        mysql_cursor.close()
+
+    @contextmanager
+    def transaction(self, close_connection: Optional[bool] = True) -> Iterator["MySQLConnectorNative"]:
+        """Unit of work: the statements run inside the block share one connection and are
+        committed once at the end, or rolled back if the block raises. Inside the block the
+        methods raise their errors instead of logging them, and results are not cached.
+        Nested blocks use savepoints, rolled back alone when the nested block raises.
+
+            with my_connector.transaction():
+                my_connector.execute_one_query(...)
+                my_connector.execute_one_query(...)
+
+        :param close_connection: close connection after the outermost block ends
+        """
+        if self.in_transaction:
+            savepoint_name: str = f"mysql_helpers_sp_{self.transaction_depth}"
+            self._run_statement(f"SAVEPOINT {savepoint_name}")
+            self.transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._run_statement(f"ROLLBACK TO SAVEPOINT {savepoint_name}")
+                raise
+            else:
+                self._run_statement(f"RELEASE SAVEPOINT {savepoint_name}")
+            finally:
+                self.transaction_depth -= 1
+            return
+
+        self.open_connection()
+        if self.mysql_connection.in_transaction:
+            # ends the snapshot left open by previous reads, as START TRANSACTION would
+            self.mysql_connection.commit()
+        self.mysql_connection.start_transaction()
+        self.transaction_depth = 1
+        self._transaction_tables = []
+        try:
+            yield self
+        except BaseException:
+            try:
+                self.mysql_connection.rollback()
+                self.metrics.record_rollback()
+            except Exception as ex:
+                logger.error(f"Error while rolling back transaction: {ex}")
+            raise
+        else:
+            self.mysql_connection.commit()
+            self.metrics.record_commit()
+            for tables in self._transaction_tables:
+                self.result_cache.invalidate_tables(tables)
+        finally:
+            self.transaction_depth = 0
+            self._transaction_tables = []
+            if close_connection:
+                self.close_connection()
+
+    def _forget_prepared_statements(self):
+        """Drop the cached statements of the connection, the server frees them on disconnect"""
+        if self.prepared_cache is not None and self.mysql_connection is not None:
+            self.prepared_cache.forget_connection(self.mysql_connection.connection_id)
+
+    def _execute_query(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            dictionary: bool = False,
+            profile: Optional[QueryProfile] = None,
+            raw: bool = False,
+    ) -> MySQLCursor:
+        """Return a cursor on which the query was executed
+        In prepared statements mode the cursor comes from the prepared statement cache
+        and must be released with _close_cursor, not closed
+        :param raw: return the values as sent by the server, see raw_fetch
+        """
+        started: float = perf_counter()
+        if self.prepared_cache is None:
+            mysql_cursor: MySQLCursor = (self.mysql_connection.cursor(raw=True) if raw
+                                         else self.mysql_connection.cursor(dictionary=dictionary))
+            mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            return mysql_cursor
+
+        connection_id: int = self.mysql_connection.connection_id
+        key: Tuple[str, bool] = (sql_query, dictionary)
+        cached_statement = self.prepared_cache.lookup(connection_id, key)
+        if cached_statement is None:
+            mysql_cursor = self.mysql_connection.cursor(prepared=True, dictionary=dictionary)
+            for evicted_cursor in self.prepared_cache.store(connection_id, key, sql_query, mysql_cursor):
+                evicted_cursor.close()
+            cached_statement = (sql_query, mysql_cursor)
+
+        prepared_query, mysql_cursor = cached_statement
+        try:
+            mysql_cursor.execute(prepared_query, sql_variables)
+        except Exception:
+            self.prepared_cache.discard(connection_id, key)
+            try:
+                mysql_cursor.close()
+            except Exception as ex:
+                logger.debug(f"Error while closing prepared statement: {ex}")
+            raise
+        self._observe_execute(started, sql_query, profile)
+        return mysql_cursor
+
+    def _execute_read(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            dictionary: bool = False,
+            profile: Optional[QueryProfile] = None,
+            raw: bool = False,
+    ) -> Tuple[MySQLCursor, List]:
+        """Execute a query and fetch its rows. In persistent mode a read query that failed
+        because the connection was lost is replayed once on a new connection, outside of
+        transactions only
+        """
+        try:
+            mysql_cursor: MySQLCursor = self._execute_query(sql_query, sql_variables, dictionary=dictionary,
+                                                            profile=profile, raw=raw)
+            return mysql_cursor, self._fetch_all(mysql_cursor, profile)
+        except Exception as ex:
+            if not (self.persistent and not self.in_transaction
+                    and is_connection_lost(ex) and is_read_query(sql_query)):
+                raise
+            logger.warning(f"Connection lost, replaying the query on a new connection: {ex}")
+            self.metrics.record_error(ex)
+        self._forget_prepared_statements()
+        self.mysql_connection = None
+        self.open_connection()
+        mysql_cursor = self._execute_query(sql_query, sql_variables, dictionary=dictionary, profile=profile,
+                                           raw=raw)
+        return mysql_cursor, self._fetch_all(mysql_cursor, profile)
+
+    def _close_at_exit(self):
+        self.close_connection(force=True)
+
+    def _observe_execute(self, started: float, sql_query: str, profile: Optional[QueryProfile]):
+        elapsed: float = perf_counter() - started
+        self.metrics.observe_execute(elapsed, sql_query)
+        if profile is not None:
+            profile.add_phase("execute", elapsed)
+
+    def _observe_fetch(self, started: float, rows: List, profile: Optional[QueryProfile]):
+        elapsed: float = perf_counter() - started
+        self.metrics.observe_fetch(elapsed, rows)
+        if profile is not None:
+            profile.add_phase("fetch", elapsed)
+            profile.add_rows(len(rows))
+
+    def _record_error(self, ex: Exception, profile: Optional[QueryProfile]):
+        self.metrics.record_error(ex)
+        self._check_connection = True
+        if profile is not None:
+            profile.error = ex.__class__.__name__
+
+    def _start_profile(self, sql_query: str, sql_variables: Any, method: str) -> Union[None, QueryProfile]:
+        if self.slow_query_log is None:
+            return None
+        return self.slow_query_log.start(sql_query=sql_query, sql_variables=sql_variables, method=method)
+
+    def _finish_profile(self, profile: Optional[QueryProfile]):
+        """Aggregate the profile and log the query if it is slow, with its plan if required"""
+        if profile is None or not self.slow_query_log.finish(profile):
+            return
+        explain = None
+        if self.slow_query_log.capture_explain and is_explainable(profile.sql_query):
+            explain = self.explain(profile.sql_query, profile.sql_variables)
+        self.slow_query_log.report(profile,
+                                   connector=f"{self.db_host}:{self.db_port}/{self.db_name}",
+                                   explain=explain)
+
+    def explain(self, sql_query: str, sql_variables: Optional[Tuple] = None) -> Any:
+        """Return the EXPLAIN FORMAT=JSON plan of a query, or the error message
+        It runs on a separate connection so that the current one, which may be streaming
+        a result or in a transaction, is left untouched
+        """
+        try:
+            side_connection = self.connection_class(**self.connection_config())
+            try:
+                mysql_cursor: MySQLCursor = side_connection.cursor()
+                mysql_cursor.execute(f"EXPLAIN FORMAT=JSON {sql_query}", sql_variables)
+                return parse_explain(mysql_cursor.fetchall())
+            finally:
+                side_connection.close()
+        except Exception as ex:
+            logger.debug(f"Error while explaining query: {ex}")
+            return f"{ex.__class__.__name__}: {ex}"
+
+    def _fetch_all(self, mysql_cursor: MySQLCursor, profile: Optional[QueryProfile] = None) -> List:
+        started: float = perf_counter()
+        rows = mysql_cursor.fetchall()
+        self._observe_fetch(started, rows, profile)
+        return rows
+
+    def _close_cursor(self, mysql_cursor: MySQLCursor):
+        """Close a cursor returned by _execute_query, prepared ones stay cached"""
+        if self.prepared_cache is None:
+            mysql_cursor.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the activity metrics and of the connection state"""
+        stats: Dict[str, Any] = self.metrics.snapshot()
+        # no ping here, stats() may be called from another thread while a query runs
+        connected: bool = self.mysql_connection is not None
+        stats["connections_in_use"] = int(connected and self.in_transaction)
+        stats["connections_idle"] = int(connected and not self.in_transaction)
+        stats["engine"] = self.engine
+        return stats
+
+    def prometheus_metrics(self) -> str:
+        """Return stats() in the Prometheus text exposition format"""
+        return prometheus_text(self.stats(),
+                               labels={"connector": self.__class__.__name__,
+                                       "engine": self.engine,
+                                       "host": self.db_host,
+                                       "database": self.db_name})
+
+    def prepared_statements_stats(self) -> Dict:
+        """Return the prepared statement cache hit/miss counters, empty if not in use"""
+        return {} if self.prepared_cache is None else self.prepared_cache.stats()
+
+    def _result_cache_key(
+            self,
+            kind: str,
+            sql_query: str,
+            sql_variables: Optional[Tuple],
+            cache_ttl: Optional[float],
+    ) -> Union[None, Tuple]:
+        """Return the result cache key of a read query, None when not cached"""
+        # uncommitted reads of a transaction must not be shared
+        if self.result_cache is None or cache_ttl == 0 or self.in_transaction:
+            return None
+        return self.result_cache.make_key(namespace=f"{self.db_host}:{self.db_port}/{self.db_name}",
+                                          kind=kind,
+                                          sql_query=sql_query,
+                                          sql_variables=sql_variables)
+
+    def _invalidate_tables(self, tables: FrozenSet[str]):
+        """Invalidate the cached results of the written tables, once committed inside a
+        transaction: a connector sharing the cache could re-cache the rows before the commit
+        """
+        if self.result_cache is None:
+            return
+        if self.in_transaction:
+            self._transaction_tables.append(tables)
+        else:
+            self.result_cache.invalidate_tables(tables)
+
+    def _invalidate_result_cache(self, sql_query: str):
+        if self.result_cache is not None:
+            self._invalidate_tables(referenced_tables(sql_query))
+
+    def result_cache_stats(self) -> Dict:
+        """Return the result cache hit/miss counters, empty if not in use"""
+        return {} if self.result_cache is None else self.result_cache.stats()
 
     def fetch_all_as_df(
             self,
             sql_query: str,
             sql_variables: Optional[Tuple] = None,
             close_connection: Optional[bool] = True,
+            cache_ttl: Optional[float] = None,
     ) -> Union[pd.DataFrame, None]:
         """
         :param sql_query: the MySQL query
         :param sql_variables: parameters ordered with %s usage in the sql_query
         :param close_connection: close connection after the method ends
+        :param cache_ttl: seconds the result stays in the result cache, default TTL of the
+                          cache if None, 0 to bypass it
         :return: return a pandas DataFrame if there are results or None if error
         """
-        self.open_connection()
+        cache_key = self._result_cache_key("df", sql_query, sql_variables, cache_ttl)
+        if cache_key is not None:
+            result_df = self.result_cache.get(cache_key)
+            if result_df is not None:
+                if close_connection:
+                    self.close_connection()
+                return result_df
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_df")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
 
         mysql_cursor: Union[MySQLCursor, None] = None
         result_df: Union[pd.DataFrame, None] = None
+        raw: bool = self.raw_fetch
         try:
-            mysql_cursor = self.mysql_connection.cursor(dictionary=True)
-            mysql_cursor.execute(sql_query, sql_variables)
-            result_df = pd.DataFrame(mysql_cursor.fetchall())
-            mysql_cursor.close()
+            mysql_cursor, rows = self._execute_read(sql_query, sql_variables, profile=profile, raw=raw)
+            with PhaseTimer(profile, "to_df"):
+                result_df = rows_to_df(rows, mysql_cursor.description, raw=raw)
+            self._close_cursor(mysql_cursor)
         except Exception as ex:
+            self._record_error(ex, profile)
             if mysql_cursor:
                 logger.error(
                     f"Error while inserting new score: {ex}. SQL Statement used: {mysql_cursor.statement}"
@@ -91,10 +514,15 @@ class MySQLConnectorNative:
                     f"SQL statement used: {sql_query} - "
                     f"SQL variables used: {sql_variables} - "
                 )
+            if self.in_transaction:
+                raise
         finally:
             if close_connection:
                 self.close_connection()
+            self._finish_profile(profile)
 
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result_df, sql_query, ttl=cache_ttl)
         return result_df
 
     def fetch_all_as_dicts(
@@ -102,22 +530,35 @@ class MySQLConnectorNative:
             sql_query: str,
             sql_variables: Optional[Tuple] = None,
             close_connection: Optional[bool] = True,
+            cache_ttl: Optional[float] = None,
     ) -> Union[List[Dict], None]:
         """
         :param sql_query: the MySQL query
         :param sql_variables: parameters ordered with %s usage in the sql_query
         :param close_connection: close connection after the method ends
+        :param cache_ttl: seconds the result stays in the result cache, default TTL of the
+                          cache if None, 0 to bypass it
         :return: return a pandas DataFrame if there are results or None if error
         """
-        self.open_connection()
+        cache_key = self._result_cache_key("dicts", sql_query, sql_variables, cache_ttl)
+        if cache_key is not None:
+            results = self.result_cache.get(cache_key)
+            if results is not None:
+                if close_connection:
+                    self.close_connection()
+                return results
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_dicts")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
         mysql_cursor: Union[MySQLCursor, None] = None
         results = None
         try:
-            mysql_cursor: MySQLCursor = self.mysql_connection.cursor(dictionary=True)
-            mysql_cursor.execute(sql_query, sql_variables)
-            results = mysql_cursor.fetchall()
-            mysql_cursor.close()
+            mysql_cursor, results = self._execute_read(sql_query, sql_variables, dictionary=True,
+                                                       profile=profile)
+            self._close_cursor(mysql_cursor)
         except Exception as ex:
+            self._record_error(ex, profile)
             if mysql_cursor:
                 logger.error(
                     f"Error while inserting new score: {ex}. SQL Statement used: {mysql_cursor.statement}"
@@ -128,11 +569,378 @@ class MySQLConnectorNative:
                     f"SQL statement used: {sql_query} - "
                     f"SQL variables used: {sql_variables} - "
                 )
+            if self.in_transaction:
+                raise
         finally:
             if close_connection:
                 self.close_connection()
+            self._finish_profile(profile)
+
+        if cache_key is not None:
+            self.result_cache.put(cache_key, results, sql_query, ttl=cache_ttl)
         return results
 
+    def fetch_all_as_records(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: Optional[bool] = True,
+            columnar: bool = False,
+    ) -> Union[List[Any], ColumnarResult, None]:
+        """Fetch the results as records: tuples readable by attribute (row.proxy_url) and by
+        key (row["proxy_url"]), several times smaller than the dicts of fetch_all_as_dicts.
+        With columnar=True the values are kept column by column, in typed arrays for the
+        numeric columns, and the records are only built when rows are accessed.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :param columnar: return a ColumnarResult instead of a list of records
+        :return: return a list of records or a ColumnarResult if there are results or None if error
+        """
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_records")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
+
+        result_records: Union[List[Any], ColumnarResult, None] = None
+        try:
+            mysql_cursor, rows = self._execute_read(sql_query, sql_variables, profile=profile)
+            with PhaseTimer(profile, "to_records"):
+                if columnar:
+                    result_records = ColumnarResult.from_rows(rows, mysql_cursor.description)
+                else:
+                    result_records = rows_to_records(rows, mysql_cursor.description)
+            self._close_cursor(mysql_cursor)
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while fetching data: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"SQL variables used: {sql_variables} - "
+            )
+            if self.in_transaction:
+                raise
+        finally:
+            if close_connection:
+                self.close_connection()
+            self._finish_profile(profile)
+        return result_records
+
+    def fetch_all_as_arrow(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: Optional[bool] = True,
+    ) -> Union[pa.Table, None]:
+        """Fetch the results as an Apache Arrow table, typed from the MySQL field types
+        table.to_pandas(types_mapper=pd.ArrowDtype) converts it to pandas without copy
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :return: return a pyarrow Table if there are results or None if error
+        """
+        profile = self._start_profile(sql_query, sql_variables, "fetch_all_as_arrow")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
+
+        result_table: Union[pa.Table, None] = None
+        try:
+            mysql_cursor, rows = self._execute_read(sql_query, sql_variables, profile=profile)
+            with PhaseTimer(profile, "to_arrow"):
+                result_table = rows_to_arrow(rows, mysql_cursor.description)
+            self._close_cursor(mysql_cursor)
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while fetching data: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"SQL variables used: {sql_variables} - "
+            )
+            if self.in_transaction:
+                raise
+        finally:
+            if close_connection:
+                self.close_connection()
+            self._finish_profile(profile)
+        return result_table
+
+    def fetch_all_as_polars(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            close_connection: Optional[bool] = True,
+    ) -> Union[pl.DataFrame, None]:
+        """Fetch the results as a polars DataFrame, built from fetch_all_as_arrow without copy
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param close_connection: close connection after the method ends
+        :return: return a polars DataFrame if there are results or None if error
+        """
+        result_table = self.fetch_all_as_arrow(sql_query=sql_query,
+                                               sql_variables=sql_variables,
+                                               close_connection=close_connection)
+        return None if result_table is None else arrow_to_polars(result_table)
+
+    def fetch_chunks(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 10_000,
+            as_df: bool = False,
+            close_connection: Optional[bool] = True,
+    ) -> Iterator[Union[List[Dict], pd.DataFrame]]:
+        """Stream the results with an unbuffered cursor, chunk_size rows at a time, so memory
+        use does not depend on the size of the result. Errors are logged and raised.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows per chunk
+        :param as_df: yield pandas DataFrames instead of lists of dicts
+        :param close_connection: close connection after the last chunk
+        :return: a generator of lists of dicts or of pandas DataFrames
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive integer, got: {chunk_size}")
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_chunks")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
+        mysql_cursor: Union[MySQLCursor, None] = None
+        raw: bool = as_df and self.engine == ENGINE_C
+        try:
+            mysql_cursor = (self.mysql_connection.cursor(buffered=False, raw=True) if raw
+                            else self.mysql_connection.cursor(buffered=False, dictionary=not as_df))
+            started: float = perf_counter()
+            mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            while True:
+                started = perf_counter()
+                rows = mysql_cursor.fetchmany(chunk_size)
+                self._observe_fetch(started, rows, profile)
+                if not rows:
+                    break
+                if as_df:
+                    with PhaseTimer(profile, "to_df"):
+                        chunk_df = rows_to_df(rows, mysql_cursor.description, raw=raw)
+                    yield chunk_df
+                else:
+                    yield rows
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while streaming data: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"SQL variables used: {sql_variables} - "
+            )
+            raise
+        finally:
+            if mysql_cursor is not None:
+                # the generator may be closed before the end of the result
+                if close_connection and not self.persistent and not self.in_transaction:
+                    self._drop_connection()
+                else:
+                    self.mysql_connection.consume_results()
+                    mysql_cursor.close()
+            if close_connection:
+                self.close_connection()
+            self._finish_profile(profile)
+
+    def fetch_iter(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 1_000,
+            close_connection: Optional[bool] = True,
+    ) -> Iterator[Dict]:
+        """Stream the results row by row, see fetch_chunks
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows fetched from the server at a time
+        :param close_connection: close connection after the last row
+        :return: a generator of dicts
+        """
+        for rows in self.fetch_chunks(sql_query=sql_query,
+                                      sql_variables=sql_variables,
+                                      chunk_size=chunk_size,
+                                      close_connection=close_connection):
+            yield from rows
+
+    def iter_table(
+            self,
+            table: str,
+            key_column: Union[str, Sequence[str]],
+            page_size: int = 10_000,
+            where: Optional[str] = None,
+            where_variables: Optional[Tuple] = None,
+            columns: Optional[Sequence[str]] = None,
+            as_df: bool = False,
+            start_after: Optional[Sequence[Any]] = None,
+            close_connection: Optional[bool] = True,
+    ) -> Iterator[Union[List[Dict], pd.DataFrame]]:
+        """Scan a table page by page with keyset pagination: each page is read after the key
+        of the previous one (WHERE key > last key ORDER BY key LIMIT page_size), so each
+        query seeks in the index instead of skipping rows like OFFSET does. Errors are
+        logged and raised.
+        :param table: the table name, can be prefixed by the schema name
+        :param key_column: the column of a unique index, or the columns of a composite one
+        :param page_size: number of rows per page
+        :param where: an extra filter, with %s placeholders for where_variables
+        :param where_variables: parameters of the where filter
+        :param columns: the columns to read, all of them if None, the key columns are added
+        :param as_df: yield pandas DataFrames instead of lists of dicts
+        :param start_after: resume the scan after this key, e.g. the page_last_key of the
+                            last page processed by an interrupted job
+        :param close_connection: close connection after the last page
+        :return: a generator of lists of dicts or of pandas DataFrames
+        """
+        key_columns: List[str] = key_columns_list(key_column)
+        if start_after is not None and len(start_after) != len(key_columns):
+            raise ValueError(f"start_after must hold one value per key column {key_columns}, got: {start_after}")
+        first_query: str = build_keyset_query(table, key_columns, page_size, columns, where, seek=False)
+        next_query: str = build_keyset_query(table, key_columns, page_size, columns, where, seek=True)
+        last_key: Union[None, Tuple] = None if start_after is None else tuple(start_after)
+
+        self.open_connection()
+        try:
+            while True:
+                if last_key is None:
+                    sql_query, sql_variables = first_query, where_variables
+                else:
+                    sql_query, sql_variables = next_query, tuple(where_variables or ()) + seek_variables(last_key)
+                profile = self._start_profile(sql_query, sql_variables, "iter_table")
+                try:
+                    mysql_cursor, rows = self._execute_read(sql_query, sql_variables, dictionary=not as_df,
+                                                            profile=profile)
+                    if rows:
+                        last_key = rows_last_key(rows, key_columns, mysql_cursor.description)
+                    if as_df:
+                        with PhaseTimer(profile, "to_df"):
+                            page = rows_to_df(rows, mysql_cursor.description)
+                    else:
+                        page = rows
+                    self._close_cursor(mysql_cursor)
+                except Exception as ex:
+                    self._record_error(ex, profile)
+                    logger.error(
+                        f"Error while paging through {table}: {ex} - "
+                        f"SQL statement used: {sql_query} - "
+                        f"SQL variables used: {sql_variables} - "
+                    )
+                    raise
+                finally:
+                    self._finish_profile(profile)
+                if not rows:
+                    return
+                yield page
+                if len(rows) < page_size:
+                    return
+        finally:
+            if close_connection:
+                self.close_connection()
+
+    def export_query(
+            self,
+            sql_query: str,
+            path: Union[str, PathLike],
+            file_format: str = "parquet",
+            sql_variables: Optional[Tuple] = None,
+            row_group_size: int = 100_000,
+            compression: Optional[str] = None,
+            max_file_size: Optional[int] = None,
+            close_connection: Optional[bool] = True,
+    ) -> List[str]:
+        """Stream the results of a query to a Parquet or CSV file, one row group at a time:
+        rows are read with an unbuffered cursor and written as Arrow record batches of
+        row_group_size rows, so memory use depends on row_group_size, not on the result
+        size. No file is written for an empty result. Errors are logged and raised, the
+        files of a failed export are deleted.
+        :param sql_query: the MySQL query
+        :param path: the file to write, the base name of the parts with max_file_size
+        :param file_format: "parquet" or "csv"
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param row_group_size: number of rows read and written at a time
+        :param compression: Parquet column codec ("snappy" by default, "zstd", "gzip",
+                            "none"...), or whole file codec for CSV ("gzip", "zstd"...)
+        :param max_file_size: split the output in files of about this many bytes, named
+                              path stem + "-00000", "-00001"... + suffix
+        :param close_connection: close connection after the export
+        :return: the paths of the files written
+        """
+        writer = ExportFileWriter(path, file_format, compression=compression, max_file_size=max_file_size)
+        try:
+            for batch in self.fetch_arrow_batches(sql_query=sql_query,
+                                                  sql_variables=sql_variables,
+                                                  chunk_size=row_group_size,
+                                                  close_connection=close_connection):
+                writer.write(batch)
+            paths: List[str] = writer.close()
+        except Exception as ex:
+            logger.error(
+                f"Error while exporting to {path}: {ex}. Exception is {ex.__class__.__name__}"
+            )
+            writer.abort()
+            raise
+        logger.debug(f"Exported {writer.rows_written} rows to {len(paths)} file(s): {path}")
+        return paths
+
+    def fetch_arrow_batches(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            chunk_size: int = 10_000,
+            close_connection: Optional[bool] = True,
+    ) -> Iterator[pa.RecordBatch]:
+        """Stream the results as Arrow record batches of chunk_size rows, see fetch_chunks.
+        A column typed from its values (DECIMAL, NULL in all the previous rows) can get a
+        wider type in a later batch, see rows_to_record_batch and arrow_helpers.cast_batch.
+        polars.from_arrow(batch) wraps a batch without copy.
+        :param sql_query: the MySQL query
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param chunk_size: number of rows per batch
+        :param close_connection: close connection after the last batch
+        :return: a generator of pyarrow RecordBatches
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive integer, got: {chunk_size}")
+
+        profile = self._start_profile(sql_query, sql_variables, "fetch_arrow_batches")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
+        mysql_cursor: Union[MySQLCursor, None] = None
+        try:
+            mysql_cursor = self.mysql_connection.cursor(buffered=False)
+            started: float = perf_counter()
+            mysql_cursor.execute(sql_query, sql_variables)
+            self._observe_execute(started, sql_query, profile)
+            schema: Union[pa.Schema, None] = None
+            while True:
+                started = perf_counter()
+                rows = mysql_cursor.fetchmany(chunk_size)
+                self._observe_fetch(started, rows, profile)
+                if not rows:
+                    break
+                with PhaseTimer(profile, "to_arrow"):
+                    record_batch = rows_to_record_batch(rows, mysql_cursor.description, schema)
+                schema = record_batch.schema
+                yield record_batch
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while streaming data: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"SQL variables used: {sql_variables} - "
+            )
+            raise
+        finally:
+            if mysql_cursor is not None:
+                # the generator may be closed before the end of the result
+                if close_connection and not self.persistent and not self.in_transaction:
+                    self._drop_connection()
+                else:
+                    self.mysql_connection.consume_results()
+                    mysql_cursor.close()
+            if close_connection:
+                self.close_connection()
+            self._finish_profile(profile)
+
     def execute_one_query(
             self,
             sql_query: str,
@@ -146,16 +954,22 @@ class MySQLConnectorNative:
         :return: returns the number of rows affected, -1 if connection error ONLY
         """
 
-        self.open_connection()
+        profile = self._start_profile(sql_query, sql_variables, "execute_one_query")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
         mysql_cursor: Union[MySQLCursor, None] = None
         rows_affected: int = 0
         try:
-            mysql_cursor: MySQLCursor = self.mysql_connection.cursor()
-            mysql_cursor.execute(sql_query, sql_variables)
+            mysql_cursor = self._execute_query(sql_query, sql_variables, profile=profile)
             rows_affected = mysql_cursor.rowcount
-            self.mysql_connection.commit()
-            mysql_cursor.close()
+            if profile is not None:
+                profile.add_rows(rows_affected)
+            if not self.in_transaction:
+                self.mysql_connection.commit()
+                self.metrics.record_commit()
+            self._close_cursor(mysql_cursor)
         except Exception as ex:
+            self._record_error(ex, profile)
             if mysql_cursor:
                 logger.error(
                     f"Error while inserting new score: {ex}. SQL Statement used: {mysql_cursor.statement}"
@@ -166,10 +980,211 @@ class MySQLConnectorNative:
                     f"SQL statement used: {sql_query} - "
                     f"SQL variables used: {sql_variables} - "
                 )
+            if self.in_transaction:
+                raise
+        finally:
+            if close_connection:
+                self.close_connection()
+            self._finish_profile(profile)
+
+        self._invalidate_result_cache(sql_query)
+        return rows_affected
+
+    def write_df(
+            self,
+            df: pd.DataFrame,
+            table: str,
+            mode: str = "append",
+            close_connection: Optional[bool] = True,
+    ) -> Tuple[int, int]:
+        """Bulk load a DataFrame with LOAD DATA LOCAL INFILE through a temporary csv file,
+        the write-side counterpart of fetch_all_as_df. Needs allow_local_infile=True and
+        local_infile enabled on the server.
+        :param df: the DataFrame to load, its column names must match the table ones
+        :param table: the table name, can be prefixed by the schema name
+        :param mode: append fails on duplicate keys, replace overwrites them, ignore skips them
+        :param close_connection: close connection after the method ends
+        :return: returns the number of rows loaded and the number of warnings
+        """
+        profile = self._start_profile(f"LOAD DATA LOCAL INFILE INTO TABLE {table}", None, "write_df")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
+        mysql_cursor: Union[MySQLCursor, None] = None
+        rows_loaded: int = 0
+        warning_count: int = 0
+        try:
+            with temporary_csv_path() as file_path:
+                with PhaseTimer(profile, "to_csv"):
+                    df_to_csv(df, file_path)
+                sql_query: str = build_load_data_query(table=table,
+                                                       columns=list(df.columns),
+                                                       file_path=file_path,
+                                                       mode=mode)
+                mysql_cursor = self.mysql_connection.cursor()
+                started: float = perf_counter()
+                mysql_cursor.execute(sql_query)
+                self._observe_execute(started, sql_query, profile)
+                rows_loaded = mysql_cursor.rowcount
+                warning_count = mysql_cursor.warning_count
+                if not self.in_transaction:
+                    self.mysql_connection.commit()
+                    self.metrics.record_commit()
+                mysql_cursor.close()
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while loading DataFrame into {table}: {ex} - "
+                f"Rows: {len(df)} - Mode: {mode}"
+            )
+            if self.in_transaction:
+                raise
+        finally:
+            if close_connection:
+                self.close_connection()
+            self._finish_profile(profile)
+
+        self._invalidate_tables(frozenset([table]))
+        return rows_loaded, warning_count
+
+    def upsert_df(
+            self,
+            df: pd.DataFrame,
+            table: str,
+            key_columns: Sequence[str],
+            update_columns: Optional[Sequence[str]] = None,
+            batch_size: int = 1000,
+            close_connection: Optional[bool] = True,
+    ) -> Dict[str, int]:
+        """Upsert a DataFrame with multi-row INSERT ... ON DUPLICATE KEY UPDATE statements,
+        rendered column by column and split to fit in max_allowed_packet, one commit per batch
+        :param df: the DataFrame to upsert, its column names must match the table ones
+        :param table: the table name, can be prefixed by the schema name
+        :param key_columns: the columns of the unique key the duplicates are detected on
+        :param update_columns: the columns overwritten on duplicates, all but the keys if None,
+                               none if empty: existing rows are then left unchanged
+        :param batch_size: max number of rows per statement
+        :param close_connection: close connection after the method ends
+        :return: the numbers of inserted, updated and unchanged rows of the committed batches
+        """
+        prefix, suffix = build_upsert_query(table, list(df.columns), key_columns, update_columns)
+        counts: Dict[str, int] = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if df.empty:
+            return counts
+
+        profile = self._start_profile(f"{prefix}(...){suffix}", None, "upsert_df")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
+        try:
+            with PhaseTimer(profile, "to_sql"):
+                values = df_to_sql_values(df)
+            self.mysql_connection.cmd_query(RESET_DUPLICATES_QUERY)
+            duplicates: int = 0
+            for start, end in split_values(values=values,
+                                           max_allowed_packet=self.get_max_allowed_packet(),
+                                           statement_size=len(prefix) + len(suffix),
+                                           batch_size=batch_size):
+                sql_query: str = prefix + ",".join(values[start:end]) + suffix
+                started: float = perf_counter()
+                result = self.mysql_connection.cmd_query(sql_query)
+                self._observe_execute(started, sql_query, profile)
+                if not self.in_transaction:
+                    self.mysql_connection.commit()
+                    self.metrics.record_commit()
+                mysql_cursor: MySQLCursor = self.mysql_connection.cursor()
+                mysql_cursor.execute(READ_DUPLICATES_QUERY)
+                total_duplicates: int = int(mysql_cursor.fetchone()[0])
+                mysql_cursor.close()
+                batch_counts = upsert_counts(end - start, result["affected_rows"], total_duplicates - duplicates)
+                duplicates = total_duplicates
+                for name, count in batch_counts.items():
+                    counts[name] += count
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while upserting DataFrame into {table}: {ex} - "
+                f"Rows: {len(df)} - Rows committed before error: {sum(counts.values())}"
+            )
+            if self.in_transaction:
+                raise
+            if self.mysql_connection is not None and self.mysql_connection.is_connected():
+                self.mysql_connection.rollback()
+                self.metrics.record_rollback()
+        finally:
+            if close_connection:
+                self.close_connection()
+            if profile is not None:
+                profile.add_rows(sum(counts.values()))
+            self._finish_profile(profile)
+
+        self._invalidate_tables(frozenset([table]))
+        return counts
+
+    def get_max_allowed_packet(self) -> int:
+        """Return the server max_allowed_packet in bytes, queried once per instance"""
+        if self.max_allowed_packet is None:
+            self.open_connection()
+            mysql_cursor: MySQLCursor = self.mysql_connection.cursor()
+            mysql_cursor.execute("SELECT @@max_allowed_packet")
+            self.max_allowed_packet = int(mysql_cursor.fetchone()[0])
+            mysql_cursor.close()
+        return self.max_allowed_packet
+
+    def execute_many(
+            self,
+            sql_query: str,
+            rows: Iterable[Sequence[Any]],
+            batch_size: int = 1000,
+            close_connection: Optional[bool] = True,
+    ) -> int:
+        """method that handles bulk writes: INSERT statements are rewritten by the connector
+        into multi-row VALUES batches sized to fit in max_allowed_packet, one commit per batch
+        :param sql_query: the MySQL query, with %s placeholders for one row
+        :param rows: iterable of sql_variables, one per row
+        :param batch_size: max number of rows sent per batch
+        :param close_connection: close connection after the method ends
+        :return: returns the total number of rows affected by the committed batches
+        """
+        profile = self._start_profile(sql_query, None, "execute_many")
+        with PhaseTimer(profile, "checkout"):
+            self.open_connection()
+        mysql_cursor: Union[MySQLCursor, None] = None
+        rows_affected: int = 0
+        try:
+            max_allowed_packet: int = self.get_max_allowed_packet()
+            mysql_cursor = self.mysql_connection.cursor()
+            for batch in iter_batches(rows=rows,
+                                      batch_size=batch_size,
+                                      max_allowed_packet=max_allowed_packet,
+                                      sql_query=sql_query):
+                started: float = perf_counter()
+                mysql_cursor.executemany(sql_query, batch)
+                self._observe_execute(started, sql_query, profile)
+                self.metrics.observe_rows_sent(batch)
+                if not self.in_transaction:
+                    self.mysql_connection.commit()
+                    self.metrics.record_commit()
+                rows_affected += mysql_cursor.rowcount
+            mysql_cursor.close()
+        except Exception as ex:
+            self._record_error(ex, profile)
+            logger.error(
+                f"Error while executing many: {ex} - "
+                f"SQL statement used: {sql_query} - "
+                f"Rows committed before error: {rows_affected}"
+            )
+            if self.in_transaction:
+                raise
+            if self.mysql_connection is not None and self.mysql_connection.is_connected():
+                self.mysql_connection.rollback()
+                self.metrics.record_rollback()
         finally:
             if close_connection:
                 self.close_connection()
+            if profile is not None:
+                profile.add_rows(rows_affected)
+            self._finish_profile(profile)
 
+        self._invalidate_result_cache(sql_query)
         return rows_affected
 
 
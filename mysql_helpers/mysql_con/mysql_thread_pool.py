@@ -0,0 +1,285 @@
+""" Thread-safe connection pool for the mysql-python native connector"""
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from time import monotonic
+from typing import (Union, Optional, Dict, List, Tuple, Deque, Any, Callable)
+
+from mysql.connector import connect as _connect
+from mysql.connector.abstracts import MySQLConnectionAbstract
+from mysql.connector.errors import PoolError
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+
+class _Waiter:
+    """A thread blocked in acquire(), served in arrival order"""
+
+    __slots__ = ("event", "connection", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        # the connection handed over by release(), None when a free slot was granted instead
+        self.connection: Union[None, MySQLConnectionAbstract] = None
+        self.granted: bool = False
+
+
+class MySQLThreadPool:
+    """Elastic pool of MySQL connections shared by threads
+
+    pool_size connections are kept open once created, up to max_overflow more are opened
+    under load and closed after max_idle_time seconds idle. When every connection is in use,
+    acquire() blocks up to acquire_timeout and waiting threads are served first come, first
+    served: released connections are handed over to the oldest waiter. Connections older
+    than max_lifetime are replaced, idle ones are pinged on checkout when they have been
+    idle for more than health_check_interval.
+    """
+
+    def __init__(
+            self,
+            connection_config: Dict[str, Any],
+            pool_size: int = 5,
+            max_overflow: int = 10,
+            min_size: int = 1,
+            acquire_timeout: float = 30.0,
+            max_idle_time: Optional[float] = 300.0,
+            max_lifetime: Optional[float] = 3600.0,
+            health_check_interval: float = 0.0,
+            reset_session: bool = True,
+            on_close: Optional[Callable[[MySQLConnectionAbstract], None]] = None,
+            name: Optional[str] = None,
+    ):
+        """
+        :param connection_config: keyword arguments passed to mysql.connector.connect
+        :param pool_size: number of connections kept open when idle
+        :param max_overflow: number of connections opened above pool_size under load
+        :param min_size: number of connections opened when the pool initializes
+        :param acquire_timeout: seconds to wait for a free connection before raising PoolError
+        :param max_idle_time: seconds after which idle overflow connections are closed,
+                              None to keep them
+        :param max_lifetime: seconds after which connections are closed and replaced,
+                             None for no limit
+        :param health_check_interval: ping on checkout connections idle for longer than this
+        :param reset_session: reset the session state (variables, temporary tables, prepared
+                              statements) when a connection is released
+        :param on_close: called with each connection the pool closes
+        :param name: name of the pool used in logs
+        """
+        if pool_size <= 0 or max_overflow < 0 or not 0 <= min_size <= pool_size:
+            raise ValueError(f"Invalid pool sizes: pool_size={pool_size}, "
+                             f"max_overflow={max_overflow}, min_size={min_size}")
+
+        self.connection_config: Dict[str, Any] = connection_config
+        self.pool_size: int = pool_size
+        self.max_overflow: int = max_overflow
+        self.max_size: int = pool_size + max_overflow
+        self.min_size: int = min_size
+        self.acquire_timeout: float = acquire_timeout
+        self.max_idle_time: Union[None, float] = max_idle_time
+        self.max_lifetime: Union[None, float] = max_lifetime
+        self.health_check_interval: float = health_check_interval
+        self.reset_session: bool = reset_session
+        self.on_close: Union[None, Callable[[MySQLConnectionAbstract], None]] = on_close
+        self.name: str = name or f"pool_{id(self):x}"
+
+        # idle connections with the monotonic time they were released at, reused LIFO
+        self._idle: List[Tuple[MySQLConnectionAbstract, float]] = []
+        # {id(connection): monotonic time it was opened at}
+        self._opened_at: Dict[int, float] = {}
+        self._waiters: Deque[_Waiter] = deque()
+        self._size: int = 0  # open connections, idle and in use, plus the ones being opened
+        self._lock = threading.Lock()
+        self._closed: bool = False
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    @property
+    def in_use_count(self) -> int:
+        return self._size - len(self._idle)
+
+    @property
+    def waiting_count(self) -> int:
+        return len(self._waiters)
+
+    def initialize(self):
+        """Open min_size connections, raises if the server cannot be reached"""
+        for _ in range(self.min_size - self._size):
+            with self._lock:
+                self._size += 1
+            try:
+                connection = self._connect()
+            except Exception:
+                self._free_slot()
+                raise
+            with self._lock:
+                self._idle.append((connection, monotonic()))
+
+    def _connect(self) -> MySQLConnectionAbstract:
+        connection: MySQLConnectionAbstract = _connect(**self.connection_config)
+        with self._lock:
+            self._opened_at[id(connection)] = monotonic()
+        return connection
+
+    def _grant(self, connection: Union[None, MySQLConnectionAbstract]) -> bool:
+        """Hand a connection, or a free slot if None, over to the oldest waiter.
+        The lock must be held
+        """
+        if not self._waiters:
+            return False
+        waiter: _Waiter = self._waiters.popleft()
+        waiter.connection = connection
+        waiter.granted = True
+        waiter.event.set()
+        return True
+
+    def _free_slot(self):
+        """Give the slot of a connection that is closed, or failed to open, to a waiter"""
+        with self._lock:
+            self._size -= 1
+            if not self._closed and self._size < self.max_size and self._grant(None):
+                self._size += 1
+
+    def _discard(self, connection: MySQLConnectionAbstract):
+        """Close a connection and free its slot in the pool"""
+        with self._lock:
+            self._opened_at.pop(id(connection), None)
+        self._free_slot()
+        if self.on_close is not None:
+            self.on_close(connection)
+        try:
+            connection.close()
+        except Exception as ex:
+            logger.debug(f"Error while closing pooled connection: {ex}")
+
+    def _is_expired(self, connection: MySQLConnectionAbstract, now: float) -> bool:
+        if self.max_lifetime is None:
+            return False
+        return now - self._opened_at.get(id(connection), now) >= self.max_lifetime
+
+    def reap(self):
+        """Close the idle connections past max_lifetime and the overflow ones idle for more
+        than max_idle_time, called on each acquire and release
+        """
+        now: float = monotonic()
+        reaped: List[MySQLConnectionAbstract] = []
+        with self._lock:
+            kept: List[Tuple[MySQLConnectionAbstract, float]] = []
+            overflow: int = self._size - self.pool_size
+            # oldest released first
+            for connection, released_at in self._idle:
+                if self._is_expired(connection, now) or (
+                        overflow > 0
+                        and self.max_idle_time is not None
+                        and now - released_at >= self.max_idle_time
+                ):
+                    reaped.append(connection)
+                    overflow -= 1
+                else:
+                    kept.append((connection, released_at))
+            self._idle[:] = kept
+        for connection in reaped:
+            logger.debug(f"{self.name}: closing idle connection")
+            self._discard(connection)
+
+    def acquire(self) -> MySQLConnectionAbstract:
+        """Return a healthy connection, waiting up to acquire_timeout for one to be released
+        :return: an open connection, to be given back with release()
+        """
+        self.reap()
+        deadline: float = monotonic() + self.acquire_timeout
+
+        while True:
+            waiter: Union[None, _Waiter] = None
+            connection: Union[None, MySQLConnectionAbstract] = None
+            released_at: float = monotonic()
+            with self._lock:
+                if self._closed:
+                    raise PoolError(f"{self.name} is closed")
+                # threads already waiting go first
+                if self._waiters:
+                    waiter = _Waiter()
+                    self._waiters.append(waiter)
+                elif self._idle:
+                    connection, released_at = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    waiter = _Waiter()
+                    self._waiters.append(waiter)
+
+            if waiter is not None:
+                if not waiter.event.wait(max(0.0, deadline - monotonic())):
+                    with self._lock:
+                        if not waiter.granted:
+                            self._waiters.remove(waiter)
+                            raise PoolError(
+                                f"{self.name}: no connection available after {self.acquire_timeout}s, "
+                                f"pool exhausted (pool_size={self.pool_size}, "
+                                f"max_overflow={self.max_overflow})"
+                            )
+                if not waiter.granted:
+                    raise PoolError(f"{self.name} is closed")
+                connection = waiter.connection
+
+            if connection is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._free_slot()
+                    raise
+
+            now: float = monotonic()
+            if not self._is_expired(connection, now) and (
+                    now - released_at < self.health_check_interval
+                    or connection.is_connected()
+            ):
+                return connection
+            logger.info(f"{self.name}: replacing stale or expired pooled connection")
+            self._discard(connection)
+
+    def discard(self, connection: MySQLConnectionAbstract):
+        """Close a checked out connection instead of giving it back, e.g. one left in the
+        middle of an unbuffered result, and free its slot
+        """
+        self._discard(connection)
+
+    def release(self, connection: MySQLConnectionAbstract):
+        """Give a connection back to the pool, to the oldest waiting thread if any"""
+        try:
+            if self.reset_session:
+                connection.reset_session()
+            elif connection.in_transaction:
+                connection.rollback()
+        except Exception as ex:
+            logger.error(f"{self.name}: error while resetting released connection: {ex}")
+            self._discard(connection)
+            return
+
+        with self._lock:
+            if not self._closed and not self._is_expired(connection, monotonic()):
+                if not self._grant(connection):
+                    self._idle.append((connection, monotonic()))
+                connection = None
+        if connection is not None:
+            self._discard(connection)
+        self.reap()
+
+    def close(self):
+        """Close idle connections and refuse new checkouts, in use ones close on release"""
+        with self._lock:
+            self._closed = True
+            idle_connections = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            waiters = list(self._waiters)
+            self._waiters.clear()
+        for waiter in waiters:
+            waiter.event.set()
+        for connection in idle_connections:
+            self._discard(connection)
@@ -0,0 +1,81 @@
+""" Helpers to read a table in parallel slices of an integer column"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from typing import (Optional, List, Tuple, Sequence)
+
+from mysql_helpers.mysql_con.df_helpers import rows_to_df
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+from mysql_helpers.mysql_con.load_data_helpers import quote_identifier
+
+pd = LazyModule("pandas")
+
+
+def partition_bounds(min_value: int, max_value: int, num_partitions: int) -> List[Tuple[int, int]]:
+    """Split [min_value, max_value] into at most num_partitions equal half-open ranges
+    :return: (lower bound included, upper bound excluded) pairs, in order
+    """
+    if num_partitions <= 0:
+        raise ValueError(f"num_partitions must be a positive integer, got: {num_partitions}")
+    if isinstance(min_value, bool) or not isinstance(min_value, int) or not isinstance(max_value, int):
+        raise ValueError(f"The partition column must hold integers, got: {min_value!r}, {max_value!r}")
+
+    span: int = max_value - min_value + 1
+    step: int = -(-span // min(num_partitions, span))  # ceil division
+    return [(lower, min(lower + step, max_value + 1)) for lower in range(min_value, max_value + 1, step)]
+
+
+def build_bounds_query(table: str, partition_column: str, where: Optional[str] = None) -> str:
+    """Return the query of the min and max values of the partition column"""
+    column: str = quote_identifier(partition_column)
+    sql_query: str = f"SELECT MIN({column}) AS min_value, MAX({column}) AS max_value FROM {quote_identifier(table)}"
+    if where:
+        sql_query += f" WHERE {where}"
+    return sql_query
+
+
+def build_partition_queries(
+        table: str,
+        partition_column: str,
+        bounds: Sequence[Tuple[int, int]],
+        columns: Optional[Sequence[str]] = None,
+        where: Optional[str] = None,
+        sql_variables: Optional[Tuple] = None,
+) -> List[Tuple[str, Tuple]]:
+    """Return one (sql_query, sql_variables) pair per slice of the partition column
+    :param table: the table name, can be prefixed by the schema name
+    :param partition_column: the integer column the table is sliced on, preferably indexed
+    :param bounds: the ranges returned by partition_bounds
+    :param columns: the columns to read, all of them if None
+    :param where: an extra filter, with %s placeholders for sql_variables
+    :param sql_variables: parameters of the where filter
+    """
+    column_list: str = "*" if not columns else ", ".join(quote_identifier(column) for column in columns)
+    column: str = quote_identifier(partition_column)
+    sql_query: str = f"SELECT {column_list} FROM {quote_identifier(table)} WHERE {column} >= %s AND {column} < %s"
+    if where:
+        sql_query += f" AND ({where})"
+    extra_variables: Tuple = tuple(sql_variables or ())
+    return [(sql_query, (lower, upper) + extra_variables) for lower, upper in bounds]
+
+
+def partitions_to_df(
+        partitions: Sequence[Sequence[Tuple]],
+        description: Optional[Sequence[Tuple]],
+        convert_processes: Optional[int] = None,
+) -> pd.DataFrame:
+    """Build one DataFrame from the rows of all the slices
+    By default the rows are chained and converted once, so that each column is built in a
+    single array and no concatenation copy is made. With convert_processes the slices are
+    converted in a process pool and concatenated: the rows are pickled to the processes,
+    which only pays off for wide text-heavy slices.
+    """
+    if not convert_processes:
+        return rows_to_df(list(chain.from_iterable(partitions)), description)
+
+    with ProcessPoolExecutor(max_workers=convert_processes) as executor:
+        frames: List[pd.DataFrame] = list(executor.map(rows_to_df, partitions, repeat(description)))
+    if not frames:
+        return rows_to_df([], description)
+    return pd.concat(frames, ignore_index=True)
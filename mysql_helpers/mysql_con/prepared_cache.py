@@ -0,0 +1,90 @@
+""" LRU cache of server side prepared statements, kept per connection"""
+import threading
+from collections import OrderedDict
+from typing import (Union, Dict, List, Tuple, Any, Hashable)
+
+
+class PreparedStatementCache:
+    """Keeps the prepared cursors (binary protocol) of each connection in an LRU keyed by
+    SQL text, so a statement is parsed once by the server and then only executed
+
+    The cache only stores cursors: callers create them, and close (deallocate on the server)
+    the cursors returned by store() when they are evicted.
+    Connections are identified by their connection_id, which changes on reconnection.
+    """
+
+    def __init__(self, max_size: int = 128):
+        """
+        :param max_size: max number of prepared statements kept per connection
+        """
+        if max_size <= 0:
+            raise ValueError(f"max_size must be a positive integer, got: {max_size}")
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        # {connection_id: OrderedDict({(sql_query, dictionary): (sql_query, cursor)})}
+        self._statements: Dict[int, OrderedDict] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, connection_id: int, key: Hashable) -> Union[None, Tuple[str, Any]]:
+        """Return the (sql_query, cursor) cached for the connection or None
+        The returned sql_query is the string the cursor was prepared with: connectors compare
+        statements by identity, so it must be the one given to cursor.execute
+        """
+        with self._lock:
+            statements = self._statements.get(connection_id)
+            if statements is not None and key in statements:
+                statements.move_to_end(key)
+                self.hits += 1
+                return statements[key]
+            self.misses += 1
+            return None
+
+    def store(self, connection_id: int, key: Hashable, sql_query: str, cursor: Any) -> List[Any]:
+        """Cache a prepared cursor
+        :return: the evicted cursors, to be closed by the caller
+        """
+        evicted_cursors: List[Any] = []
+        with self._lock:
+            statements = self._statements.setdefault(connection_id, OrderedDict())
+            statements[key] = (sql_query, cursor)
+            statements.move_to_end(key)
+            while len(statements) > self.max_size:
+                _, (_, evicted_cursor) = statements.popitem(last=False)
+                evicted_cursors.append(evicted_cursor)
+                self.evictions += 1
+        return evicted_cursors
+
+    def discard(self, connection_id: int, key: Hashable) -> Union[None, Any]:
+        """Remove a cursor, e.g. after an error left it in an unknown state
+        :return: the removed cursor, to be closed by the caller, or None
+        """
+        with self._lock:
+            statements = self._statements.get(connection_id)
+            if statements is None or key not in statements:
+                return None
+            return statements.pop(key)[1]
+
+    def forget_connection(self, connection_id: int) -> List[Any]:
+        """Drop the cursors of a connection, e.g. when it is closed
+        :return: the dropped cursors
+        """
+        with self._lock:
+            statements = self._statements.pop(connection_id, None)
+        if statements is None:
+            return []
+        return [cursor for _, cursor in statements.values()]
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return hit/miss counters and the number of cached statements"""
+        with self._lock:
+            lookups: int = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "connections": len(self._statements),
+                "statements": sum(len(statements) for statements in self._statements.values()),
+            }
@@ -0,0 +1,229 @@
+""" In-process cache of query results with TTL, memory bounded LRU eviction and
+invalidation by table on writes"""
+import re
+import sys
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import (Union, Optional, Dict, Tuple, Set, FrozenSet, Any, Hashable)
+
+from mysql_helpers.mysql_con.lazy_imports import is_dataframe
+
+RE_SQL_COMMENT = re.compile(r"/\*.*?\*/|--[^\n]*|#[^\n]*", re.S)
+RE_WHITESPACE = re.compile(r"\s+")
+RE_READ_STATEMENT = re.compile(r"^\s*\(?\s*(SELECT|WITH|SHOW|DESC|DESCRIBE)\b", re.I)
+# keywords followed by a comma separated list of tables: FROM t1, t2 / UPDATE t1, t2 SET /
+# DELETE t1, t2 FROM ...
+RE_TABLE_LIST_START = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE|TABLE|USING|DELETE)\b", re.I)
+RE_TABLE_LIST_END = re.compile(
+    r"\b(?:SET|WHERE|JOIN|INNER|LEFT|RIGHT|CROSS|STRAIGHT_JOIN|NATURAL|ON|USING|ORDER|GROUP|"
+    r"HAVING|LIMIT|WINDOW|UNION|FOR|LOCK|VALUES|VALUE|SELECT|FROM|INTO|PARTITION)\b|[();]",
+    re.I,
+)
+# commas outside of quoted names
+RE_TABLE_SEPARATOR = re.compile(r",(?=(?:[^`]*`[^`]*`)*[^`]*$)")
+# a table name, optionally quoted and schema prefixed, after the statement modifiers
+RE_TABLE_NAME = re.compile(
+    r"^\s*(?:(?:LOW_PRIORITY|QUICK|IGNORE)\s+)*"
+    r"((?:`[^`]+`|[\w$]+)(?:\s*\.\s*(?:`[^`]+`|[\w$]+))?)",
+    re.I,
+)
+# sample of rows used to estimate the memory size of a result
+SIZE_SAMPLE_ROWS: int = 100
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Remove comments and collapse whitespace so that the same query shape gets the same key"""
+    sql_query = RE_SQL_COMMENT.sub(" ", sql_query)
+    return RE_WHITESPACE.sub(" ", sql_query).strip().rstrip(";").strip()
+
+
+def is_read_query(sql_query: str) -> bool:
+    return RE_READ_STATEMENT.match(RE_SQL_COMMENT.sub(" ", sql_query)) is not None
+
+
+def referenced_tables(sql_query: str) -> FrozenSet[str]:
+    """Return the lower case names, without schema, of the tables a statement refers to"""
+    sql_query = RE_SQL_COMMENT.sub(" ", sql_query)
+    tables: Set[str] = set()
+    for start in RE_TABLE_LIST_START.finditer(sql_query):
+        end = RE_TABLE_LIST_END.search(sql_query, start.end())
+        table_list: str = sql_query[start.end():len(sql_query) if end is None else end.start()]
+        for table_reference in RE_TABLE_SEPARATOR.split(table_list):
+            match = RE_TABLE_NAME.match(table_reference)
+            if match is None:
+                continue
+            table_name: str = match.group(1).split(".")[-1].strip().strip("`")
+            if table_name.upper() not in ("SELECT", "DUAL", "LATERAL", "LOW_PRIORITY", "QUICK", "IGNORE"):
+                tables.add(table_name.lower())
+    return frozenset(tables)
+
+
+def copy_result(result: Any) -> Any:
+    """Return a copy of a result that its caller can modify without changing the cached
+    one: a new list with new dicts for dict rows (tuple rows are immutable), a shallow
+    DataFrame copy
+    """
+    if is_dataframe(result):
+        return result.copy(deep=False)
+    if isinstance(result, list):
+        return [dict(row) if isinstance(row, dict) else row for row in result]
+    return result
+
+
+def estimate_result_size(result: Any) -> int:
+    """Rough memory size in bytes of a DataFrame or list of rows, sampled for large lists"""
+    if is_dataframe(result):
+        return int(result.memory_usage(index=True, deep=True).sum())
+    if isinstance(result, list):
+        if not result:
+            return sys.getsizeof(result)
+        sample = result[:SIZE_SAMPLE_ROWS]
+        sample_size: int = 0
+        for row in sample:
+            values = row.values() if isinstance(row, dict) else row
+            sample_size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+        return sys.getsizeof(result) + sample_size * len(result) // len(sample)
+    return sys.getsizeof(result)
+
+
+class QueryResultCache:
+    """LRU cache of query results bounded by their estimated memory size
+
+    Entries expire after their TTL and are invalidated when a write touches one of the
+    tables their query referenced. The cache can be shared by several connectors, keys
+    hold the connector namespace (host, port and database).
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, default_ttl: float = 60.0):
+        """
+        :param max_bytes: max estimated memory size of the cached results
+        :param default_ttl: seconds a result stays valid when the query gives no TTL
+        """
+        self.max_bytes: int = max_bytes
+        self.default_ttl: float = default_ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.invalidations: int = 0
+        self.current_bytes: int = 0
+        # {key: (result, expires_at, size, tables)}
+        self._entries: OrderedDict = OrderedDict()
+        # {table_name: {key, ...}}
+        self._table_keys: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+            namespace: str,
+            kind: str,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+    ) -> Union[None, Tuple]:
+        """Return the cache key of a query or None when it cannot be cached
+        (not a read statement or unhashable parameters)
+        """
+        if not is_read_query(sql_query):
+            return None
+        key = (namespace, kind, normalize_sql(sql_query),
+               None if sql_variables is None else tuple(sql_variables))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached result or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[0]
+        return copy_result(result)
+
+    def put(self, key: Hashable, result: Any, sql_query: str, ttl: Optional[float] = None):
+        """Cache a result, evicting the least recently used ones above max_bytes
+        :param key: the key returned by make_key
+        :param result: the query result
+        :param sql_query: the query, its tables are used for invalidation
+        :param ttl: seconds the result stays valid, default_ttl if None
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0 or result is None:
+            return
+        size: int = estimate_result_size(result)
+        if size > self.max_bytes:
+            return
+        tables: FrozenSet[str] = referenced_tables(sql_query)
+        # the caller keeps and may modify the result it returns
+        result = copy_result(result)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, monotonic() + ttl, size, tables)
+            self.current_bytes += size
+            for table in tables:
+                self._table_keys.setdefault(table, set()).add(key)
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        """Remove an entry, the lock must be held"""
+        _, _, size, tables = self._entries.pop(key)
+        self.current_bytes -= size
+        for table in tables:
+            table_keys = self._table_keys.get(table)
+            if table_keys is not None:
+                table_keys.discard(key)
+                if not table_keys:
+                    del self._table_keys[table]
+
+    def invalidate_tables(self, tables: FrozenSet[str]):
+        """Remove the results of the queries referencing any of the tables,
+        everything when no table is given as the write target is then unknown
+        """
+        with self._lock:
+            if not tables:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._table_keys.clear()
+                self.current_bytes = 0
+                return
+            keys: Set[Hashable] = set()
+            for table in tables:
+                table_name: str = table.split(".")[-1].strip().strip("`").lower()
+                keys.update(self._table_keys.get(table_name, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def invalidate_query(self, sql_query: str):
+        """Invalidate the results depending on the tables a write statement touches"""
+        self.invalidate_tables(referenced_tables(sql_query))
+
+    def clear(self):
+        self.invalidate_tables(frozenset())
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return hit/miss counters and the cache occupancy"""
+        with self._lock:
+            lookups: int = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,105 @@
+""" Converts the raw byte strings of raw cursors to typed numpy arrays, column by column"""
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from typing import (Union, List, Sequence, Any, Callable)
+
+from mysql.connector.constants import FieldType, FieldFlag
+
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+INTEGER_TYPES = frozenset([FieldType.TINY, FieldType.SHORT, FieldType.LONG,
+                           FieldType.INT24, FieldType.LONGLONG, FieldType.YEAR])
+FLOAT_TYPES = frozenset([FieldType.FLOAT, FieldType.DOUBLE])
+DECIMAL_TYPES = frozenset([FieldType.DECIMAL, FieldType.NEWDECIMAL])
+DATETIME_TYPES = frozenset([FieldType.DATETIME, FieldType.TIMESTAMP])
+DATE_TYPES = frozenset([FieldType.DATE, FieldType.NEWDATE])
+
+
+def _to_date(value: bytes) -> Union[None, datetime.date]:
+    try:
+        return datetime.date.fromisoformat(value.decode("ascii"))
+    except ValueError:
+        # zero dates, returned as None by the converting cursors
+        return None
+
+
+def _to_bit(value: bytes) -> int:
+    return int.from_bytes(value, "big")
+
+
+def _decoder(field_type: int, flags: int, charset: str) -> Callable[[bytes], Any]:
+    """Return the conversion of one non NULL raw value of the columns that are not vectorized"""
+    if field_type in DECIMAL_TYPES:
+        return lambda value: Decimal(value.decode("ascii"))
+    if field_type in DATE_TYPES:
+        return _to_date
+    if field_type == FieldType.BIT:
+        return _to_bit
+    if flags & FieldFlag.BINARY and field_type != FieldType.JSON:
+        return bytes
+    return lambda value: value.decode(charset)
+
+
+def _byte_strings(values: Sequence[Any], null: bytes) -> np.ndarray:
+    """Pack raw values in a fixed width bytes array, NULLs replaced by null"""
+    if None in values:
+        values = [null if value is None else value for value in values]
+    try:
+        return np.array(values, dtype="S")
+    except ValueError:
+        # bytearray values, returned by the pure Python raw cursors
+        return np.array([bytes(value) for value in values], dtype="S")
+
+
+def _parse_times(values: Sequence[Any]) -> np.ndarray:
+    """Parse [-]HHH:MM:SS[.ffffff] values, whose hours can exceed 24"""
+    texts: List[Union[None, str]] = [None if value is None else bytes(value).decode("ascii") for value in values]
+    negative = np.array([text is not None and text.startswith("-") for text in texts])
+    durations = pd.to_timedelta([text.lstrip("-") if text is not None else None for text in texts],
+                                errors="coerce").to_numpy()
+    return np.where(negative, -durations, durations).astype("timedelta64[ns]")
+
+
+def raw_column_to_array(
+        values: Sequence[Any],
+        field_type: int,
+        flags: int = 0,
+        charset: str = "utf-8",
+) -> np.ndarray:
+    """Convert the raw values of one column (bytes, None for NULL) to a typed numpy array,
+    with the dtypes of df_helpers.column_to_array: numbers are parsed by numpy in one call
+    instead of one Python int/float per value
+    :param values: the values of the column, as returned by a raw cursor
+    :param field_type: the type_code of the cursor.description entry
+    :param flags: the flags of the cursor.description entry
+    :param charset: the connection character set, text columns are decoded with it
+    """
+    if field_type in INTEGER_TYPES:
+        if None in values:
+            # integer columns holding NULLs are stored as float64 like pandas does
+            return _byte_strings(values, b"nan").astype(np.float64)
+        unsigned_longlong: bool = field_type == FieldType.LONGLONG and bool(flags & FieldFlag.UNSIGNED)
+        return _byte_strings(values, b"0").astype(np.uint64 if unsigned_longlong else np.int64)
+    if field_type in FLOAT_TYPES:
+        return _byte_strings(values, b"nan").astype(np.float64)
+    if field_type in DATETIME_TYPES:
+        byte_strings = _byte_strings(values, b"NaT")
+        try:
+            return byte_strings.astype("datetime64[ns]")
+        except ValueError:
+            # zero dates become NaT
+            return pd.to_datetime(byte_strings.astype("U"), errors="coerce",
+                                  format="ISO8601").to_numpy().astype("datetime64[ns]")
+    if field_type == FieldType.TIME:
+        return _parse_times(values)
+
+    decode: Callable[[bytes], Any] = _decoder(field_type, flags, charset)
+    array = np.empty(len(values), dtype=object)
+    array[:] = [None if value is None else decode(value) for value in values]
+    return array
+
@@ -0,0 +1,175 @@
+""" Compact result rows: tuple records readable by attribute and by key, and a column store
+building them on demand"""
+from __future__ import annotations
+
+from array import array
+from collections import namedtuple
+from collections.abc import Sequence as SequenceABC
+from functools import lru_cache
+from operator import itemgetter
+from typing import (Union, Optional, List, Tuple, Dict, Sequence, Iterator, Any)
+
+from mysql.connector.constants import FieldType, FieldFlag
+
+from mysql_helpers.mysql_con.df_helpers import column_dtype, column_to_array
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+INTEGER_TYPES = frozenset([FieldType.TINY, FieldType.SHORT, FieldType.LONG,
+                           FieldType.INT24, FieldType.LONGLONG, FieldType.YEAR])
+FLOAT_TYPES = frozenset([FieldType.FLOAT, FieldType.DOUBLE])
+
+
+@lru_cache(maxsize=256)
+def record_class(column_names: Tuple[str, ...]) -> type:
+    """Return the record class of a result, shared by the queries returning the same columns
+    Records are tuples (no per row dict): row.proxy_url, row["proxy_url"] and row[1] all
+    work, column names that are not identifiers ("COUNT(*)") are reachable by key only.
+    The class is built at runtime, records pickle through make_record by column names.
+    """
+    base = namedtuple("Record", column_names, rename=True)
+    positions: Dict[str, int] = {name: position for position, name in enumerate(column_names)}
+
+    class Record(base):
+        __slots__ = ()
+        _column_names: Tuple[str, ...] = column_names
+
+        def __getitem__(self, key: Union[int, slice, str]) -> Any:
+            if isinstance(key, str):
+                return tuple.__getitem__(self, positions[key])
+            return tuple.__getitem__(self, key)
+
+        def get(self, key: str, default: Any = None) -> Any:
+            position: Optional[int] = positions.get(key)
+            return default if position is None else tuple.__getitem__(self, position)
+
+        def keys(self) -> Tuple[str, ...]:
+            return column_names
+
+        def as_dict(self) -> Dict[str, Any]:
+            return dict(zip(column_names, self))
+
+        def __reduce__(self) -> Tuple[Any, Tuple]:
+            return make_record, (column_names, tuple(self))
+
+    return Record
+
+
+def make_record(column_names: Tuple[str, ...], values: Sequence[Any]) -> Any:
+    """Build one record, the unpickling function of the records"""
+    return record_class(tuple(column_names))._make(values)
+
+
+def rows_to_records(rows: List[Tuple], description: Optional[Sequence[Tuple]]) -> List[Any]:
+    """Replace the tuple rows by records in place, one row at a time, so that the result
+    is never held twice in memory
+    """
+    if not description or not rows:
+        return rows
+    make = record_class(tuple(column[0] for column in description))._make
+    for position, row in enumerate(rows):
+        rows[position] = make(row)
+    return rows
+
+
+def _column_store(values: List[Any], field_type: int, flags: int) -> Union[array, List[Any]]:
+    """Pack a column in a typed array when it holds integers or floats without NULLs, 8 bytes
+    per value instead of a pointer and a Python object
+    """
+    try:
+        if field_type in INTEGER_TYPES:
+            unsigned: bool = field_type == FieldType.LONGLONG and bool(flags & FieldFlag.UNSIGNED)
+            return array("Q" if unsigned else "q", values)
+        if field_type in FLOAT_TYPES:
+            return array("d", values)
+    except (TypeError, OverflowError):
+        # NULLs, or values returned as strings
+        pass
+    return values
+
+
+class ColumnarResult(SequenceABC):
+    """Result kept column by column, typed arrays for the numeric columns, lists for the
+    others. Rows are built as records when accessed, and only then.
+
+        result = my_connector.fetch_all_as_records(sql_query, columnar=True)
+        result.column("proxy_speed")  # the column values, without building rows
+        for row in result:  # records, built one at a time
+            print(row.proxy_url, row["proxy_speed"])
+    """
+
+    def __init__(
+            self,
+            column_names: Sequence[str],
+            columns: Sequence[Union[array, List[Any]]],
+            description: Optional[Sequence[Tuple]] = None,
+    ):
+        """
+        :param column_names: the names of the columns, in order
+        :param columns: the values of each column
+        :param description: the cursor.description of the query, gives the DataFrame dtypes
+        """
+        self.column_names: Tuple[str, ...] = tuple(column_names)
+        self.columns: List[Union[array, List[Any]]] = list(columns)
+        self.description: Optional[Sequence[Tuple]] = description
+        self._record_class: type = record_class(self.column_names)
+        self._length: int = len(self.columns[0]) if self.columns else 0
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple], description: Optional[Sequence[Tuple]]) -> "ColumnarResult":
+        """Transpose tuple rows, see df_helpers.rows_to_df"""
+        if not description:
+            return cls([], [])
+        columns: List[Union[array, List[Any]]] = []
+        for index, column in enumerate(description):
+            flags: int = column[7] if len(column) > 7 else 0
+            columns.append(_column_store(list(map(itemgetter(index), rows)), column[1], flags))
+        return cls([column[0] for column in description], columns, description)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, position: Union[int, slice]) -> Any:
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(self._length))]
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError("ColumnarResult index out of range")
+        return self._record_class._make(column[position] for column in self.columns)
+
+    def __iter__(self) -> Iterator[Any]:
+        make = self._record_class._make
+        for values in zip(*self.columns):
+            yield make(values)
+
+    def __reduce__(self) -> Tuple[Any, Tuple]:
+        # the record class is rebuilt from the column names
+        return self.__class__, (self.column_names, self.columns, self.description)
+
+    def __repr__(self) -> str:
+        return f"<ColumnarResult {self._length} rows x {len(self.column_names)} columns {list(self.column_names)}>"
+
+    def column(self, name: str) -> Union[array, List[Any]]:
+        """Return the values of one column, a typed array for numeric columns without NULLs"""
+        return self.columns[self.column_names.index(name)]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.column_names, values)) for values in zip(*self.columns)]
+
+    def to_df(self) -> pd.DataFrame:
+        """Build a DataFrame, the typed arrays are wrapped by numpy without copy"""
+        arrays = {}
+        for index, column in enumerate(self.columns):
+            if isinstance(column, array):
+                arrays[index] = np.frombuffer(column, dtype=column.typecode)
+            elif self.description is not None:
+                field: Tuple = self.description[index]
+                arrays[index] = column_to_array(column, column_dtype(field[1], field[7] if len(field) > 7 else 0))
+            else:
+                arrays[index] = column_to_array(column, None)
+        result_df = pd.DataFrame(arrays, copy=False)
+        result_df.columns = list(self.column_names)
+        return result_df
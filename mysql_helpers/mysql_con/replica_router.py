@@ -0,0 +1,497 @@
+""" Read/write splitting: reads balanced over read replicas, writes and transactions on the primary"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from time import monotonic
+from typing import (Union, Optional, List, Dict, Sequence, Iterator, AsyncIterator, Any, Callable)
+
+from mysql_helpers.mysql_con.keep_alive import is_connection_lost
+from mysql_helpers.mysql_con.mysql_pool_sync import MySQLConnectorPoolNative
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+BALANCE_LEAST_OUTSTANDING: str = "least_outstanding"
+BALANCE_WEIGHTED: str = "weighted"
+BALANCINGS: frozenset = frozenset([BALANCE_LEAST_OUTSTANDING, BALANCE_WEIGHTED])
+
+# methods of the connectors that only read, sent to a replica
+READ_METHODS: frozenset = frozenset([
+    "fetch_all_as_df", "fetch_all_as_dicts", "fetch_all_as_records", "fetch_all_as_arrow",
+    "fetch_all_as_polars", "fetch_many", "read_table_parallel", "fetch_chunks", "fetch_iter",
+    "iter_table", "export_query", "fetch_arrow_batches",
+])
+# methods that write, sent to the primary, reads follow them there with read_your_writes
+WRITE_METHODS: frozenset = frozenset(["execute_one_query", "execute_many", "write_df", "upsert_df"])
+
+# replication lag columns of SHOW REPLICA STATUS (8.0.22+) and SHOW SLAVE STATUS
+LAG_COLUMNS = ("Seconds_Behind_Source", "Seconds_Behind_Master")
+
+
+class ReplicaState:
+    """A replica connector with its balancing and health bookkeeping"""
+
+    def __init__(self, connector: Any, weight: float = 1.0):
+        if weight <= 0:
+            raise ValueError(f"Replica weight must be positive, got: {weight}")
+        self.connector: Any = connector
+        self.weight: float = weight
+        self.name: str = f"{connector.db_host}:{connector.db_port}"
+        self.healthy: bool = True
+        # seconds behind the primary at the last health check, None if not replicating
+        self.lag: Union[None, float] = None
+        self.last_error: Union[None, str] = None
+        # reads running on the replica, and reads sent to it so far
+        self.outstanding: int = 0
+        self.reads: int = 0
+        self.ejections: int = 0
+        # smooth weighted round robin counter
+        self.current_weight: float = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "last_error": self.last_error,
+            "outstanding": self.outstanding,
+            "reads": self.reads,
+            "ejections": self.ejections,
+        }
+
+
+class _ReplicaRouterBase:
+    """Replica selection, read-your-writes sessions and health bookkeeping shared by the
+    sync and asyncio routers
+    """
+
+    def __init__(
+            self,
+            primary: Any,
+            replicas: Sequence[Any],
+            weights: Optional[Sequence[float]] = None,
+            balancing: str = BALANCE_LEAST_OUTSTANDING,
+            read_your_writes: bool = False,
+            sticky_seconds: Optional[float] = 5.0,
+            max_replication_lag: Optional[float] = None,
+            health_check_interval: float = 5.0,
+            lag_query: str = "SHOW REPLICA STATUS",
+            fallback_to_primary: bool = True,
+    ):
+        """
+        :param primary: the connector of the primary, runs the writes and the transactions
+        :param replicas: the connectors of the read replicas, of the same class as primary
+        :param weights: relative share of the reads of each replica, 1 each if None
+        :param balancing: "least_outstanding" sends a read to the replica running the fewest
+                          reads relative to its weight, "weighted" spreads the reads in
+                          proportion to the weights (smooth weighted round robin)
+        :param read_your_writes: after a write, the reads of the same thread or asyncio task
+                                 go to the primary, so they see it
+        :param sticky_seconds: how long the reads stay on the primary after a write, for the
+                               rest of the session() if None
+        :param max_replication_lag: eject the replicas further behind the primary, in seconds
+        :param health_check_interval: seconds between two health checks of the replicas, run
+                                      by the next read
+        :param lag_query: statement returning the replication status of a replica, use
+                          "SHOW SLAVE STATUS" before MySQL 8.0.22
+        :param fallback_to_primary: read on the primary when no replica is healthy, raise
+                                    ConnectionError otherwise
+        """
+        if balancing not in BALANCINGS:
+            raise ValueError(f"balancing must be one of {sorted(BALANCINGS)}, got: {balancing}")
+        if weights is not None and len(weights) != len(replicas):
+            raise ValueError(f"Got {len(weights)} weights for {len(replicas)} replicas")
+
+        self.primary: Any = primary
+        self.replicas: List[ReplicaState] = [
+            ReplicaState(replica, 1.0 if weights is None else weights[index])
+            for index, replica in enumerate(replicas)
+        ]
+        self.balancing: str = balancing
+        self.read_your_writes: bool = read_your_writes
+        self.sticky_seconds: Optional[float] = sticky_seconds
+        self.max_replication_lag: Optional[float] = max_replication_lag
+        self.health_check_interval: float = health_check_interval
+        self.lag_query: str = lag_query
+        self.fallback_to_primary: bool = fallback_to_primary
+        self.primary_reads: int = 0
+        self.last_health_check: float = 0.0
+        self._lock: threading.Lock = threading.Lock()
+        # monotonic time of the last write of the current thread or task
+        self._last_write: ContextVar[Union[None, float]] = ContextVar(
+            f"mysql_helpers_last_write_{id(self)}", default=None
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        # the attributes the router does not route are the primary ones
+        if name.startswith("_") or "primary" not in self.__dict__:
+            raise AttributeError(name)
+        method: Any = getattr(self.primary, name)
+        if name in READ_METHODS:
+            return self._read_method(name, method)
+        if name in WRITE_METHODS:
+            return self._write_method(method)
+        return method
+
+    def _read_method(self, name: str, method: Callable) -> Callable:
+        raise NotImplementedError
+
+    def _write_method(self, method: Callable) -> Callable:
+        raise NotImplementedError
+
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        """Scope of read_your_writes: the writes made inside the block send the reads that
+        follow them to the primary until the block ends (or sticky_seconds after the write)
+
+            with my_router.session():
+                my_router.execute_one_query(...)
+                my_router.fetch_all_as_dicts(...)  # runs on the primary
+        """
+        token = self._last_write.set(None)
+        try:
+            yield self
+        finally:
+            self._last_write.reset(token)
+
+    def _mark_write(self):
+        if self.read_your_writes:
+            self._last_write.set(monotonic())
+
+    def _reads_on_primary(self) -> bool:
+        """True inside a transaction, and after a write of the current session with read_your_writes"""
+        if self.primary.in_transaction:
+            return True
+        last_write: Union[None, float] = self._last_write.get()
+        if last_write is None:
+            return False
+        return self.sticky_seconds is None or monotonic() - last_write < self.sticky_seconds
+
+    def _health_check_due(self) -> bool:
+        return bool(self.replicas) and monotonic() - self.last_health_check >= self.health_check_interval
+
+    def _choose_replica(self) -> Union[None, ReplicaState]:
+        """Pick the replica of the next read and count it as outstanding, None if none is healthy"""
+        with self._lock:
+            candidates: List[ReplicaState] = [replica for replica in self.replicas if replica.healthy]
+            if not candidates:
+                return None
+            if self.balancing == BALANCE_LEAST_OUTSTANDING:
+                chosen: ReplicaState = min(
+                    candidates,
+                    key=lambda replica: (replica.outstanding / replica.weight, replica.reads / replica.weight),
+                )
+            else:
+                total_weight: float = 0.0
+                for replica in candidates:
+                    replica.current_weight += replica.weight
+                    total_weight += replica.weight
+                chosen = max(candidates, key=lambda replica: replica.current_weight)
+                chosen.current_weight -= total_weight
+            chosen.outstanding += 1
+            chosen.reads += 1
+            return chosen
+
+    def _release_replica(self, replica: ReplicaState):
+        with self._lock:
+            replica.outstanding -= 1
+
+    def _count_primary_read(self):
+        if not self.fallback_to_primary and not self._reads_on_primary():
+            raise ConnectionError(f"No healthy replica among {[replica.name for replica in self.replicas]}")
+        with self._lock:
+            self.primary_reads += 1
+
+    def _update_health(self, replica: ReplicaState, status_rows: Optional[List[Dict]]):
+        """Set the health of a replica from its replication status, None if the check failed"""
+        reason: Union[None, str] = None
+        lag: Union[None, float] = None
+        if status_rows is None:
+            reason = "health check failed"
+        elif status_rows:
+            status: Dict = status_rows[0]
+            lag_column: Union[None, str] = next((column for column in LAG_COLUMNS if column in status), None)
+            lag = status[lag_column] if lag_column is not None else None
+            if lag is None:
+                reason = "replication is not running"
+            elif self.max_replication_lag is not None and lag > self.max_replication_lag:
+                reason = f"replication lag {lag}s above {self.max_replication_lag}s"
+        # an empty status: the server is not a replica (e.g. a standalone copy), it is kept
+        self._set_health(replica, reason, lag)
+
+    def _set_health(self, replica: ReplicaState, reason: Optional[str], lag: Optional[float] = None):
+        with self._lock:
+            replica.lag = lag
+            if reason is None:
+                if not replica.healthy:
+                    logger.debug(f"Replica {replica.name} is healthy again")
+                replica.healthy = True
+                replica.last_error = None
+                return
+            if replica.healthy:
+                replica.ejections += 1
+                logger.error(f"Replica {replica.name} ejected: {reason}")
+            replica.healthy = False
+            replica.last_error = reason
+
+    def _record_failure(self, replica: ReplicaState, ex: Exception):
+        """Eject the replica when a read failed on a lost connection, the next health check
+        brings it back
+        """
+        if is_connection_lost(ex):
+            self._set_health(replica, f"connection lost: {ex}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the primary stats and the balancing and health state of each replica"""
+        return {
+            "primary": self.primary.stats(),
+            "primary_reads": self.primary_reads,
+            "replicas": [dict(replica.stats(), connector=replica.connector.stats()) for replica in self.replicas],
+        }
+
+
+class MySQLConnectorRouter(_ReplicaRouterBase):
+    """Read/write splitting over a primary and read replicas, MySQLConnectorNative or
+    MySQLConnectorPoolNative connectors
+
+    The fetch_* methods (and iter_table, export_query...) run on a replica, the writes
+    (execute_one_query, execute_many, write_df, upsert_df) and transaction() on the primary,
+    the reads of a transaction on the primary too. The other attributes are the primary ones.
+
+        my_router = MySQLConnectorRouter(
+            MySQLConnectorPoolNative(db_host="primary"),
+            [MySQLConnectorPoolNative(db_host="replica-1"), MySQLConnectorPoolNative(db_host="replica-2")],
+            max_replication_lag=10, read_your_writes=True,
+        )
+        my_router.fetch_all_as_df(sql_query)  # on a replica
+    """
+
+    def __init__(self, primary: Any, replicas: Sequence[Any], **kwargs):
+        """See _ReplicaRouterBase for the keyword arguments"""
+        super().__init__(primary, replicas, **kwargs)
+        self._health_check_lock: threading.Lock = threading.Lock()
+
+    def check_replicas(self) -> List[Dict[str, Any]]:
+        """Query the replication status of the replicas and eject the unreachable ones, the
+        ones whose replication stopped and the ones lagging above max_replication_lag
+        :return: the state of each replica
+        """
+        self.last_health_check = monotonic()
+        for replica in self.replicas:
+            self._check_replica(replica)
+        return [replica.stats() for replica in self.replicas]
+
+    def _check_replica(self, replica: ReplicaState):
+        # the pool connector returns tuple rows unless asked for dicts
+        kwargs: Dict[str, Any] = {}
+        if isinstance(replica.connector, MySQLConnectorPoolNative):
+            kwargs["dictionary"] = True
+        try:
+            status_rows: Union[None, List[Dict]] = replica.connector.fetch_all_as_dicts(
+                self.lag_query, cache_ttl=0, **kwargs
+            )
+        except Exception as ex:
+            logger.debug(f"Error while checking replica {replica.name}: {ex}")
+            status_rows = None
+        self._update_health(replica, status_rows)
+
+    def _maybe_check_replicas(self):
+        # one thread checks, the others read with the current state
+        if self._health_check_due() and self._health_check_lock.acquire(blocking=False):
+            try:
+                if self._health_check_due():
+                    self.check_replicas()
+            finally:
+                self._health_check_lock.release()
+
+    def _read_method(self, name: str, method: Callable) -> Callable:
+        if inspect.isgeneratorfunction(method):
+            def read_iter(*args, **kwargs) -> Iterator[Any]:
+                # the replica is chosen by the first next(), a generator never started holds none
+                yield from self._read_iter(name, args, kwargs)
+            return read_iter
+
+        def read(*args, **kwargs) -> Any:
+            return self._read(name, args, kwargs)
+        return read
+
+    def _read(self, name: str, args: tuple, kwargs: dict) -> Any:
+        replica: Union[None, ReplicaState] = None
+        if not self._reads_on_primary():
+            self._maybe_check_replicas()
+            replica = self._choose_replica()
+        if replica is None:
+            self._count_primary_read()
+            return getattr(self.primary, name)(*args, **kwargs)
+
+        try:
+            result: Any = getattr(replica.connector, name)(*args, **kwargs)
+        except Exception as ex:
+            self._record_failure(replica, ex)
+            raise
+        finally:
+            self._release_replica(replica)
+        if result is None:
+            # the connectors log their errors and return None: read again elsewhere only
+            # when the replica itself is the problem
+            self._check_replica(replica)
+            if not replica.healthy:
+                return self._read(name, args, kwargs)
+        return result
+
+    def _read_iter(self, name: str, args: tuple, kwargs: dict) -> Iterator[Any]:
+        replica: Union[None, ReplicaState] = None
+        if not self._reads_on_primary():
+            self._maybe_check_replicas()
+            replica = self._choose_replica()
+        if replica is None:
+            self._count_primary_read()
+            yield from getattr(self.primary, name)(*args, **kwargs)
+            return
+
+        try:
+            yield from getattr(replica.connector, name)(*args, **kwargs)
+        except Exception as ex:
+            self._record_failure(replica, ex)
+            raise
+        finally:
+            self._release_replica(replica)
+
+    def _write_method(self, method: Callable) -> Callable:
+        def write(*args, **kwargs) -> Any:
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._mark_write()
+        return write
+
+    @contextmanager
+    def transaction(self, *args, **kwargs) -> Iterator["MySQLConnectorRouter"]:
+        """primary.transaction(), the router methods called inside the block all run on the
+        primary, in the transaction
+        """
+        try:
+            with self.primary.transaction(*args, **kwargs):
+                yield self
+        finally:
+            self._mark_write()
+
+
+class MySQLConnectorRouterAsync(_ReplicaRouterBase):
+    """Read/write splitting over MySQLConnectorNativeAsync connectors, see MySQLConnectorRouter
+
+        my_router = MySQLConnectorRouterAsync(
+            MySQLConnectorNativeAsync(db_host="primary", pool_size=10),
+            [MySQLConnectorNativeAsync(db_host="replica-1", pool_size=10)],
+        )
+        await my_router.fetch_all_as_dicts(sql_query)  # on the replica
+    """
+
+    def __init__(self, primary: Any, replicas: Sequence[Any], **kwargs):
+        """See _ReplicaRouterBase for the keyword arguments"""
+        super().__init__(primary, replicas, **kwargs)
+        self._health_check_task: Union[None, asyncio.Task] = None
+
+    async def check_replicas(self) -> List[Dict[str, Any]]:
+        """Query the replication status of the replicas concurrently, see MySQLConnectorRouter.check_replicas
+        :return: the state of each replica
+        """
+        self.last_health_check = monotonic()
+        await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+        return [replica.stats() for replica in self.replicas]
+
+    async def _check_replica(self, replica: ReplicaState):
+        try:
+            status_rows: Union[None, List[Dict]] = await replica.connector.fetch_all_as_dicts(
+                self.lag_query, cache_ttl=0
+            )
+        except Exception as ex:
+            logger.debug(f"Error while checking replica {replica.name}: {ex}")
+            status_rows = None
+        self._update_health(replica, status_rows)
+
+    async def _maybe_check_replicas(self):
+        # one task checks, the tasks reading meanwhile wait for the same check
+        if self._health_check_task is None and self._health_check_due():
+            self._health_check_task = asyncio.ensure_future(self.check_replicas())
+            self._health_check_task.add_done_callback(self._health_check_done)
+        if self._health_check_task is not None:
+            await asyncio.shield(self._health_check_task)
+
+    def _health_check_done(self, task: asyncio.Task):
+        self._health_check_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error while checking replicas: {task.exception()}")
+
+    async def _choose_read_replica(self) -> Union[None, ReplicaState]:
+        if self._reads_on_primary():
+            return None
+        await self._maybe_check_replicas()
+        return self._choose_replica()
+
+    def _read_method(self, name: str, method: Callable) -> Callable:
+        if inspect.isasyncgenfunction(method):
+            async def read_iter(*args, **kwargs) -> AsyncIterator[Any]:
+                replica: Union[None, ReplicaState] = await self._choose_read_replica()
+                if replica is None:
+                    self._count_primary_read()
+                    async for item in getattr(self.primary, name)(*args, **kwargs):
+                        yield item
+                    return
+                try:
+                    async for item in getattr(replica.connector, name)(*args, **kwargs):
+                        yield item
+                except Exception as ex:
+                    self._record_failure(replica, ex)
+                    raise
+                finally:
+                    self._release_replica(replica)
+            return read_iter
+
+        async def read(*args, **kwargs) -> Any:
+            return await self._read(name, args, kwargs)
+        return read
+
+    async def _read(self, name: str, args: tuple, kwargs: dict) -> Any:
+        replica: Union[None, ReplicaState] = await self._choose_read_replica()
+        if replica is None:
+            self._count_primary_read()
+            return await getattr(self.primary, name)(*args, **kwargs)
+
+        try:
+            result: Any = await getattr(replica.connector, name)(*args, **kwargs)
+        except Exception as ex:
+            self._record_failure(replica, ex)
+            raise
+        finally:
+            self._release_replica(replica)
+        if result is None:
+            await self._check_replica(replica)
+            if not replica.healthy:
+                return await self._read(name, args, kwargs)
+        return result
+
+    def _write_method(self, method: Callable) -> Callable:
+        async def write(*args, **kwargs) -> Any:
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self._mark_write()
+        return write
+
+    @asynccontextmanager
+    async def transaction(self, *args, **kwargs) -> AsyncIterator["MySQLConnectorRouterAsync"]:
+        """primary.transaction(), the router methods called inside the block by the current
+        task all run on the primary, in the transaction
+        """
+        try:
+            async with self.primary.transaction(*args, **kwargs):
+                yield self
+        finally:
+            self._mark_write()
@@ -0,0 +1,460 @@
+""" Sharding: keyed queries routed to one shard, scatter-gather queries run on all shards
+concurrently and merged, ORDER BY results by a streaming k-way merge"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from pathlib import Path
+from typing import (Union, Optional, List, Tuple, Dict, Sequence, Mapping, Iterator, AsyncIterator,
+                    Any, Callable)
+
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+from mysql_helpers.mysql_con.mysql_async import MySQLConnectorNativeAsync
+from mysql_helpers.mysql_con.mysql_pool_sync import MySQLConnectorPoolNative
+
+pd = LazyModule("pandas")
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+OrderBy = Union[str, int, Sequence[Union[str, int]]]
+
+_END = object()
+
+
+def hash_shard_function(shard_names: Sequence[str]) -> Callable[[Any], str]:
+    """Return the default shard function: the CRC32 of the key modulo the number of shards
+    Unlike hash(), CRC32 gives the same shard in every process. Adding a shard moves most
+    keys, use a lookup table (customer -> shard) as shard function when shards are added.
+    """
+    names: List[str] = list(shard_names)
+
+    def shard_function(shard_key: Any) -> str:
+        return names[zlib.crc32(str(shard_key).encode("utf-8")) % len(names)]
+    return shard_function
+
+
+def _order_columns(order_by: OrderBy) -> List[Union[str, int]]:
+    return [order_by] if isinstance(order_by, (str, int)) else list(order_by)
+
+
+def _order_key(order_by: OrderBy) -> Callable[[Any], Tuple]:
+    """Return the merge key of a row, column names for dict rows, positions for tuple rows
+    NULLs compare below any value, as in MySQL: first in ascending order, last in descending
+    """
+    columns: List[Union[str, int]] = _order_columns(order_by)
+
+    def key(row: Any) -> Tuple:
+        return tuple((row[column] is not None, row[column]) for column in columns)
+    return key
+
+
+class _Descending:
+    """Inverts the comparison of a merge key in the heap of merge_sorted_async"""
+    __slots__ = ("key",)
+
+    def __init__(self, key: Tuple):
+        self.key: Tuple = key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
+
+
+def merge_sorted(
+        streams: Sequence[Iterator[Any]],
+        order_by: OrderBy,
+        descending: bool = False,
+) -> Iterator[Any]:
+    """Merge row streams each sorted by order_by into one sorted stream, holding one row per
+    stream in memory
+    """
+    return heapq.merge(*streams, key=_order_key(order_by), reverse=descending)
+
+
+async def merge_sorted_async(
+        streams: Sequence[AsyncIterator[Any]],
+        order_by: OrderBy,
+        descending: bool = False,
+) -> AsyncIterator[Any]:
+    """merge_sorted for async iterators, the first row of each stream is awaited concurrently"""
+    key: Callable[[Any], Tuple] = _order_key(order_by)
+    heap: List[Tuple[Any, int, Any]] = []
+
+    def push(index: int, row: Any):
+        row_key: Tuple = key(row)
+        heapq.heappush(heap, (_Descending(row_key) if descending else row_key, index, row))
+
+    first_rows: List[Any] = await asyncio.gather(*(stream.__anext__() for stream in streams),
+                                                 return_exceptions=True)
+    for index, row in enumerate(first_rows):
+        if isinstance(row, StopAsyncIteration):
+            continue
+        if isinstance(row, BaseException):
+            raise row
+        push(index, row)
+    while heap:
+        # the stream index breaks the ties, rows are never compared
+        _, index, row = heapq.heappop(heap)
+        yield row
+        try:
+            push(index, await streams[index].__anext__())
+        except StopAsyncIteration:
+            pass
+
+
+class _ShardedBase:
+    """Shards and shard function shared by the sync and asyncio sharded connectors"""
+
+    def __init__(
+            self,
+            shards: Mapping[str, Any],
+            shard_function: Optional[Callable[[Any], str]] = None,
+    ):
+        """
+        :param shards: shard name -> connector of the shard
+        :param shard_function: returns the name of the shard holding a shard key (customer
+                               id...), hash_shard_function(shard names) if None
+        """
+        if not shards:
+            raise ValueError("At least one shard is needed")
+        self.shards: Dict[str, Any] = dict(shards)
+        self.shard_function: Callable[[Any], str] = (
+            hash_shard_function(list(self.shards)) if shard_function is None else shard_function
+        )
+
+    def shard_name(self, shard_key: Any) -> str:
+        """Return the name of the shard holding shard_key"""
+        name: str = self.shard_function(shard_key)
+        if name not in self.shards:
+            raise ValueError(f"Shard function returned unknown shard {name!r} for key {shard_key!r}")
+        return name
+
+    def shard(self, shard_key: Any) -> Any:
+        """Return the connector of the shard holding shard_key, for the keyed queries
+
+            my_sharded.shard(customer_id).fetch_all_as_dicts(sql_query, (customer_id,))
+        """
+        return self.shards[self.shard_name(shard_key)]
+
+    def _selected_shards(self, shard_names: Optional[Sequence[str]]) -> List[str]:
+        if shard_names is None:
+            return list(self.shards)
+        unknown: List[str] = [name for name in shard_names if name not in self.shards]
+        if unknown:
+            raise ValueError(f"Unknown shards: {unknown}")
+        return list(shard_names)
+
+    @staticmethod
+    def _merge_results(
+            names: List[str],
+            results: List[Union[List[Dict], pd.DataFrame, None]],
+            as_df: bool,
+            order_by: Optional[OrderBy],
+            descending: bool,
+            limit: Optional[int],
+            shard_column: Optional[str],
+            allow_partial: bool,
+    ) -> Union[List[Dict], pd.DataFrame, None]:
+        """Merge the results of each shard, None if a shard failed and not allow_partial"""
+        failed: List[str] = [name for name, result in zip(names, results) if result is None]
+        if failed:
+            logger.error(f"Query failed on shards {failed}")
+            if not allow_partial:
+                return None
+        shard_results: List[Tuple[str, Any]] = [
+            (name, result) for name, result in zip(names, results) if result is not None
+        ]
+
+        if as_df:
+            frames: List[pd.DataFrame] = []
+            for name, result_df in shard_results:
+                if shard_column is not None:
+                    result_df[shard_column] = name
+                frames.append(result_df)
+            if not frames:
+                return pd.DataFrame()
+            merged_df: pd.DataFrame = pd.concat(frames, ignore_index=True)
+            if order_by is not None:
+                # each shard result is sorted: a stable sort keeps the shard order on ties
+                merged_df = merged_df.sort_values(_order_columns(order_by), ascending=not descending,
+                                                  kind="stable", na_position="last" if descending else "first",
+                                                  ignore_index=True)
+            return merged_df if limit is None else merged_df.head(limit)
+
+        if shard_column is not None:
+            for name, rows in shard_results:
+                for row in rows:
+                    row[shard_column] = name
+        rows_lists: List[List[Dict]] = [rows for _, rows in shard_results]
+        if order_by is not None:
+            merged: Iterator[Dict] = merge_sorted([iter(rows) for rows in rows_lists], order_by, descending)
+        else:
+            merged = chain.from_iterable(rows_lists)
+        return list(merged if limit is None else islice(merged, limit))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the stats of the connector of each shard"""
+        return {name: connector.stats() for name, connector in self.shards.items()}
+
+
+class MySQLConnectorSharded(_ShardedBase):
+    """Data split by key (customer...) over several MySQL hosts or schemas, a
+    MySQLConnectorPoolNative per shard
+
+        my_sharded = MySQLConnectorSharded.from_configs({
+            "eu": {"db_host": "mysql-eu", "db_name": "customers"},
+            "us": {"db_host": "mysql-us", "db_name": "customers"},
+        }, pool_size=5)
+        my_sharded.shard(customer_id).execute_one_query(sql_query, sql_variables)
+        top_customers = my_sharded.fetch_all_shards(
+            "SELECT customer_id, revenue FROM customers ORDER BY revenue DESC LIMIT 10",
+            order_by="revenue", descending=True, limit=10,
+        )
+    """
+
+    def __init__(
+            self,
+            shards: Mapping[str, MySQLConnectorPoolNative],
+            shard_function: Optional[Callable[[Any], str]] = None,
+            max_workers: Optional[int] = None,
+    ):
+        """
+        :param shards: shard name -> MySQLConnectorPoolNative of the shard
+        :param shard_function: returns the name of the shard holding a shard key, see shard()
+        :param max_workers: max number of shards queried at the same time, all of them if None
+        """
+        super().__init__(shards, shard_function)
+        if max_workers is not None and max_workers <= 0:
+            raise ValueError(f"max_workers must be a positive integer, got: {max_workers}")
+        self.max_workers: Optional[int] = max_workers
+
+    @classmethod
+    def from_configs(
+            cls,
+            shard_configs: Mapping[str, Dict[str, Any]],
+            shard_function: Optional[Callable[[Any], str]] = None,
+            max_workers: Optional[int] = None,
+            **connector_kwargs,
+    ) -> "MySQLConnectorSharded":
+        """Open a MySQLConnectorPoolNative per shard
+        :param shard_configs: shard name -> db_host, db_port, db_user, db_password, db_name
+                              of the shard, the missing ones are read from the environment
+        :param connector_kwargs: arguments of every MySQLConnectorPoolNative (pool_size...)
+        """
+        return cls(
+            {name: MySQLConnectorPoolNative(**config, **connector_kwargs) for name, config in shard_configs.items()},
+            shard_function=shard_function,
+            max_workers=max_workers,
+        )
+
+    def _scatter(self, names: List[str], fetch: Callable[[Any], Any]) -> List[Any]:
+        """Run fetch on the connector of each shard concurrently, a failing shard gives None"""
+        max_workers: int = min(self.max_workers or len(names), len(names))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mysql_helpers_shards") as executor:
+            futures = [executor.submit(fetch, self.shards[name]) for name in names]
+            results: List[Any] = []
+            for name, future in zip(names, futures):
+                try:
+                    results.append(future.result())
+                except Exception as ex:
+                    logger.error(f"Error ({ex.__class__.__name__}) on shard {name}: {ex}")
+                    results.append(None)
+        return results
+
+    def fetch_all_shards(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            order_by: Optional[OrderBy] = None,
+            descending: bool = False,
+            limit: Optional[int] = None,
+            as_df: bool = False,
+            shard_column: Optional[str] = None,
+            shard_names: Optional[Sequence[str]] = None,
+            allow_partial: bool = False,
+    ) -> Union[List[Dict], pd.DataFrame, None]:
+        """Run a read query on every shard concurrently and merge the results
+        With order_by the query must sort by the same columns (and have the LIMIT too), the
+        sorted shard results are merged instead of sorted again.
+        :param sql_query: the MySQL query, run as is on each shard
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param order_by: column(s) the shard results are sorted by, merged in that order
+        :param descending: the shard results are sorted in descending order
+        :param limit: keep the first limit rows of the merged result
+        :param as_df: merge pandas DataFrames instead of lists of dicts
+        :param shard_column: add a column with the shard name of each row
+        :param shard_names: query these shards only, all of them if None
+        :param allow_partial: merge the results of the shards that answered when some fail,
+                              return None otherwise
+        :return: the merged rows, or None if error
+        """
+        names: List[str] = self._selected_shards(shard_names)
+
+        def fetch(connector: MySQLConnectorPoolNative) -> Union[List[Dict], pd.DataFrame, None]:
+            if as_df:
+                return connector.fetch_all_as_df(sql_query, sql_variables)
+            return connector.fetch_all_as_dicts(sql_query, sql_variables, dictionary=True)
+
+        results: List[Any] = self._scatter(names, fetch)
+        return self._merge_results(names, results, as_df, order_by, descending, limit, shard_column, allow_partial)
+
+    def iter_all_shards(
+            self,
+            sql_query: str,
+            order_by: OrderBy,
+            sql_variables: Optional[Tuple] = None,
+            descending: bool = False,
+            limit: Optional[int] = None,
+            chunk_size: int = 1_000,
+            shard_names: Optional[Sequence[str]] = None,
+    ) -> Iterator[Tuple]:
+        """Stream a sorted query from every shard with unbuffered cursors and merge the rows
+        as they come (k-way merge): memory use depends on chunk_size and the number of shards,
+        not on the size of the results. The queries start on all shards concurrently.
+        Errors are logged and raised.
+        :param sql_query: the MySQL query, sorted by order_by
+        :param order_by: position(s) of the sort columns in the rows, which are tuples as in
+                         fetch_iter
+        :param sql_variables: parameters ordered with %s usage in the sql_query
+        :param descending: the shard results are sorted in descending order
+        :param limit: stop after limit rows, the shard queries are closed early
+        :param chunk_size: number of rows fetched from each shard at a time
+        :param shard_names: query these shards only, all of them if None
+        :return: a generator of tuples
+        """
+        names: List[str] = self._selected_shards(shard_names)
+        streams: List[Iterator[Tuple]] = [
+            self.shards[name].fetch_iter(sql_query, sql_variables, chunk_size=chunk_size) for name in names
+        ]
+        try:
+            # the first next() runs the query, waiting for the sort of each shard concurrently
+            with ThreadPoolExecutor(max_workers=min(self.max_workers or len(names), len(names)),
+                                    thread_name_prefix="mysql_helpers_shards") as executor:
+                first_rows: List[Any] = list(executor.map(lambda stream: next(stream, _END), streams))
+            started_streams: List[Iterator[Tuple]] = [
+                chain([first_row], stream) for first_row, stream in zip(first_rows, streams) if first_row is not _END
+            ]
+            merged: Iterator[Tuple] = merge_sorted(started_streams, order_by, descending)
+            yield from (merged if limit is None else islice(merged, limit))
+        finally:
+            # gives the connections back when the merge stops before the end of a stream
+            for stream in streams:
+                stream.close()
+
+    def close_pool(self):
+        """Close the pool of every shard"""
+        for connector in self.shards.values():
+            connector.close_pool()
+
+
+class MySQLConnectorShardedAsync(_ShardedBase):
+    """MySQLConnectorSharded for asyncio, a pooled MySQLConnectorNativeAsync per shard
+
+        my_sharded = MySQLConnectorShardedAsync.from_configs(shard_configs, pool_size=5)
+        rows = await my_sharded.fetch_all_shards(sql_query, order_by="created_at", limit=100)
+    """
+
+    def __init__(
+            self,
+            shards: Mapping[str, MySQLConnectorNativeAsync],
+            shard_function: Optional[Callable[[Any], str]] = None,
+    ):
+        """
+        :param shards: shard name -> MySQLConnectorNativeAsync of the shard, with a pool_size
+                       so that concurrent queries of one shard run in parallel
+        :param shard_function: returns the name of the shard holding a shard key, see shard()
+        """
+        super().__init__(shards, shard_function)
+
+    @classmethod
+    def from_configs(
+            cls,
+            shard_configs: Mapping[str, Dict[str, Any]],
+            shard_function: Optional[Callable[[Any], str]] = None,
+            pool_size: int = 10,
+            **connector_kwargs,
+    ) -> "MySQLConnectorShardedAsync":
+        """Open a MySQLConnectorNativeAsync pool per shard
+        :param shard_configs: shard name -> db_host, db_port, db_user, db_password, db_name
+                              of the shard, the missing ones are read from the environment
+        :param pool_size: max number of connections of each shard pool
+        :param connector_kwargs: arguments of every MySQLConnectorNativeAsync
+        """
+        return cls(
+            {name: MySQLConnectorNativeAsync(**config, pool_size=pool_size, **connector_kwargs)
+             for name, config in shard_configs.items()},
+            shard_function=shard_function,
+        )
+
+    async def fetch_all_shards(
+            self,
+            sql_query: str,
+            sql_variables: Optional[Tuple] = None,
+            order_by: Optional[OrderBy] = None,
+            descending: bool = False,
+            limit: Optional[int] = None,
+            as_df: bool = False,
+            shard_column: Optional[str] = None,
+            shard_names: Optional[Sequence[str]] = None,
+            allow_partial: bool = False,
+    ) -> Union[List[Dict], pd.DataFrame, None]:
+        """Run a read query on every shard concurrently and merge the results, see
+        MySQLConnectorSharded.fetch_all_shards
+        :return: the merged rows, or None if error
+        """
+        names: List[str] = self._selected_shards(shard_names)
+
+        async def fetch(name: str) -> Union[List[Dict], pd.DataFrame, None]:
+            connector: MySQLConnectorNativeAsync = self.shards[name]
+            try:
+                if as_df:
+                    return await connector.fetch_all_as_df(sql_query, sql_variables)
+                return await connector.fetch_all_as_dicts(sql_query, sql_variables)
+            except Exception as ex:
+                logger.error(f"Error ({ex.__class__.__name__}) on shard {name}: {ex}")
+                return None
+
+        results: List[Any] = list(await asyncio.gather(*(fetch(name) for name in names)))
+        return self._merge_results(names, results, as_df, order_by, descending, limit, shard_column, allow_partial)
+
+    async def iter_all_shards(
+            self,
+            sql_query: str,
+            order_by: OrderBy,
+            sql_variables: Optional[Tuple] = None,
+            descending: bool = False,
+            limit: Optional[int] = None,
+            chunk_size: int = 1_000,
+            shard_names: Optional[Sequence[str]] = None,
+    ) -> AsyncIterator[Dict]:
+        """Stream a sorted query from every shard and merge the rows as they come, see
+        MySQLConnectorSharded.iter_all_shards. Errors are logged and raised.
+        :param order_by: column name(s) the shard results are sorted by, the rows are dicts
+                         as in fetch_iter
+        :return: an async generator of dicts
+        """
+        names: List[str] = self._selected_shards(shard_names)
+        streams: List[AsyncIterator[Dict]] = [
+            self.shards[name].fetch_iter(sql_query, sql_variables, chunk_size=chunk_size) for name in names
+        ]
+        merged: AsyncIterator[Dict] = merge_sorted_async(streams, order_by, descending)
+        rows_yielded: int = 0
+        try:
+            if limit is not None and limit <= 0:
+                return
+            async for row in merged:
+                yield row
+                rows_yielded += 1
+                if limit is not None and rows_yielded >= limit:
+                    break
+        finally:
+            await merged.aclose()
+            for stream in streams:
+                await stream.aclose()
+
+    async def close_pool(self):
+        """Close the pool of every shard"""
+        await asyncio.gather(*(connector.close_pool() for connector in self.shards.values()))
@@ -0,0 +1,236 @@
+""" Per-phase query profiling and slow-query log grouped by query shape"""
+import json
+import logging
+import random
+import re
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+from typing import (Union, Optional, Dict, List, Tuple, Deque, Any, Callable)
+
+from mysql_helpers.mysql_con.query_cache import normalize_sql
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+RE_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+RE_HEX_LITERAL = re.compile(r"\b(?:0x[0-9a-f]+|x'[0-9a-f]*')", re.I)
+RE_NUMBER = re.compile(r"(?<![\w.`])[-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?\b", re.I)
+RE_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+# IN (?, ?, ?) and multi-row VALUES (?, ?), (?, ?) collapse to one shape whatever their length
+RE_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+RE_VALUES_LIST = re.compile(r"\bVALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))*", re.I)
+RE_EXPLAINABLE = re.compile(r"^\s*\(?\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE|TABLE)\b", re.I)
+# max length of the statement written in a slow-query record
+MAX_LOGGED_SQL_LENGTH: int = 4000
+
+PHASES: Tuple[str, ...] = ("checkout", "execute", "fetch", "to_df")
+
+
+def fingerprint_sql(sql_query: str) -> str:
+    """Return the shape of a statement: literals and placeholders replaced by ?,
+    IN lists and multi-row VALUES collapsed, so that its executions are grouped together
+    """
+    sql_query = normalize_sql(sql_query)
+    sql_query = RE_STRING_LITERAL.sub("?", sql_query)
+    sql_query = RE_HEX_LITERAL.sub("?", sql_query)
+    sql_query = RE_PLACEHOLDER.sub("?", sql_query)
+    sql_query = RE_NUMBER.sub("?", sql_query)
+    sql_query = RE_IN_LIST.sub("IN (?+)", sql_query)
+    sql_query = RE_VALUES_LIST.sub("VALUES (?+)", sql_query)
+    return sql_query
+
+
+def is_explainable(sql_query: str) -> bool:
+    return RE_EXPLAINABLE.match(sql_query) is not None
+
+
+class QueryProfile:
+    """Time spent by one call in each phase: connection checkout (or connect), execute,
+    fetch and DataFrame conversion
+    """
+
+    __slots__ = ("sql_query", "sql_variables", "method", "phases", "rows", "error", "started_at")
+
+    def __init__(self, sql_query: str, sql_variables: Any = None, method: str = ""):
+        self.sql_query: str = sql_query
+        self.sql_variables: Any = sql_variables
+        self.method: str = method
+        self.phases: Dict[str, float] = {}
+        self.rows: int = 0
+        self.error: Union[None, str] = None
+        self.started_at: datetime = datetime.now(timezone.utc)
+
+    def add_phase(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_rows(self, rows: int):
+        self.rows += rows
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.phases.values())
+
+
+class SlowQueryLog:
+    """Aggregates query profiles by shape and logs the ones slower than a threshold
+
+    Slow queries are logged as one JSON document per line on the
+    "mysql_helpers:slow_query" logger, with the EXPLAIN FORMAT=JSON plan when
+    capture_explain is set (the connector runs it on a separate connection).
+    Share one instance between connectors to get one log and one set of shapes.
+    """
+
+    def __init__(
+            self,
+            threshold: float = 1.0,
+            sample_rate: float = 1.0,
+            capture_explain: bool = False,
+            log_parameters: bool = False,
+            max_shapes: int = 1000,
+            max_records: int = 100,
+            on_slow_query: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        """
+        :param threshold: seconds above which a query is logged as slow
+        :param sample_rate: share of the calls profiled, from 0 to 1
+        :param capture_explain: add the EXPLAIN FORMAT=JSON plan of the slow queries
+        :param log_parameters: write the query parameters in the slow-query records
+        :param max_shapes: max number of query shapes aggregated, least recent ones are dropped
+        :param max_records: number of slow-query records kept in recent_records
+        :param on_slow_query: called with each slow-query record
+        """
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate must be between 0 and 1, got: {sample_rate}")
+        self.threshold: float = threshold
+        self.sample_rate: float = sample_rate
+        self.capture_explain: bool = capture_explain
+        self.log_parameters: bool = log_parameters
+        self.max_shapes: int = max_shapes
+        self.on_slow_query: Union[None, Callable[[Dict[str, Any]], None]] = on_slow_query
+        self.recent_records: Deque[Dict[str, Any]] = deque(maxlen=max_records)
+        self.slow_logger = logging.getLogger("mysql_helpers:slow_query")
+        # {fingerprint: {"count", "slow_count", "total_seconds", "max_seconds", "rows", phases...}}
+        self._shapes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, sql_query: str, sql_variables: Any = None, method: str = "") -> Union[None, QueryProfile]:
+        """Return a new profile, or None when the call is not sampled"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        return QueryProfile(sql_query=sql_query, sql_variables=sql_variables, method=method)
+
+    def finish(self, profile: QueryProfile) -> bool:
+        """Add a profile to the statistics of its shape
+        :return: True when the query is slow, it is then to be given to report()
+        """
+        fingerprint: str = fingerprint_sql(profile.sql_query)
+        total_seconds: float = profile.total_seconds
+        is_slow: bool = total_seconds >= self.threshold
+        with self._lock:
+            shape = self._shapes.get(fingerprint)
+            if shape is None:
+                shape = {"count": 0, "slow_count": 0, "error_count": 0, "total_seconds": 0.0,
+                         "max_seconds": 0.0, "rows": 0, **{phase: 0.0 for phase in PHASES}}
+                self._shapes[fingerprint] = shape
+                while len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            else:
+                self._shapes.move_to_end(fingerprint)
+            shape["count"] += 1
+            shape["slow_count"] += is_slow
+            shape["error_count"] += profile.error is not None
+            shape["total_seconds"] += total_seconds
+            shape["max_seconds"] = max(shape["max_seconds"], total_seconds)
+            shape["rows"] += profile.rows
+            for phase, seconds in profile.phases.items():
+                shape[phase] = shape.get(phase, 0.0) + seconds
+        return is_slow
+
+    def report(self, profile: QueryProfile, connector: str = "", explain: Any = None) -> Dict[str, Any]:
+        """Log a slow query
+        :param profile: the profile of the slow call
+        :param connector: name of the connector, e.g. host/database
+        :param explain: the EXPLAIN FORMAT=JSON plan or an error message
+        :return: the slow-query record
+        """
+        sql_query: str = normalize_sql(profile.sql_query)
+        record: Dict[str, Any] = {
+            "event": "slow_query",
+            "timestamp": profile.started_at.isoformat(),
+            "connector": connector,
+            "method": profile.method,
+            "fingerprint": fingerprint_sql(profile.sql_query),
+            "sql": sql_query[:MAX_LOGGED_SQL_LENGTH],
+            "total_seconds": round(profile.total_seconds, 6),
+            "phases": {phase: round(seconds, 6) for phase, seconds in profile.phases.items()},
+            "rows": profile.rows,
+            "error": profile.error,
+        }
+        if self.log_parameters:
+            record["sql_variables"] = profile.sql_variables
+        if explain is not None:
+            record["explain"] = explain
+
+        self.recent_records.append(record)
+        self.slow_logger.warning(json.dumps(record, default=str))
+        if self.on_slow_query is not None:
+            try:
+                self.on_slow_query(record)
+            except Exception as ex:
+                logger.error(f"Error in on_slow_query callback: {ex}")
+        return record
+
+    def top_shapes(self, limit: int = 10, order_by: str = "total_seconds") -> List[Dict[str, Any]]:
+        """Return the query shapes with the highest order_by statistic"""
+        with self._lock:
+            shapes = [{"fingerprint": fingerprint, **shape} for fingerprint, shape in self._shapes.items()]
+        shapes.sort(key=lambda shape: shape[order_by], reverse=True)
+        return shapes[:limit]
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            return {
+                "shapes": len(self._shapes),
+                "queries": sum(shape["count"] for shape in self._shapes.values()),
+                "slow_queries": sum(shape["slow_count"] for shape in self._shapes.values()),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+        self.recent_records.clear()
+
+
+def parse_explain(rows: List[Tuple]) -> Any:
+    """Return the plan of EXPLAIN FORMAT=JSON rows as a dict"""
+    if not rows:
+        return None
+    plan = rows[0][0]
+    if isinstance(plan, (bytes, bytearray)):
+        plan = plan.decode("utf-8")
+    try:
+        return json.loads(plan)
+    except (TypeError, ValueError):
+        return plan
+
+
+class PhaseTimer:
+    """Context manager adding its duration to a phase of a profile, no-op without profile"""
+
+    __slots__ = ("profile", "phase", "started")
+
+    def __init__(self, profile: Optional[QueryProfile], phase: str):
+        self.profile: Union[None, QueryProfile] = profile
+        self.phase: str = phase
+        self.started: float = 0.0
+
+    def __enter__(self) -> "PhaseTimer":
+        if self.profile is not None:
+            self.started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profile is not None:
+            self.profile.add_phase(self.phase, perf_counter() - self.started)
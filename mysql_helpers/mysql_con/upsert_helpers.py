@@ -0,0 +1,177 @@
+""" Helpers to upsert pandas DataFrames with multi-row INSERT ... ON DUPLICATE KEY UPDATE"""
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+from typing import (Optional, List, Tuple, Dict, Sequence, Any)
+
+from mysql_helpers.mysql_con.batch_helpers import PACKET_SAFETY_RATIO
+from mysql_helpers.mysql_con.lazy_imports import LazyModule
+from mysql_helpers.mysql_con.load_data_helpers import DATETIME_FORMAT, quote_identifier
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+# escaping of string literals with the default sql_mode (backslash escapes enabled)
+STRING_ESCAPES: Dict[int, str] = {
+    ord("\\"): "\\\\", ord("'"): "\\'", ord("\0"): "\\0",
+    ord("\n"): "\\n", ord("\r"): "\\r", ord("\x1a"): "\\Z",
+}
+# counts the rows that hit a duplicate key: the info message giving it ("Records: 3
+# Duplicates: 1") is not returned by the C extension, and only to the upserting session
+DUPLICATES_VARIABLE: str = "@mysql_helpers_upsert_duplicates"
+RESET_DUPLICATES_QUERY: str = f"SET {DUPLICATES_VARIABLE} = 0"
+READ_DUPLICATES_QUERY: str = f"SELECT {DUPLICATES_VARIABLE}"
+
+
+def build_upsert_query(
+        table: str,
+        columns: Sequence[str],
+        key_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None,
+) -> Tuple[str, str]:
+    """Return the statement parts written before and after the VALUES rows
+    :param table: the table name, can be prefixed by the schema name
+    :param columns: the inserted columns, in order
+    :param key_columns: the columns of the unique key the duplicates are detected on
+    :param update_columns: the columns overwritten on duplicates, all but the keys if None,
+                           none if empty: existing rows are then left unchanged
+    """
+    if not key_columns:
+        raise ValueError("key_columns must name the columns of a unique key")
+    missing_columns: List[str] = [column for column in key_columns if column not in columns]
+    if update_columns is None:
+        update_columns = [column for column in columns if column not in key_columns]
+    else:
+        missing_columns += [column for column in update_columns if column not in columns]
+    if missing_columns:
+        raise ValueError(f"Columns not in the DataFrame: {missing_columns}")
+
+    column_list: str = ", ".join(quote_identifier(column) for column in columns)
+    if update_columns:
+        new_values: List[str] = [f"VALUES({quote_identifier(column)})" for column in update_columns]
+    else:
+        update_columns = key_columns[:1]
+        new_values = [quote_identifier(key_columns[0])]
+    # the first assignment is evaluated once per duplicate row, changed or not
+    new_values[0] = f"IF(({DUPLICATES_VARIABLE} := {DUPLICATES_VARIABLE} + 1) IS NULL, NULL, {new_values[0]})"
+    assignments: str = ", ".join(f"{quote_identifier(column)} = {new_value}"
+                                 for column, new_value in zip(update_columns, new_values))
+    return (f"INSERT INTO {quote_identifier(table)} ({column_list}) VALUES ",
+            f" ON DUPLICATE KEY UPDATE {assignments}")
+
+
+def _timedelta_literal(value: datetime.timedelta) -> str:
+    total_microseconds: int = (value.days * 86_400 + value.seconds) * 1_000_000 + value.microseconds
+    sign: str = "-" if total_microseconds < 0 else ""
+    seconds, microseconds = divmod(abs(total_microseconds), 1_000_000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"'{sign}{hours:02d}:{minutes:02d}:{seconds:02d}.{microseconds:06d}'"
+
+
+def scalar_literal(value: Any) -> str:
+    """Render one value as a MySQL literal, used for the columns of mixed types"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return "NULL"
+    if isinstance(value, (bool, np.bool_)):
+        return "1" if value else "0"
+    if isinstance(value, (int, np.integer, Decimal)):
+        return str(value)
+    if isinstance(value, (float, np.floating)):
+        if value in (float("inf"), float("-inf")):
+            raise ValueError(f"Infinite values can not be stored in MySQL, got: {value}")
+        return repr(float(value))
+    if isinstance(value, (bytes, bytearray)):
+        return f"X'{bytes(value).hex()}'"
+    if isinstance(value, datetime.datetime):
+        return f"'{value.strftime(DATETIME_FORMAT)}'"
+    if isinstance(value, datetime.date):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, datetime.timedelta):
+        return _timedelta_literal(value)
+    return f"'{str(value).translate(STRING_ESCAPES)}'"
+
+
+def sql_literals(column: pd.Series) -> np.ndarray:
+    """Render a DataFrame column as MySQL literals, column-wise for the typed columns
+    :return: an object array of SQL literals, NULL for None, NaN and NaT
+    """
+    null_mask = column.isna().to_numpy()
+    if pd.api.types.is_bool_dtype(column):
+        literals = np.where(column.fillna(False).to_numpy(dtype=bool), "1", "0").astype(object)
+    elif pd.api.types.is_integer_dtype(column):
+        literals = column.astype(str).to_numpy(dtype=object)
+    elif pd.api.types.is_float_dtype(column):
+        if np.isinf(column.to_numpy(dtype=np.float64, na_value=np.nan)).any():
+            raise ValueError(f"Infinite values can not be stored in MySQL, column: {column.name}")
+        literals = column.astype(str).to_numpy(dtype=object)
+    elif pd.api.types.is_datetime64_any_dtype(column):
+        literals = ("'" + column.dt.strftime(DATETIME_FORMAT) + "'").to_numpy(dtype=object)
+    elif pd.api.types.infer_dtype(column, skipna=True) in ("string", "empty"):
+        escaped = column.astype(object).where(~null_mask, "").astype(str).str.translate(STRING_ESCAPES)
+        literals = ("'" + escaped + "'").to_numpy(dtype=object)
+    else:
+        # mixed, bytes, decimal, date or timedelta values
+        literals = column.map(scalar_literal, na_action="ignore").to_numpy(dtype=object)
+    literals[null_mask] = "NULL"
+    return literals
+
+
+def df_to_sql_values(df: pd.DataFrame) -> np.ndarray:
+    """Render each row of a DataFrame as a "(value, ...)" VALUES tuple, built column by column
+    :return: an object array of one string per row
+    """
+    rendered = None
+    for _, column in df.items():
+        literals = sql_literals(column)
+        rendered = literals if rendered is None else rendered + "," + literals
+    return "(" + rendered + ")"
+
+
+def split_values(
+        values: np.ndarray,
+        max_allowed_packet: int,
+        statement_size: int,
+        batch_size: int,
+) -> List[Tuple[int, int]]:
+    """Split the rendered rows into batches of at most batch_size rows whose statement fits
+    in max_allowed_packet
+    :param values: the rows returned by df_to_sql_values
+    :param max_allowed_packet: the server max_allowed_packet in bytes
+    :param statement_size: size of the statement without its rows
+    :param batch_size: max number of rows per batch
+    :return: (first row, last row excluded) pairs, in order
+    """
+    if batch_size <= 0:
+        raise ValueError(f"batch_size must be a positive integer, got: {batch_size}")
+    if len(values) == 0:
+        return []
+
+    max_batch_bytes: int = int(max_allowed_packet * PACKET_SAFETY_RATIO) - statement_size
+    row_bytes = pd.Series(values).str.encode("utf-8").str.len().to_numpy() + 1  # comma between rows
+    ends = np.cumsum(row_bytes)
+    bounds: List[Tuple[int, int]] = []
+    start: int = 0
+    batch_offset: int = 0
+    while start < len(values):
+        end: int = int(np.searchsorted(ends, batch_offset + max_batch_bytes, side="right"))
+        end = min(max(end, start + 1), start + batch_size)
+        bounds.append((start, end))
+        batch_offset = int(ends[end - 1])
+        start = end
+    return bounds
+
+
+def upsert_counts(rows: int, affected_rows: int, duplicates: int) -> Dict[str, int]:
+    """Split the result of one INSERT ... ON DUPLICATE KEY UPDATE into inserted, updated and
+    unchanged rows: affected rows count 1 per inserted row and 2 per updated one
+    (CLIENT_FOUND_ROWS unset, the connector default)
+    :param rows: the number of rows of the statement
+    :param affected_rows: the affected rows of the statement
+    :param duplicates: the rows of the statement that hit a duplicate key, the increase of
+                       DUPLICATES_VARIABLE
+    """
+    inserted: int = rows - duplicates
+    updated: int = max(0, (affected_rows - inserted) // 2)
+    return {"inserted": inserted, "updated": updated, "unchanged": duplicates - updated}
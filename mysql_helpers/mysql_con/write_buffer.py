@@ -0,0 +1,188 @@
+""" asyncio write-behind buffer coalescing single-row writes into multi-row statements"""
+import asyncio
+import logging
+from pathlib import Path
+from typing import (Union, Optional, Dict, List, Tuple, Sequence, Any, Callable, Awaitable)
+
+logger = logging.getLogger(f"mysql_helpers:{Path(__file__).name}")
+
+
+class AsyncWriteBuffer:
+    """Queue of single-row writes flushed by a background task
+
+    Rows are grouped by statement and each group is written as multi-row INSERTs in one
+    transaction, when max_batch_rows rows are queued or flush_interval seconds after the
+    first row of the batch. enqueue waits while max_queue_size rows are pending and returns
+    a future resolved once the row is committed, or failed with the error of its group.
+
+        async with my_connector.write_behind(max_batch_rows=500) as buffer:
+            acknowledgement = await buffer.enqueue(sql_query, sql_variables)
+            await acknowledgement  # optional: the row is committed
+
+    Rows of one statement are written in order, rows of different statements may not be.
+    """
+
+    def __init__(
+            self,
+            write_rows: Callable[[Any, str, List[Sequence[Any]]], Awaitable[int]],
+            acquire: Callable[[], Awaitable[Any]],
+            release: Callable[[Any], Awaitable[None]],
+            max_batch_rows: int = 1000,
+            flush_interval: float = 0.5,
+            max_queue_size: int = 10_000,
+    ):
+        """
+        :param write_rows: writes and commits the rows of one statement on a connection,
+                           raises on error
+        :param acquire: returns the connection a flush runs on
+        :param release: gives back or closes the connection of a flush
+        :param max_batch_rows: rows flushed at most at once, a flush starts when reached
+        :param flush_interval: max seconds a row waits in the buffer before its flush starts
+        :param max_queue_size: rows queued at most, enqueue waits above
+        """
+        if max_batch_rows <= 0 or max_queue_size <= 0:
+            raise ValueError(f"Invalid buffer sizes: max_batch_rows={max_batch_rows}, "
+                             f"max_queue_size={max_queue_size}")
+
+        self.write_rows: Callable[[Any, str, List[Sequence[Any]]], Awaitable[int]] = write_rows
+        self.acquire: Callable[[], Awaitable[Any]] = acquire
+        self.release: Callable[[Any], Awaitable[None]] = release
+        self.max_batch_rows: int = max_batch_rows
+        self.flush_interval: float = flush_interval
+        self.max_queue_size: int = max_queue_size
+
+        self.rows_written: int = 0
+        self.rows_failed: int = 0
+        self.flushes: int = 0
+        # created on start, in the running event loop
+        self._queue: Union[None, asyncio.Queue] = None
+        self._task: Union[None, asyncio.Task] = None
+        self._closing: bool = False
+
+    @property
+    def pending_rows(self) -> int:
+        """Rows queued and not flushed yet"""
+        return 0 if self._queue is None else self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending_rows": self.pending_rows,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "flushes": self.flushes,
+        }
+
+    async def start(self) -> "AsyncWriteBuffer":
+        """Start the background flush task, done by the first enqueue if not called"""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def enqueue(self, sql_query: str, sql_variables: Optional[Sequence[Any]] = None) -> asyncio.Future:
+        """Queue one row, waiting while the queue is full
+        :param sql_query: the statement, with %s placeholders for one row
+        :param sql_variables: parameters of the row
+        :return: a future resolved with None once the row is committed, or with its error
+        """
+        if self._closing:
+            raise RuntimeError("The write buffer is closed")
+        await self.start()
+        acknowledgement: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sql_query, tuple(sql_variables or ()), acknowledgement))
+        return acknowledgement
+
+    async def write(self, sql_query: str, sql_variables: Optional[Sequence[Any]] = None):
+        """Queue one row and wait until it is committed, errors are raised"""
+        await (await self.enqueue(sql_query, sql_variables))
+
+    async def flush(self):
+        """Wait until all the rows queued so far are written"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        """Stop accepting rows, flush the queued ones and stop the background task"""
+        self._closing = True
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def __aenter__(self) -> "AsyncWriteBuffer":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items: List[Tuple[str, Tuple, asyncio.Future]] = [await self._queue.get()]
+            deadline: float = loop.time() + self.flush_interval
+            while len(items) < self.max_batch_rows:
+                if not self._queue.empty():
+                    items.append(self._queue.get_nowait())
+                    continue
+                timeout: float = deadline - loop.time()
+                if timeout <= 0 or self._closing:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush_items(items)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def _flush_items(self, items: List[Tuple[str, Tuple, asyncio.Future]]):
+        groups: Dict[str, List[Tuple[Tuple, asyncio.Future]]] = {}
+        for sql_query, sql_variables, acknowledgement in items:
+            groups.setdefault(sql_query, []).append((sql_variables, acknowledgement))
+        self.flushes += 1
+
+        try:
+            connection = await self.acquire()
+        except Exception as ex:
+            logger.error(f"Error while getting a connection to flush {len(items)} buffered rows: {ex}")
+            for entries in groups.values():
+                self._fail(entries, ex)
+            return
+
+        try:
+            for sql_query, entries in groups.items():
+                try:
+                    await self.write_rows(connection, sql_query, [sql_variables for sql_variables, _ in entries])
+                except Exception as ex:
+                    logger.error(
+                        f"Error while flushing buffered rows: {ex} - "
+                        f"SQL statement used: {sql_query} - "
+                        f"Rows: {len(entries)}"
+                    )
+                    self._fail(entries, ex)
+                else:
+                    self.rows_written += len(entries)
+                    for _, acknowledgement in entries:
+                        if not acknowledgement.done():
+                            acknowledgement.set_result(None)
+        finally:
+            try:
+                await self.release(connection)
+            except Exception as ex:
+                logger.debug(f"Error while releasing the flush connection: {ex}")
+
+    def _fail(self, entries: List[Tuple[Tuple, asyncio.Future]], ex: Exception):
+        self.rows_failed += len(entries)
+        for _, acknowledgement in entries:
+            if not acknowledgement.done():
+                acknowledgement.set_exception(ex)
+                # the error is logged already: no "exception never retrieved" warning when
+                # the caller does not await the acknowledgement
+                acknowledgement.exception()
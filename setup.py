@@ -18,7 +18,13 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    install_requires=["mysql-connector-python", "python-dotenv", "pandas"],
+    install_requires=["mysql-connector-python", "python-dotenv"],
+    # the DataFrame methods import pandas on first use: pip install mysql_helpers[pandas]
+    extras_require={
+        "pandas": ["pandas"],
+        "arrow": ["pyarrow"],
+        "polars": ["polars", "pyarrow"],
+    },
     tests_require=["pytest", "pytest-asyncio"],
     python_requires=">=3.9",
 )
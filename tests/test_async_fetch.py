@@ -31,6 +31,54 @@ async def test_mysql_async_fetch_as_df():
     assert len(result_df) > 0
 
 
+@pytest.mark.asyncio
+async def test_mysql_async_pool_gather():
+    load_dotenv()
+
+    my_getter = MySQLConnectorNativeAsync(pool_size=5, pool_min_size=2)
+
+    sql_query = """SELECT SLEEP(0.1) AS slept, CONNECTION_ID() AS connection_id"""
+    # a call keeping its connection does not make the next calls share it
+    await my_getter.fetch_all_as_dicts(sql_query=sql_query, close_connection=False)
+    results = await asyncio.gather(
+        *[my_getter.fetch_all_as_dicts(sql_query=sql_query) for _ in range(10)]
+    )
+    assert my_getter.mysql_pool.in_use_count == 0
+    await my_getter.close_pool()
+
+    assert all(len(result) == 1 for result in results)
+    # queries ran on several pooled connections, and never more than pool_size of them
+    assert 1 < len({result[0]["connection_id"] for result in results}) <= 5
+
+
+def test_mysql_async_pool_new_event_loop():
+    load_dotenv()
+
+    my_getter = MySQLConnectorNativeAsync(pool_size=2)
+    # each asyncio.run has its own event loop, the pool starts over in the second one
+    for _ in range(2):
+        result = asyncio.run(my_getter.fetch_all_as_dicts(sql_query="SELECT 1 AS one"))
+        assert result == [{"one": 1}]
+
+
+@pytest.mark.asyncio
+async def test_mysql_async_fetch_chunks():
+    load_dotenv()
+
+    my_getter = MySQLConnectorNativeAsync()
+
+    sql_query = """
+    WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 50)
+    SELECT a.n + 50 * (b.n - 1) AS n FROM seq a CROSS JOIN seq b ORDER BY n
+    """
+    chunk_sizes = [len(chunk) async for chunk in my_getter.fetch_chunks(sql_query=sql_query,
+                                                                         chunk_size=1000)]
+    assert chunk_sizes == [1000, 1000, 500]
+
+    rows = [row async for row in my_getter.fetch_iter(sql_query=sql_query, chunk_size=1000)]
+    assert rows[-1]["n"] == 2500
+
+
 if __name__ == '__main__':
     loop = asyncio.get_event_loop()
     loop.run_until_complete(
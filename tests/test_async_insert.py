@@ -63,8 +63,122 @@ async def test_insert_in_temp_table():
     assert result[0]["count"] == nbr_records
 
 
+@pytest.mark.asyncio
+async def test_execute_many_in_temp_table():
+    load_dotenv()
+
+    table_upper = MySQLConnectorNativeAsync()
+    sql_query: str = f"""
+            CREATE TEMPORARY TABLE `{TEST_TABLE_NAME}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+                `proxy_port` varchar(5) NOT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+    await table_upper.execute_one_query(sql_query=sql_query, close_connection=False)
+
+    sql_query = f""" INSERT INTO {TEST_TABLE_NAME} (proxy_url, proxy_port)
+                    VALUES (%s, %s)
+                """
+    nbr_records: int = 5_000
+    rows = [(f"https:\\www.example{n}.com", str(randint(1, 5000))) for n in range(nbr_records)]
+    result = await table_upper.execute_many(
+        sql_query=sql_query, rows=rows, batch_size=1_000, close_connection=False
+    )
+    assert result == nbr_records
+
+    sql_query = f""" SELECT COUNT(*) as count
+                FROM {TEST_TABLE_NAME}
+                """
+    result = await table_upper.fetch_all_as_dicts(sql_query=sql_query,
+                                                  close_connection=True)
+    assert result[0]["count"] == nbr_records
+
+
+@pytest.mark.asyncio
+async def test_transaction_in_temp_table():
+    load_dotenv()
+
+    table_upper = MySQLConnectorNativeAsync()
+    sql_query: str = f"""
+            CREATE TEMPORARY TABLE `{TEST_TABLE_NAME}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+    await table_upper.execute_one_query(sql_query=sql_query, close_connection=False)
+
+    insert_query: str = f"INSERT INTO {TEST_TABLE_NAME} (proxy_url) VALUES (%s)"
+    count_query: str = f"SELECT COUNT(*) as count FROM {TEST_TABLE_NAME}"
+
+    async with table_upper.transaction(close_connection=False):
+        await table_upper.execute_one_query(sql_query=insert_query, sql_variables=("a",))
+        with pytest.raises(ValueError):
+            async with table_upper.transaction():
+                await table_upper.execute_one_query(sql_query=insert_query, sql_variables=("b",))
+                raise ValueError("rollback to savepoint")
+    result = await table_upper.fetch_all_as_dicts(sql_query=count_query, close_connection=False)
+    assert result[0]["count"] == 1
+
+    with pytest.raises(ValueError):
+        async with table_upper.transaction(close_connection=False):
+            await table_upper.execute_one_query(sql_query=insert_query, sql_variables=("c",))
+            raise ValueError("rollback")
+    result = await table_upper.fetch_all_as_dicts(sql_query=count_query, close_connection=True)
+    assert result[0]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_write_behind_buffer():
+    load_dotenv()
+
+    # the buffer flushes on its own connections: a temporary table would not be visible
+    table_upper = MySQLConnectorNativeAsync()
+    table_name: str = "pytest_write_behind"
+    await table_upper.execute_one_query(sql_query=f"DROP TABLE IF EXISTS {table_name}",
+                                        close_connection=False)
+    await table_upper.execute_one_query(sql_query=f"""
+            CREATE TABLE `{table_name}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """, close_connection=False)
+    try:
+        insert_query: str = f"INSERT INTO {table_name} (proxy_url) VALUES (%s)"
+        nbr_records: int = 500
+        async with table_upper.write_behind(max_batch_rows=100, flush_interval=0.05,
+                                            max_queue_size=50) as buffer:
+            async def scrape(worker: int):
+                for n in range(nbr_records // 5):
+                    await buffer.enqueue(sql_query=insert_query,
+                                         sql_variables=(f"https:\\www.example{worker}-{n}.com",))
+
+            await asyncio.gather(*(scrape(worker) for worker in range(5)))
+            await buffer.write(sql_query=insert_query, sql_variables=("https:\\www.example.com",))
+        assert buffer.stats()["rows_written"] == nbr_records + 1
+        assert buffer.stats()["flushes"] < nbr_records
+
+        result = await table_upper.fetch_all_as_dicts(sql_query=f"SELECT COUNT(*) as count FROM {table_name}",
+                                                      close_connection=False)
+        assert result[0]["count"] == nbr_records + 1
+    finally:
+        await table_upper.execute_one_query(sql_query=f"DROP TABLE IF EXISTS {table_name}")
+
+
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
     loop.run_until_complete(
         test_insert_in_temp_table()
     )
+    loop.run_until_complete(
+        test_execute_many_in_temp_table()
+    )
+    loop.run_until_complete(
+        test_transaction_in_temp_table()
+    )
+    loop.run_until_complete(
+        test_write_behind_buffer()
+    )
@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from dotenv import load_dotenv
 
 from mysql_helpers.mysql_con.mysql_pool_sync import MySQLConnectorPoolNative
@@ -24,6 +26,63 @@ def test_fetch_as_dicts():
     assert len(results) > 0
 
 
+def test_fetch_chunks():
+    load_dotenv()
+    my_getter = MySQLConnectorPoolNative(pool_size=2)
+    mysql_query = """
+    WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 50)
+    SELECT a.n + 50 * (b.n - 1) AS n FROM seq a CROSS JOIN seq b ORDER BY n
+    """
+
+    chunk_sizes = [len(chunk) for chunk in my_getter.fetch_chunks(sql_query=mysql_query,
+                                                                   chunk_size=1000,
+                                                                   as_df=True)]
+    assert chunk_sizes == [1000, 1000, 500]
+
+    rows = list(my_getter.fetch_iter(sql_query=mysql_query, chunk_size=1000))
+    assert rows[-1][0] == 2500
+
+
+def test_fetch_with_pool_overflow():
+    load_dotenv()
+    my_getter = MySQLConnectorPoolNative(pool_size=2, pool_max_overflow=2, pool_acquire_timeout=30)
+    mysql_query = """
+    SELECT SLEEP(0.1) AS slept, CONNECTION_ID() AS connection_id;
+    """
+
+    # more threads than connections: they wait for a free one instead of failing
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        results = list(executor.map(
+            lambda _: my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=True),
+            range(24),
+        ))
+    assert all(result is not None for result in results)
+    assert len({result[0][1] for result in results}) <= 4
+    assert my_getter.mysql_pool.size <= 4
+    assert my_getter.mysql_pool.in_use_count == 0
+    my_getter.close_pool()
+
+
+def test_fetch_many():
+    load_dotenv()
+    my_getter = MySQLConnectorPoolNative(pool_size=2, pool_max_overflow=2)
+    queries = [("SELECT %s AS n, SLEEP(0.1) AS slept", (n,)) for n in range(6)]
+    queries.insert(3, ("SELECT * FROM a_table_that_does_not_exist", None))
+
+    results = my_getter.fetch_many(queries, max_workers=4)
+    assert len(results) == 7
+    assert results[3] is None
+    assert [result[0]["n"] for result in results if result is not None] == list(range(6))
+
+    results_df = my_getter.fetch_many(queries[:2], as_df=True)
+    assert list(results_df[1]["n"]) == [1]
+    assert my_getter.mysql_pool.in_use_count == 0
+    my_getter.close_pool()
+
+
 if __name__ == "__main__":
     test_fetch_as_def()
     test_fetch_as_dicts()
+    test_fetch_chunks()
+    test_fetch_with_pool_overflow()
+    test_fetch_many()
@@ -65,5 +65,89 @@ def test_insert_in_temp_table():
     assert result[0][0] == nbr_records
 
 
+def test_execute_many_in_temp_table():
+    load_dotenv()
+
+    table_upper = MySQLConnectorPoolNative(pool_size=2)
+    sql_query: str = f"""
+            CREATE TEMPORARY TABLE `{TEST_TABLE_NAME}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+                `proxy_port` varchar(5) NOT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+    connection_name = "test_execute_many"
+    table_upper.execute_one_query(
+        sql_query=sql_query,
+        close_connection=False,
+        connection_name=connection_name
+    )
+
+    sql_query = f""" INSERT INTO {TEST_TABLE_NAME} (proxy_url, proxy_port)
+                    VALUES (%s, %s)
+                """
+    nbr_records: int = 5_000
+    rows = [(f"https:\\www.example{n}.com", str(randint(1, 5000))) for n in range(nbr_records)]
+    result = table_upper.execute_many(
+        sql_query=sql_query,
+        rows=rows,
+        batch_size=1_000,
+        close_connection=False,
+        connection_name=connection_name,
+    )
+    assert result == nbr_records
+
+    sql_query = f""" SELECT COUNT(*) 
+                FROM {TEST_TABLE_NAME}
+                """
+    result = table_upper.fetch_all_as_dicts(
+        sql_query=sql_query, close_connection=True, connection_name=connection_name
+    )
+    assert result[0][0] == nbr_records
+
+
+def test_read_table_parallel():
+    load_dotenv()
+
+    table_upper = MySQLConnectorPoolNative(pool_size=4)
+    # temporary tables are not visible from the other pooled connections
+    table_name: str = "pytest_parallel_read"
+    table_upper.execute_one_query(sql_query=f"DROP TABLE IF EXISTS `{table_name}`")
+    table_upper.execute_one_query(sql_query=f"""
+            CREATE TABLE `{table_name}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """)
+    try:
+        nbr_records: int = 1_000
+        table_upper.execute_many(
+            sql_query=f"INSERT INTO {table_name} (proxy_url) VALUES (%s)",
+            rows=[(f"https:\\www.example{n}.com",) for n in range(nbr_records)],
+        )
+
+        result_df = table_upper.read_table_parallel(table=table_name,
+                                                    partition_column="proxy_id",
+                                                    num_partitions=6)
+        assert len(result_df) == nbr_records
+        assert result_df["proxy_id"].is_unique
+        assert list(result_df.columns) == ["proxy_id", "proxy_url"]
+
+        result_df = table_upper.read_table_parallel(table=table_name,
+                                                    partition_column="proxy_id",
+                                                    num_partitions=3,
+                                                    columns=["proxy_url"],
+                                                    where="proxy_id <= %s",
+                                                    sql_variables=(100,))
+        assert len(result_df) == 100
+    finally:
+        table_upper.execute_one_query(sql_query=f"DROP TABLE IF EXISTS `{table_name}`")
+        table_upper.close_pool()
+
+
 if __name__ == "__main__":
     test_insert_in_temp_table()
+    test_execute_many_in_temp_table()
+    test_read_table_parallel()
@@ -0,0 +1,74 @@
+import asyncio
+from os import environ
+
+import pytest
+from dotenv import load_dotenv
+
+from mysql_helpers.mysql_con.mysql_async import MySQLConnectorNativeAsync
+from mysql_helpers.mysql_con.mysql_pool_sync import MySQLConnectorPoolNative
+from mysql_helpers.mysql_con.replica_router import MySQLConnectorRouter, MySQLConnectorRouterAsync
+
+
+def replica_address():
+    """A second mysqld, e.g. started on another port, given by MYSQL_REPLICA_DB_HOST/PORT
+    It needs not replicate the primary: a server that is not a replica is kept healthy
+    """
+    load_dotenv()
+    if not environ.get("MYSQL_REPLICA_DB_HOST") or not environ.get("MYSQL_REPLICA_DB_PORT"):
+        pytest.skip("MYSQL_REPLICA_DB_HOST and MYSQL_REPLICA_DB_PORT are not set")
+    return environ["MYSQL_REPLICA_DB_HOST"], environ["MYSQL_REPLICA_DB_PORT"]
+
+
+def test_router_reads_on_replica_writes_on_primary():
+    replica_host, replica_port = replica_address()
+    my_router = MySQLConnectorRouter(
+        MySQLConnectorPoolNative(pool_size=2),
+        [MySQLConnectorPoolNative(db_host=replica_host, db_port=replica_port, pool_size=2)],
+        read_your_writes=True,
+    )
+    port_query = "SELECT @@port AS port"
+    primary_port = my_router.primary.fetch_all_as_dicts(port_query, dictionary=True)[0]["port"]
+
+    assert my_router.fetch_all_as_dicts(port_query, dictionary=True)[0]["port"] == int(replica_port)
+    with my_router.session():
+        my_router.execute_one_query("DO 1")
+        assert my_router.fetch_all_as_dicts(port_query, dictionary=True)[0]["port"] == primary_port
+    assert my_router.fetch_all_as_dicts(port_query, dictionary=True)[0]["port"] == int(replica_port)
+
+    with my_router.transaction():
+        assert my_router.fetch_all_as_dicts(port_query, dictionary=True)[0]["port"] == primary_port
+    assert my_router.stats()["replicas"][0]["outstanding"] == 0
+
+
+def test_router_ejects_unreachable_replica():
+    replica_host, replica_port = replica_address()
+    my_router = MySQLConnectorRouter(
+        MySQLConnectorPoolNative(pool_size=2),
+        [MySQLConnectorPoolNative(db_host=replica_host, db_port=replica_port, pool_size=2),
+         MySQLConnectorPoolNative(db_host="127.0.0.1", db_port=1, pool_size=1)],
+    )
+
+    replica_states = my_router.check_replicas()
+    assert [state["healthy"] for state in replica_states] == [True, False]
+    results = [my_router.fetch_all_as_dicts("SELECT @@port AS port", dictionary=True) for _ in range(4)]
+    assert all(result[0]["port"] == int(replica_port) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_router_async_least_outstanding():
+    replica_host, replica_port = replica_address()
+    my_router = MySQLConnectorRouterAsync(
+        MySQLConnectorNativeAsync(pool_size=2),
+        [MySQLConnectorNativeAsync(db_host=replica_host, db_port=replica_port, pool_size=4),
+         MySQLConnectorNativeAsync(pool_size=4)],
+    )
+
+    results = await asyncio.gather(*(my_router.fetch_all_as_dicts("SELECT SLEEP(0.1) AS slept")
+                                     for _ in range(8)))
+    assert len(results) == 8
+    assert [state["reads"] for state in my_router.stats()["replicas"]] == [4, 4]
+
+
+if __name__ == "__main__":
+    test_router_reads_on_replica_writes_on_primary()
+    test_router_ejects_unreachable_replica()
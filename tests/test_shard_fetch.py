@@ -0,0 +1,46 @@
+import pytest
+from dotenv import load_dotenv
+
+from mysql_helpers.mysql_con.shard_router import MySQLConnectorSharded, MySQLConnectorShardedAsync
+
+# both shards use the database of the .env file, each one returns the whole sequence
+SEQUENCE_QUERY = """
+WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 100)
+SELECT n FROM seq ORDER BY n DESC
+"""
+
+
+def test_sharded_fetch_all_shards():
+    load_dotenv()
+    my_sharded = MySQLConnectorSharded.from_configs({"shard_1": {}, "shard_2": {}}, pool_size=2)
+    assert my_sharded.shard_name("customer-42") == my_sharded.shard_name("customer-42")
+
+    rows = my_sharded.fetch_all_shards(SEQUENCE_QUERY, order_by="n", descending=True, limit=5,
+                                       shard_column="shard")
+    assert [row["n"] for row in rows] == [100, 100, 99, 99, 98]
+    assert {row["shard"] for row in rows} == {"shard_1", "shard_2"}
+
+    result_df = my_sharded.fetch_all_shards(SEQUENCE_QUERY, order_by="n", descending=True, as_df=True)
+    assert len(result_df) == 200
+
+    streamed = list(my_sharded.iter_all_shards(SEQUENCE_QUERY, order_by=0, descending=True, limit=3,
+                                               chunk_size=10))
+    assert [row[0] for row in streamed] == [100, 100, 99]
+    my_sharded.close_pool()
+
+
+@pytest.mark.asyncio
+async def test_sharded_async_iter_all_shards():
+    load_dotenv()
+    my_sharded = MySQLConnectorShardedAsync.from_configs({"shard_1": {}, "shard_2": {}}, pool_size=2)
+
+    streamed = [row["n"] async for row in my_sharded.iter_all_shards(SEQUENCE_QUERY, order_by="n",
+                                                                      descending=True, limit=4)]
+    assert streamed == [100, 100, 99, 99]
+    rows = await my_sharded.fetch_all_shards(SEQUENCE_QUERY, order_by="n", descending=True)
+    assert len(rows) == 200
+    await my_sharded.close_pool()
+
+
+if __name__ == "__main__":
+    test_sharded_fetch_all_shards()
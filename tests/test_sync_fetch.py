@@ -1,6 +1,15 @@
+import pickle
+import subprocess
+import sys
+
+import pytest
 from dotenv import load_dotenv
 
+from mysql_helpers.mysql_con.engine_helpers import c_extension_available
+from mysql_helpers.mysql_con.keyset_helpers import page_last_key
 from mysql_helpers.mysql_con.mysql_sync import MySQLConnectorNative
+from mysql_helpers.mysql_con.query_cache import QueryResultCache
+from mysql_helpers.mysql_con.slow_query_log import SlowQueryLog
 
 load_dotenv()
 
@@ -24,6 +33,279 @@ def test_fetch_as_dicts():
     assert len(results) > 0
 
 
+def test_fetch_chunks():
+    my_getter = MySQLConnectorNative()
+    mysql_query = """
+    WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 50)
+    SELECT a.n + 50 * (b.n - 1) AS n FROM seq a CROSS JOIN seq b ORDER BY n
+    """
+
+    chunk_sizes = [len(chunk) for chunk in my_getter.fetch_chunks(sql_query=mysql_query,
+                                                                   chunk_size=1000)]
+    assert chunk_sizes == [1000, 1000, 500]
+
+    rows = list(my_getter.fetch_iter(sql_query=mysql_query, chunk_size=1000))
+    assert rows[-1]["n"] == 2500
+
+
+def test_fetch_prepared_statements():
+    my_getter = MySQLConnectorNative(use_prepared_statements=True, prepared_cache_size=2)
+    mysql_query = """
+    SELECT %s + 1 AS next_value
+    """
+
+    for n in range(10):
+        results = my_getter.fetch_all_as_dicts(sql_query=mysql_query,
+                                               sql_variables=(n,),
+                                               close_connection=False)
+        assert results[0]["next_value"] == n + 1
+    my_getter.close_connection()
+
+    stats = my_getter.prepared_statements_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 9
+
+
+def test_fetch_result_cache():
+    my_getter = MySQLConnectorNative(result_cache=QueryResultCache(default_ttl=60))
+    my_getter.execute_one_query(
+        sql_query="CREATE TEMPORARY TABLE pytest_cache_1 (`value` int NOT NULL)",
+        close_connection=False,
+    )
+    my_getter.execute_one_query(sql_query="INSERT INTO pytest_cache_1 VALUES (1)",
+                                close_connection=False)
+    mysql_query = """
+    SELECT COUNT(*) AS count FROM pytest_cache_1
+    """
+
+    assert my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=False)[0]["count"] == 1
+    assert my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=False)[0]["count"] == 1
+    assert my_getter.result_cache_stats()["hits"] == 1
+    # callers get copies of the cached rows
+    cached_rows = my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=False)
+    cached_rows[0]["count"] = 0
+    assert my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=False)[0]["count"] == 1
+
+    # a write to the table invalidates the cached count
+    my_getter.execute_one_query(sql_query="INSERT INTO pytest_cache_1 VALUES (2)",
+                                close_connection=False)
+    assert my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=False)[0]["count"] == 2
+    assert my_getter.result_cache_stats()["invalidations"] == 1
+
+    # inside a transaction the cached count is invalidated by the commit, not by the write
+    with my_getter.transaction(close_connection=False):
+        my_getter.execute_one_query(sql_query="INSERT INTO pytest_cache_1 VALUES (3)")
+        assert my_getter.result_cache_stats()["invalidations"] == 1
+    assert my_getter.result_cache_stats()["invalidations"] == 2
+    with pytest.raises(RuntimeError):
+        with my_getter.transaction(close_connection=False):
+            my_getter.execute_one_query(sql_query="INSERT INTO pytest_cache_1 VALUES (4)")
+            raise RuntimeError("rolled back")
+    assert my_getter.result_cache_stats()["invalidations"] == 2
+    assert my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=True)[0]["count"] == 3
+
+
+def test_fetch_metrics():
+    my_getter = MySQLConnectorNative()
+    mysql_query = """
+    WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 50)
+    SELECT n FROM seq
+    """
+    my_getter.fetch_all_as_dicts(sql_query=mysql_query, close_connection=False)
+    my_getter.fetch_all_as_df(sql_query=mysql_query, close_connection=False)
+    my_getter.fetch_all_as_dicts(sql_query="SELECT * FROM a_table_that_does_not_exist")
+
+    stats = my_getter.stats()
+    assert stats["queries"] == 2
+    assert stats["rows_returned"] == 100
+    assert stats["bytes_received"] > 0
+    assert stats["execute_seconds"]["count"] == 2
+    assert stats["fetch_seconds"]["count"] == 2
+    assert stats["errors"] == {"ProgrammingError": 1}
+
+    prometheus = my_getter.prometheus_metrics()
+    assert "mysql_helpers_rows_returned_total{" in prometheus
+    assert 'exception="ProgrammingError"' in prometheus
+
+
+def test_fetch_slow_query_log():
+    slow_query_log = SlowQueryLog(threshold=0.0, capture_explain=True)
+    my_getter = MySQLConnectorNative(slow_query_log=slow_query_log)
+    for n in (10, 20):
+        results = my_getter.fetch_all_as_df(
+            sql_query=f"SELECT n FROM (SELECT 1 AS n UNION ALL SELECT {n}) AS t WHERE n < %s",
+            sql_variables=(n,),
+            close_connection=False,
+        )
+        assert len(results) > 0
+    my_getter.close_connection()
+
+    record = slow_query_log.recent_records[-1]
+    assert record["method"] == "fetch_all_as_df"
+    assert set(record["phases"]) == {"checkout", "execute", "fetch", "to_df"}
+    assert isinstance(record["explain"], dict)
+
+    shapes = slow_query_log.top_shapes()
+    assert len(shapes) == 1
+    assert shapes[0]["count"] == 2
+
+
+def test_fetch_persistent_connection():
+    my_getter = MySQLConnectorNative(persistent=True, idle_ping_interval=60)
+    first_id = my_getter.fetch_all_as_dicts(sql_query="SELECT CONNECTION_ID() AS id")[0]["id"]
+    assert my_getter.fetch_all_as_dicts(sql_query="SELECT CONNECTION_ID() AS id")[0]["id"] == first_id
+
+    # the server drops the connection: the read is replayed once on a new connection
+    MySQLConnectorNative().execute_one_query(sql_query=f"KILL {first_id}")
+    results = my_getter.fetch_all_as_dicts(sql_query="SELECT CONNECTION_ID() AS id")
+    assert results[0]["id"] != first_id
+    assert my_getter.stats()["errors"]
+
+    my_getter.close_connection(force=True)
+    assert my_getter.mysql_connection is None
+
+
+def test_fetch_as_arrow():
+    pytest.importorskip("polars")
+    my_getter = MySQLConnectorNative()
+    mysql_query = """
+    SELECT @@version AS version, CAST(1 AS UNSIGNED) AS one, NULL + 1 AS missing
+    """
+
+    table = my_getter.fetch_all_as_arrow(sql_query=mysql_query)
+    assert table.num_rows == 1
+    assert str(table.schema.field("version").type) == "string"
+    assert str(table.schema.field("one").type) == "uint64"
+
+    polars_df = my_getter.fetch_all_as_polars(sql_query=mysql_query)
+    assert polars_df.columns == ["version", "one", "missing"]
+
+    sequence_query = """
+    WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 2500)
+    SELECT n, IF(n % 2, NULL, n) AS even FROM seq
+    """
+    batches = list(my_getter.fetch_arrow_batches(sql_query=sequence_query, chunk_size=1000))
+    assert [batch.num_rows for batch in batches] == [1000, 1000, 500]
+    assert all(batch.schema == batches[0].schema for batch in batches)
+
+    decimal_query = """
+    WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 2500)
+    SELECT IF(n > 1000, CAST(n * 1000.5 AS DECIMAL(12, 2)), NULL) AS amount FROM seq
+    """
+    batches = list(my_getter.fetch_arrow_batches(sql_query=decimal_query, chunk_size=1000))
+    assert str(batches[0].schema.field("amount").type) == "null"
+    assert all(str(batch.schema.field("amount").type) == "decimal128(38, 2)" for batch in batches[1:])
+
+
+def test_fetch_as_records():
+    my_getter = MySQLConnectorNative()
+    mysql_query = """
+    SELECT CAST(1 AS UNSIGNED) AS one, 0.5e0 AS half, NULL + 1 AS missing, 'a' AS text, COUNT(*) FROM DUAL
+    """
+
+    records = my_getter.fetch_all_as_records(sql_query=mysql_query)
+    assert len(records) == 1
+    record = records[0]
+    assert record.one == record["one"] == record[0] == 1
+    assert record.text == "a"
+    assert record["COUNT(*)"] == 1
+    assert record.as_dict()["missing"] is None
+    assert pickle.loads(pickle.dumps(records)) == records
+
+    result = my_getter.fetch_all_as_records(sql_query=mysql_query, columnar=True)
+    assert len(result) == 1
+    assert result[0] == record
+    assert list(result.column("half")) == [0.5]
+    assert result.to_dicts() == [record.as_dict()]
+    assert list(result.to_df().columns) == ["one", "half", "missing", "text", "COUNT(*)"]
+    assert list(pickle.loads(pickle.dumps(result))) == list(result)
+
+
+def test_fetch_engine():
+    mysql_query = """
+    SELECT CAST(1 AS UNSIGNED) AS one, NULL + 1 AS missing, 0.5e0 AS half, NOW() AS now, 'é' AS text,
+           CURDATE() AS today, TIME'-25:00:01.5' AS elapsed
+    """
+    pure_getter = MySQLConnectorNative(engine="pure")
+    assert pure_getter.stats()["engine"] == "pure"
+    auto_getter = MySQLConnectorNative()
+    assert auto_getter.engine in ("c", "pure")
+
+    pure_df = pure_getter.fetch_all_as_df(sql_query=mysql_query)
+    auto_df = auto_getter.fetch_all_as_df(sql_query=mysql_query)
+    assert list(auto_df.dtypes) == list(pure_df.dtypes)
+    assert [str(pure_df[column].dtype) for column in ("now", "today", "elapsed")] == [
+        "datetime64[ns]", "object", "timedelta64[ns]"]
+    if c_extension_available():
+        c_df = MySQLConnectorNative(engine="c").fetch_all_as_df(sql_query=mysql_query)
+        assert list(c_df.dtypes) == list(pure_df.dtypes)
+        assert c_df.drop(columns="now").equals(pure_df.drop(columns="now"))
+    assert auto_df.drop(columns="now").equals(pure_df.drop(columns="now"))
+
+
+def test_iter_table_keyset_pages():
+    my_getter = MySQLConnectorNative()
+    my_getter.execute_one_query(sql_query="""
+        CREATE TEMPORARY TABLE pytest_iter_table (
+            bucket int NOT NULL, n int NOT NULL, label varchar(20),
+            PRIMARY KEY (bucket, n)
+        )""", close_connection=False)
+    my_getter.execute_one_query(sql_query="""
+        INSERT INTO pytest_iter_table (bucket, n, label)
+        WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 1000)
+        SELECT n % 7, n, CONCAT('row ', n) FROM seq""", close_connection=False)
+
+    pages = list(my_getter.iter_table(table="pytest_iter_table", key_column=["bucket", "n"], page_size=300,
+                                      columns=["label"], close_connection=False))
+    assert [len(page) for page in pages] == [300, 300, 300, 100]
+    keys = [(row["bucket"], row["n"]) for page in pages for row in page]
+    assert keys == sorted(keys) and len(set(keys)) == 1000
+
+    # resume after the second page, as an interrupted job would
+    last_key = page_last_key(pages[1], ["bucket", "n"])
+    remaining_pages = list(my_getter.iter_table(table="pytest_iter_table", key_column=["bucket", "n"],
+                                                page_size=300, as_df=True, where="n > %s", where_variables=(0,),
+                                                start_after=last_key, close_connection=True))
+    assert sum(len(page) for page in remaining_pages) == 400
+
+
+def test_export_query(tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    my_getter = MySQLConnectorNative()
+    mysql_query = """
+    WITH RECURSIVE seq (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < 2500)
+    SELECT n, CONCAT('row ', n) AS label FROM seq
+    """
+
+    paths = my_getter.export_query(sql_query=mysql_query, path=tmp_path / "seq.parquet", row_group_size=1000)
+    assert paths == [str(tmp_path / "seq.parquet")]
+    assert parquet.ParquetFile(paths[0]).num_row_groups == 3
+    assert parquet.read_table(paths[0]).column("n").to_pylist() == list(range(1, 2501))
+
+    paths = my_getter.export_query(sql_query=mysql_query, path=tmp_path / "seq.csv", file_format="csv",
+                                   row_group_size=1000, max_file_size=1)
+    assert len(paths) == 3
+    assert sum(open(path).read().count("\n") - 1 for path in paths) == 2500
+
+
+def test_import_does_not_load_pandas():
+    probe = ("import sys, mysql_helpers.mysql_con.mysql_sync; "
+             "print('pandas' in sys.modules, 'numpy' in sys.modules)")
+    completed = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    assert completed.stdout.split() == ["False", "False"]
+
+
 if __name__ == "__main__":
     test_fetch_as_def()
     test_fetch_as_dicts()
+    test_fetch_chunks()
+    test_fetch_prepared_statements()
+    test_fetch_result_cache()
+    test_fetch_metrics()
+    test_fetch_slow_query_log()
+    test_fetch_persistent_connection()
+    test_fetch_as_arrow()
+    test_fetch_as_records()
+    test_fetch_engine()
+    test_iter_table_keyset_pages()
+    test_import_does_not_load_pandas()
@@ -1,8 +1,11 @@
 """ creates a table names test_help_01, insert rows and delete the table """
 from random import randint
 
+import pandas as pd
+import pytest
 from dotenv import load_dotenv
 
+from mysql_helpers.mysql_con.engine_helpers import c_extension_available
 from mysql_helpers.mysql_con.mysql_sync import MySQLConnectorNative
 
 TEST_TABLE_NAME: str = "pytest_temp_1"
@@ -56,5 +59,153 @@ def test_insert_in_temp_table():
     assert result[0]["count"] == nbr_records
 
 
+def test_execute_many_in_temp_table():
+    table_upper = MySQLConnectorNative()
+    sql_query: str = f"""
+            CREATE TEMPORARY TABLE `{TEST_TABLE_NAME}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+                `proxy_port` varchar(5) NOT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+    table_upper.execute_one_query(sql_query=sql_query, close_connection=False)
+
+    sql_query = f""" INSERT INTO {TEST_TABLE_NAME} (proxy_url, proxy_port)
+                    VALUES (%s, %s)
+                """
+    nbr_records: int = 5_000
+    rows = [(f"https:\\www.example{n}.com", str(randint(1, 5000))) for n in range(nbr_records)]
+    result = table_upper.execute_many(
+        sql_query=sql_query, rows=rows, batch_size=1_000, close_connection=False
+    )
+    assert result == nbr_records
+
+    sql_query = f""" SELECT COUNT(*) as count
+                FROM {TEST_TABLE_NAME}
+                """
+    result = table_upper.fetch_all_as_dicts(sql_query=sql_query, close_connection=True)
+    assert result[0]["count"] == nbr_records
+
+
+def test_write_df_in_temp_table():
+    table_upper = MySQLConnectorNative(allow_local_infile=True)
+    sql_query: str = f"""
+            CREATE TEMPORARY TABLE `{TEST_TABLE_NAME}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+                `proxy_country` varchar(150) DEFAULT NULL,
+                `upload_datetime` datetime DEFAULT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+    table_upper.execute_one_query(sql_query=sql_query, close_connection=False)
+
+    nbr_records: int = 1_000
+    df = pd.DataFrame({
+        "proxy_url": [f"https:\\www.example{n}.com, \"quoted\"" for n in range(nbr_records)],
+        "proxy_country": [None if n % 2 else "UK" for n in range(nbr_records)],
+        "upload_datetime": pd.date_range("2024-01-01", periods=nbr_records, freq="min"),
+    })
+    rows_loaded, warning_count = table_upper.write_df(
+        df=df, table=TEST_TABLE_NAME, close_connection=False
+    )
+    assert rows_loaded == nbr_records
+    assert warning_count == 0
+
+    sql_query = f""" SELECT proxy_url, proxy_country, upload_datetime
+                FROM {TEST_TABLE_NAME}
+                ORDER BY proxy_id
+                """
+    result_df = table_upper.fetch_all_as_df(sql_query=sql_query, close_connection=True)
+    assert result_df["proxy_url"].tolist() == df["proxy_url"].tolist()
+    assert result_df["proxy_country"].isna().sum() == nbr_records // 2
+    assert (result_df["upload_datetime"] == df["upload_datetime"]).all()
+
+
+@pytest.mark.parametrize("engine", ["pure", "c", "auto"])
+def test_upsert_df_in_temp_table(engine):
+    if engine == "c" and not c_extension_available():
+        pytest.skip("the C extension is not available")
+    table_upper = MySQLConnectorNative(engine=engine)
+    sql_query: str = f"""
+            CREATE TEMPORARY TABLE `{TEST_TABLE_NAME}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+                `proxy_port` varchar(5) NOT NULL,
+                `error_count` smallint NOT NULL DEFAULT '0',
+                `proxy_country` varchar(150) DEFAULT NULL,
+            PRIMARY KEY (`proxy_id`),
+            UNIQUE KEY `avoid_duplicate` (`proxy_url`,`proxy_port`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+    table_upper.execute_one_query(sql_query=sql_query, close_connection=False)
+
+    nbr_records: int = 1_000
+    df = pd.DataFrame({
+        "proxy_url": [f"https:\\www.example{n}.com, 'quoted'" for n in range(nbr_records)],
+        "proxy_port": ["8080"] * nbr_records,
+        "error_count": [0] * nbr_records,
+        "proxy_country": [None if n % 2 else "UK" for n in range(nbr_records)],
+    })
+    counts = table_upper.upsert_df(df=df, table=TEST_TABLE_NAME, key_columns=["proxy_url", "proxy_port"],
+                                   batch_size=300, close_connection=False)
+    assert counts == {"inserted": nbr_records, "updated": 0, "unchanged": 0}
+
+    # half of the rows change, the other half is sent again as is, plus 10 new rows
+    df.loc[df.index % 2 == 0, "error_count"] = 1
+    new_df = pd.DataFrame({"proxy_url": [f"new{n}" for n in range(10)], "proxy_port": ["80"] * 10,
+                           "error_count": [0] * 10, "proxy_country": ["FR"] * 10})
+    counts = table_upper.upsert_df(df=pd.concat([df, new_df], ignore_index=True), table=TEST_TABLE_NAME,
+                                   key_columns=["proxy_url", "proxy_port"], update_columns=["error_count"],
+                                   close_connection=False)
+    assert counts == {"inserted": 10, "updated": nbr_records // 2, "unchanged": nbr_records // 2}
+
+    sql_query = f"SELECT proxy_url, error_count FROM {TEST_TABLE_NAME} ORDER BY proxy_id"
+    result_df = table_upper.fetch_all_as_df(sql_query=sql_query, close_connection=True)
+    assert len(result_df) == nbr_records + 10
+    assert result_df["proxy_url"].tolist()[:nbr_records] == df["proxy_url"].tolist()
+    assert result_df["error_count"].sum() == nbr_records // 2
+
+
+def test_transaction_in_temp_table():
+    table_upper = MySQLConnectorNative()
+    sql_query: str = f"""
+            CREATE TEMPORARY TABLE `{TEST_TABLE_NAME}` (
+                `proxy_id` int NOT NULL AUTO_INCREMENT,
+                `proxy_url` varchar(150) NOT NULL,
+            PRIMARY KEY (`proxy_id`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """
+    table_upper.execute_one_query(sql_query=sql_query, close_connection=False)
+
+    insert_query: str = f"INSERT INTO {TEST_TABLE_NAME} (proxy_url) VALUES (%s)"
+    count_query: str = f"SELECT COUNT(*) as count FROM {TEST_TABLE_NAME}"
+
+    # committed once at the end of the block
+    with table_upper.transaction(close_connection=False):
+        table_upper.execute_one_query(sql_query=insert_query, sql_variables=("a",))
+        table_upper.execute_one_query(sql_query=insert_query, sql_variables=("b",))
+        # a failing savepoint only rolls back its own statements
+        with pytest.raises(ValueError):
+            with table_upper.transaction():
+                table_upper.execute_one_query(sql_query=insert_query, sql_variables=("c",))
+                raise ValueError("rollback to savepoint")
+    result = table_upper.fetch_all_as_dicts(sql_query=count_query, close_connection=False)
+    assert result[0]["count"] == 2
+
+    # everything is rolled back when the block raises
+    with pytest.raises(ValueError):
+        with table_upper.transaction(close_connection=False):
+            table_upper.execute_one_query(sql_query=insert_query, sql_variables=("d",))
+            raise ValueError("rollback")
+    result = table_upper.fetch_all_as_dicts(sql_query=count_query, close_connection=True)
+    assert result[0]["count"] == 2
+
+
 if __name__ == "__main__":
     test_insert_in_temp_table()
+    test_execute_many_in_temp_table()
+    test_write_df_in_temp_table()
+    test_upsert_df_in_temp_table("pure")
+    test_transaction_in_temp_table()